@@ -8,17 +8,38 @@ import os
 import torch
 import numpy as np
 import json
-from PIL import Image, ImageOps
+from PIL import Image, ImageOps, UnidentifiedImageError
 import folder_paths
 from server import PromptServer
 from aiohttp import web
-from .metadata_manager import MetadataManager
+from .metadata_manager import MetadataManager, encode_query_cursor, decode_query_cursor, parse_tag_query
+from .extract_metadata_node import parse_prompt_metadata
+from .eros_io import run_io, limit_concurrency, file_fingerprint
+from .input_index import get_input_index, iter_file_batches
+from .image_header import read_image_header, oriented_size
+from . import prompt_index
+from . import thumbnails
+from . import worker_pools
+from .catalog_events import CatalogEventBus
+from .cache_watcher import CacheWatcher
+from .zip_stream import iter_zip_stream, ZipStreamError
+from .jobs import JobManager
+from .route_metrics import RouteMetrics
 import tempfile
 import zipfile
 import sqlite3
 import shutil
+import hashlib
+import uuid
+import zlib
 from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
 import time
+import threading
+import asyncio
+import bisect
+import collections
+from concurrent.futures import ThreadPoolExecutor
 
 # Config & Persistence
 NODE_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -28,6 +49,7 @@ DB_PATH = os.path.join(NODE_DIR, "metadata.db")
 metadata_manager = MetadataManager(DB_PATH)
 
 # Ensure default maps directory exists (first-run friendly)
+default_maps_dir = None
 try:
     default_maps_dir = os.path.join(folder_paths.get_input_directory(), "maps")
     if not os.path.exists(default_maps_dir):
@@ -36,6 +58,10 @@ try:
 except Exception as e:
     print(f"[CacheMap] Warning: could not ensure default maps dir: {e}")
 
+# The browser routes list the maps cache themselves: keep it out of the input index
+if default_maps_dir:
+    get_input_index().exclude(default_maps_dir)
+
 def load_map_types():
     if os.path.exists(CONFIG_PATH):
         try:
@@ -71,6 +97,28 @@ def _resolve_cache_root(raw_path: str) -> str:
     return target
 
 
+def _describe_cache_root(root: str) -> str:
+    """Cache root as the browser names it: '' for the default, else relative to input dir."""
+    root = os.path.abspath(root)
+    if root == os.path.abspath(default_maps_dir):
+        return ""
+    try:
+        return os.path.relpath(root, os.path.abspath(folder_paths.get_input_directory())).replace("\\", "/")
+    except ValueError:
+        return root
+
+
+# Every committed metadata write (and explicit notify_committed() calls after
+# plain-SQL merges or resets) feeds the coalescing eros.catalog.delta feed.
+catalog_events = CatalogEventBus(
+    metadata_manager,
+    lambda event, payload: PromptServer.instance.send_sync(event, payload),
+    describe_root=_describe_cache_root,
+    default_root=os.path.abspath(default_maps_dir),
+)
+metadata_manager.add_commit_listener(catalog_events.touch)
+
+
 def _safe_zip_members(zf: zipfile.ZipFile):
     for info in zf.infolist():
         name = info.filename
@@ -128,69 +176,401 @@ def _sanitize_image_key(value: str) -> str:
     return base
 
 
-def _dump_sqlite_db_to_sql(db_path: str, cache_root: str) -> str:
-    """Dump SQLite DB to SQL, sanitizing known path fields to be relative."""
+VALID_IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp"}
+
+
+def _probe_image_file(path: str, img=None) -> dict:
+    """Stat a map file and read its dimensions/format.
+
+    When the caller already holds the PIL image (e.g. right after saving) it is
+    used directly; otherwise only the image header is read.
+    """
+    st = os.stat(path)
+    info = {
+        "bytes": st.st_size,
+        "mtime": st.st_mtime,
+        "width": None,
+        "height": None,
+        "format": None,
+        "prompt": None,
+    }
+    try:
+        if img is not None:
+            info["width"], info["height"] = img.size
+            info["format"] = img.format or os.path.splitext(path)[1].lstrip(".").upper()
+        else:
+            # PNG/WebP/JPEG: chunks ahead of the pixel data only, no PIL decoder setup
+            header = read_image_header(path)
+            if header is not None:
+                info["width"], info["height"] = header["width"], header["height"]
+                info["format"] = header["format"]
+                text = header["text"]
+            else:
+                with Image.open(path) as im:
+                    info["width"], info["height"] = im.size
+                    info["format"] = im.format
+                    text = im.info
+            if isinstance(text.get("prompt"), str):
+                info["prompt"] = parse_prompt_metadata(text["prompt"])[0] or None
+    except Exception:
+        pass
+    return info
+
+
+def _catalog_record(cache_root: str, map_type: str, path: str, img=None, wait=True):
+    """Record a map file in the images catalog (best-effort).
+
+    With wait=False the write is queued and a Future is returned.
+    """
+    try:
+        info = _probe_image_file(path, img)
+        basename = os.path.splitext(os.path.basename(path))[0]
+        return metadata_manager.upsert_image_file(
+            basename,
+            os.path.abspath(cache_root),
+            map_type,
+            os.path.abspath(path),
+            info["bytes"],
+            info["mtime"],
+            info["width"],
+            info["height"],
+            info["format"],
+            info["prompt"],
+            wait=wait,
+        )
+    except Exception as e:
+        print(f"[CacheMap] Warning: could not catalog {path}: {e}")
+        return None
+
+
+def _on_map_written(cache_root: str, map_type: str, path: str, img=None):
+    """Bookkeeping after a map file was (re)written: catalog row and thumbnails."""
     try:
-        conn = sqlite3.connect(db_path)
+        thumbnails.invalidate(path)
+    except Exception as e:
+        print(f"[CacheMap] Warning: could not drop thumbnails for {path}: {e}")
+    return _catalog_record(cache_root, map_type, path, img)
+
+
+def _catalog_scan(cache_root: str, map_types=None) -> dict:
+    """Bring the catalog in line with `<cache_root>/<map_type>/*` on disk.
+
+    Files whose size and mtime match their catalog row are left untouched, so
+    re-running this over an indexed tree only costs one stat per file.
+    `map_types` limits the scan to those type folders.
+    """
+    cache_root = os.path.abspath(cache_root)
+    stats = {"indexed": 0, "unchanged": 0, "removed": 0}
+    known = {}
+    for map_type in map_types or [None]:
+        for row in metadata_manager.list_image_files(cache_root, map_type):
+            known[os.path.join(cache_root, row["map_type"], row["filename"])] = row
+
+    seen = set()
+    pending = []
+    if os.path.isdir(cache_root):
+        for type_entry in os.scandir(cache_root):
+            if not type_entry.is_dir():
+                continue
+            if map_types and type_entry.name not in map_types:
+                continue
+            for entry in os.scandir(type_entry.path):
+                if not entry.is_file():
+                    continue
+                if os.path.splitext(entry.name)[1].lower() not in VALID_IMAGE_EXTENSIONS:
+                    continue
+                full = os.path.join(cache_root, type_entry.name, entry.name)
+                seen.add(full)
+                row = known.get(full)
+                st = entry.stat()
+                if row and row["bytes"] == st.st_size and row["mtime"] == st.st_mtime:
+                    stats["unchanged"] += 1
+                    continue
+                # Queue without waiting so the writer can group-commit the scan.
+                future = _catalog_record(cache_root, type_entry.name, full, wait=False)
+                if future is not None:
+                    pending.append(future)
+
+    for future in pending:
         try:
-            lines = []
-            for line in conn.iterdump():
-                # Sanitize favorites.path and image_tags.image_path when present.
-                # Handles forms like:
-                # INSERT INTO "favorites" VALUES('path',123.0);
-                # INSERT INTO favorites VALUES('path',123.0);
-                # INSERT INTO "image_tags" VALUES('image',1,123.0);
-                lowered = line.lower()
-                if lowered.startswith("insert into \"favorites\" values(") or lowered.startswith(
-                    "insert into favorites values("
-                ):
-                    try:
-                        # first quoted string after VALUES(
-                        start = line.find("VALUES(")
-                        if start != -1:
-                            frag = line[start + len("VALUES(") :]
-                            if frag.startswith("'"):
-                                end = frag.find("',")
-                                if end != -1:
-                                    raw = frag[1:end].replace("''", "'")
-                                    sanitized = _sanitize_favorite_path(raw, cache_root)
-                                    sanitized_sql = sanitized.replace("'", "''")
-                                    line = (
-                                        line[: start + len("VALUES(")]
-                                        + "'"
-                                        + sanitized_sql
-                                        + frag[end:]
-                                    )
-                    except Exception:
-                        pass
-                elif lowered.startswith("insert into \"image_tags\" values(") or lowered.startswith(
-                    "insert into image_tags values("
-                ):
-                    try:
-                        start = line.find("VALUES(")
-                        if start != -1:
-                            frag = line[start + len("VALUES(") :]
-                            if frag.startswith("'"):
-                                end = frag.find("',")
-                                if end != -1:
-                                    raw = frag[1:end].replace("''", "'")
-                                    sanitized = _sanitize_image_key(raw)
-                                    sanitized_sql = sanitized.replace("'", "''")
-                                    line = (
-                                        line[: start + len("VALUES(")]
-                                        + "'"
-                                        + sanitized_sql
-                                        + frag[end:]
-                                    )
-                    except Exception:
-                        pass
+            if future.result() is not None:
+                stats["indexed"] += 1
+        except Exception as e:
+            print(f"[CacheMap] Warning: could not catalog file: {e}")
+
+    for full in set(known) - seen:
+        if metadata_manager.remove_image_file(full):
+            stats["removed"] += 1
+    if stats["removed"]:
+        metadata_manager.prune_orphan_images()
+    if not map_types:
+        _catalog_scanned_roots.add(cache_root)
+    return stats
+
+
+# Cache roots reconciled with disk during this session.
+_catalog_scanned_roots = set()
+
+
+def _ensure_catalog(cache_root: str) -> None:
+    """Run one incremental catalog scan per cache root per session.
+
+    Picks up maps that were on disk before the catalog existed or that were
+    copied in while ComfyUI was not running.
+    """
+    if os.path.abspath(cache_root) not in _catalog_scanned_roots:
+        _catalog_scan(cache_root)
+    _ensure_watcher(cache_root)
+
+
+def load_watch_config():
+    """Optional "watch" section of eros_config.json (disabled by default)."""
+    defaults = {"enabled": False, "poll_interval": 5.0, "force_polling": False}
+    try:
+        with open(CONFIG_PATH, 'r') as f:
+            section = json.load(f).get("watch") or {}
+        defaults.update({k: section[k] for k in defaults if k in section})
+    except Exception as e:
+        print(f"[CacheMap] Error loading watch config: {e}")
+    return defaults
+
+
+WATCH_CONFIG = load_watch_config()
+
+
+def load_metrics_config():
+    """Optional "metrics" section of eros_config.json."""
+    defaults = {"enabled": True, "slow_request_ms": 0}
+    try:
+        with open(CONFIG_PATH, 'r') as f:
+            section = json.load(f).get("metrics") or {}
+        defaults.update({k: section[k] for k in defaults if k in section})
+    except Exception as e:
+        print(f"[CacheMap] Error loading metrics config: {e}")
+    return defaults
+
+
+METRICS_CONFIG = load_metrics_config()
+route_metrics = RouteMetrics(slow_request_ms=float(METRICS_CONFIG["slow_request_ms"] or 0))
+if METRICS_CONFIG["enabled"]:
+    try:
+        # Custom nodes load before the app starts, while middlewares can still be added
+        PromptServer.instance.app.middlewares.append(route_metrics.middleware)
+    except Exception as e:
+        print(f"[CacheMap] Warning: could not install the metrics middleware: {e}")
+
 
-                lines.append(line)
-            return "\n".join(lines) + "\n"
+def load_workers_config():
+    """Optional "workers" section of eros_config.json (see worker_pools)."""
+    defaults = {"processes": "auto"}
+    try:
+        with open(CONFIG_PATH, 'r') as f:
+            section = json.load(f).get("workers") or {}
+        defaults.update({k: section[k] for k in defaults if k in section})
+    except Exception as e:
+        print(f"[CacheMap] Error loading workers config: {e}")
+    return defaults
+
+
+WORKERS_CONFIG = load_workers_config()
+worker_pools.configure(WORKERS_CONFIG["processes"])
+
+# cache_root -> CacheWatcher
+_watchers = {}
+
+
+def _apply_watched_changes(cache_root: str, changes) -> None:
+    """Feed files changed behind our back (rsync, file manager) into the indexes.
+
+    Only the reported files are touched: catalog rows are upserted or removed
+    (which publishes eros.catalog.delta through the commit listener) and stale
+    thumbnails are dropped. Our own saves show up here too; their catalog row
+    already matches, so they are skipped.
+    """
+    pending = []
+    removed = 0
+    for action, map_type, path in changes:
+        try:
+            thumbnails.invalidate(path)
+        except Exception:
+            pass
+        if action == "remove":
+            if not os.path.exists(path) and metadata_manager.remove_image_file(path):
+                removed += 1
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        row = metadata_manager.get_image_file(path)
+        if row and row["bytes"] == st.st_size and row["mtime"] == st.st_mtime:
+            continue
+        future = _catalog_record(cache_root, map_type, path, wait=False)
+        if future is not None:
+            pending.append(future)
+    for future in pending:
+        try:
+            future.result()
+        except Exception as e:
+            print(f"[CacheWatcher] Could not catalog file: {e}")
+    if removed:
+        metadata_manager.prune_orphan_images()
+    if pending or removed:
+        print(f"[CacheWatcher] {cache_root}: {len(pending)} indexed, {removed} removed")
+
+
+def _ensure_watcher(cache_root: str) -> None:
+    """Start a filesystem watcher for a cache root when enabled in the config."""
+    if not WATCH_CONFIG["enabled"]:
+        return
+    cache_root = os.path.abspath(cache_root)
+    watcher = _watchers.get(cache_root)
+    if watcher is not None and watcher.is_alive():
+        return
+    watcher = CacheWatcher(
+        cache_root,
+        _apply_watched_changes,
+        VALID_IMAGE_EXTENSIONS,
+        poll_interval=float(WATCH_CONFIG["poll_interval"]),
+        force_polling=bool(WATCH_CONFIG["force_polling"]),
+    )
+    _watchers[cache_root] = watcher
+    watcher.start()
+    print(f"[CacheWatcher] Watching {cache_root}")
+
+
+if WATCH_CONFIG["enabled"]:
+    # Reconcile the default root once in the background, then keep it in sync.
+    threading.Thread(
+        target=lambda: _ensure_catalog(default_maps_dir), name="eros-watch-startup", daemon=True
+    ).start()
+
+
+# Tables that are derived or local to one database: the FTS5 search index,
+# the catalog change log / catalog id and the background job records.
+# image_files holds absolute, machine-specific paths and is rebuilt from the
+# files on import.
+_DERIVED_TABLES = ("images_fts", "catalog_changes", "catalog_meta", "jobs", "generation_params")
+
+
+def _register_sanitizers(conn: sqlite3.Connection, cache_root: str) -> None:
+    conn.create_function(
+        "eros_favorite_path", 1, lambda p: _sanitize_favorite_path(p, cache_root), deterministic=True
+    )
+    conn.create_function("eros_image_key", 1, _sanitize_image_key, deterministic=True)
+
+
+def _table_columns(conn: sqlite3.Connection, table: str, schema: str = "main") -> list:
+    return [r[1] for r in conn.execute(f'PRAGMA {schema}.table_info("{table}")').fetchall()]
+
+
+def _sanitize_snapshot(conn: sqlite3.Connection, cache_root: str) -> None:
+    """Make a metadata.db copy portable, with set-based statements.
+
+    Drops derived tables and all triggers, empties image_files and rewrites
+    favorites paths / image keys relative to the cache root. Rows that would
+    collide once sanitized are dropped.
+    """
+    _register_sanitizers(conn, cache_root)
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+        conn.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+    for table in _DERIVED_TABLES:
+        conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()}
+    if "sqlite_sequence" in tables:
+        marks = ",".join("?" * len(_DERIVED_TABLES))
+        conn.execute(f"DELETE FROM sqlite_sequence WHERE name IN ({marks})", _DERIVED_TABLES)
+    if "image_files" in tables:
+        conn.execute("DELETE FROM image_files")
+    if "favorites" in tables:
+        conn.execute("UPDATE OR IGNORE favorites SET path = eros_favorite_path(path) WHERE path != eros_favorite_path(path)")
+        conn.execute("DELETE FROM favorites WHERE path != eros_favorite_path(path) OR eros_favorite_path(path) = ''")
+    if "images" in tables:
+        conn.execute("UPDATE OR IGNORE images SET basename = eros_image_key(basename) WHERE basename != eros_image_key(basename)")
+        conn.execute("DELETE FROM images WHERE basename != eros_image_key(basename) OR basename = ''")
+        if "image_id" in _table_columns(conn, "image_tags"):
+            conn.execute("DELETE FROM image_tags WHERE image_id NOT IN (SELECT id FROM images)")
+    if "image_tags" in tables and "image_path" in _table_columns(conn, "image_tags"):
+        # Schema v2 keyed tag links by basename
+        conn.execute("UPDATE OR IGNORE image_tags SET image_path = eros_image_key(image_path)")
+
+
+def _snapshot_sqlite_db(db_path: str, cache_root: str = None, keep=None) -> str:
+    """Copy `db_path` with the online backup API into a compact temp file.
+
+    With `cache_root` the copy is sanitized for export (see _sanitize_snapshot);
+    `keep` = (basenames, fresh_basenames, since) further limits it to an export
+    selection (see _filter_snapshot). Returns the temp path; the caller deletes it.
+    """
+    fd, tmp_db = tempfile.mkstemp(prefix="eros_export_", suffix=".db")
+    os.close(fd)
+    try:
+        src = sqlite3.connect(db_path)
+        dst = sqlite3.connect(tmp_db)
+        try:
+            src.backup(dst)
+            # A plain rollback journal keeps the snapshot a single file.
+            dst.execute("PRAGMA journal_mode=DELETE")
+            if cache_root is not None:
+                _sanitize_snapshot(dst, cache_root)
+            if keep is not None:
+                _filter_snapshot(dst, *keep)
+            dst.commit()
+            dst.execute("VACUUM")
+        finally:
+            src.close()
+            dst.close()
+    except Exception:
+        _remove_quietly(tmp_db)
+        raise
+    return tmp_db
+
+
+def _filter_snapshot(conn: sqlite3.Connection, basenames, fresh_basenames=(), since=None) -> None:
+    """Reduce a sanitized metadata snapshot to the rows for `basenames`.
+
+    With `since` (unix seconds), tag links and favorites older than that are
+    dropped too, except for `fresh_basenames` (images whose files are part of
+    the export), which keep all of theirs. Tags no longer referenced go away.
+    """
+    conn.execute("CREATE TEMP TABLE export_keep (basename TEXT PRIMARY KEY)")
+    conn.execute("CREATE TEMP TABLE export_fresh (basename TEXT PRIMARY KEY)")
+    conn.executemany("INSERT OR IGNORE INTO export_keep VALUES (?)", ((b,) for b in basenames))
+    conn.executemany("INSERT OR IGNORE INTO export_fresh VALUES (?)", ((b,) for b in fresh_basenames))
+    conn.execute("""
+        DELETE FROM image_tags WHERE image_id NOT IN (
+            SELECT i.id FROM images i JOIN export_keep k ON k.basename = i.basename)
+    """)
+    conn.execute("DELETE FROM favorites WHERE eros_image_key(path) NOT IN (SELECT basename FROM export_keep)")
+    if since is not None:
+        conn.execute("""
+            DELETE FROM image_tags WHERE added_at < ? AND image_id NOT IN (
+                SELECT i.id FROM images i JOIN export_fresh x ON x.basename = i.basename)
+        """, (since,))
+        conn.execute("""
+            DELETE FROM favorites WHERE added_at < ?
+            AND eros_image_key(path) NOT IN (SELECT basename FROM export_fresh)
+        """, (since,))
+    conn.execute("DELETE FROM images WHERE basename NOT IN (SELECT basename FROM export_keep)")
+    conn.execute("DELETE FROM tags WHERE id NOT IN (SELECT tag_id FROM image_tags)")
+    conn.execute("DROP TABLE temp.export_keep")
+    conn.execute("DROP TABLE temp.export_fresh")
+
+
+def _dump_sqlite_db_to_sql(db_path: str, cache_root: str = None, keep=None) -> str:
+    """SQL text dump of a snapshot (the export format used before binary snapshots)."""
+    tmp_db = None
+    try:
+        tmp_db = _snapshot_sqlite_db(db_path, cache_root, keep)
+        conn = sqlite3.connect(tmp_db)
+        try:
+            return "\n".join(conn.iterdump()) + "\n"
         finally:
             conn.close()
     except Exception as e:
         return f"-- failed to dump {os.path.basename(db_path)}: {e}\n"
+    finally:
+        _remove_quietly(tmp_db)
 
 
 def _create_temp_db_from_sql(sql_text: str) -> str:
@@ -205,191 +585,180 @@ def _create_temp_db_from_sql(sql_text: str) -> str:
     return tmp_db
 
 
-def _merge_metadata_db_from_sql(target_db_path: str, sql_text: str, cache_root: str) -> dict:
-    """Merge metadata.db content from a SQL dump, non-destructively."""
+def _merge_metadata_db(target_db_path: str, src_db_path: str, cache_root: str) -> dict:
+    """Merge favorites, tags and tag links from another metadata DB, non-destructively.
+
+    The source is ATTACHed and merged with set-based INSERT ... SELECT;
+    image keys and favorite paths are sanitized on the way in. Accepts
+    snapshots of any schema version (v2 keyed tag links by basename).
+    """
     stats = {
         "favorites_added": 0,
         "tags_added": 0,
         "image_tags_added": 0,
     }
 
-    tmp_db = None
+    now = time.time()
+    dst = sqlite3.connect(target_db_path, timeout=30)
     try:
-        # Ensure target schema exists
+        _register_sanitizers(dst, cache_root)
+        dst.execute("ATTACH DATABASE ? AS src", (src_db_path,))
         try:
-            MetadataManager(target_db_path)
-        except Exception:
-            pass
-
-        tmp_db = _create_temp_db_from_sql(sql_text)
-
-        src = sqlite3.connect(tmp_db)
-        dst = sqlite3.connect(target_db_path)
-        try:
-            dst.execute("PRAGMA foreign_keys=ON")
-
-            before = dst.total_changes
-            try:
-                rows = src.execute("SELECT path, added_at FROM favorites").fetchall()
-                for path, added_at in rows:
-                    sp = _sanitize_favorite_path(path, cache_root)
-                    if not sp:
-                        continue
-                    dst.execute(
-                        "INSERT OR IGNORE INTO favorites(path, added_at) VALUES (?, ?)",
-                        (sp, float(added_at) if added_at is not None else time.time()),
-                    )
-            except Exception:
-                pass
-            dst.commit()
-            stats["favorites_added"] = max(0, dst.total_changes - before)
-
-            # Merge tags by name
-            before = dst.total_changes
-            try:
-                tag_rows = src.execute("SELECT name FROM tags").fetchall()
-                for (name,) in tag_rows:
-                    if not name:
-                        continue
-                    dst.execute("INSERT OR IGNORE INTO tags(name) VALUES (?)", (str(name),))
-            except Exception:
-                pass
-            dst.commit()
-            stats["tags_added"] = max(0, dst.total_changes - before)
-
-            # Build dst name->id map
-            name_to_id = {}
-            try:
-                for tid, name in dst.execute("SELECT id, name FROM tags").fetchall():
-                    name_to_id[str(name)] = int(tid)
-            except Exception:
-                name_to_id = {}
-
-            # Merge image_tags by (image_path, tag_name)
-            before = dst.total_changes
-            try:
-                rows = src.execute(
+            src_tables = {
+                r[0] for r in dst.execute("SELECT name FROM src.sqlite_master WHERE type = 'table'").fetchall()
+            }
+            dst.execute("BEGIN IMMEDIATE")
+            # Count with rowcount: total_changes would include rows written
+            # by the change-log triggers.
+            if "favorites" in src_tables:
+                cur = dst.execute("""
+                    INSERT OR IGNORE INTO favorites(path, added_at)
+                    SELECT eros_favorite_path(path), COALESCE(added_at, ?)
+                    FROM src.favorites WHERE eros_favorite_path(path) != ''
+                """, (now,))
+                stats["favorites_added"] = max(0, cur.rowcount)
+
+            if "tags" in src_tables:
+                cur = dst.execute("""
+                    INSERT OR IGNORE INTO tags(name)
+                    SELECT name FROM src.tags WHERE name IS NOT NULL AND name != ''
+                """)
+                stats["tags_added"] = max(0, cur.rowcount)
+
+            if "image_tags" in src_tables and "tags" in src_tables:
+                if "image_id" in _table_columns(dst, "image_tags", "src") and "images" in src_tables:
+                    links = """
+                        SELECT eros_image_key(si.basename) AS image_key, st.name AS tag_name,
+                               COALESCE(it.added_at, ?) AS added_at
+                        FROM src.image_tags it
+                        JOIN src.tags st ON st.id = it.tag_id
+                        JOIN src.images si ON si.id = it.image_id
                     """
-                    SELECT it.image_path, t.name, it.added_at
-                    FROM image_tags it
-                    JOIN tags t ON t.id = it.tag_id
+                else:
+                    links = """
+                        SELECT eros_image_key(it.image_path) AS image_key, st.name AS tag_name,
+                               COALESCE(it.added_at, ?) AS added_at
+                        FROM src.image_tags it
+                        JOIN src.tags st ON st.id = it.tag_id
                     """
-                ).fetchall()
-                for image_path, tag_name, added_at in rows:
-                    key = _sanitize_image_key(image_path)
-                    if not key or not tag_name:
-                        continue
-                    dst_tid = name_to_id.get(str(tag_name))
-                    if not dst_tid:
-                        # Create missing tag then refetch id
-                        try:
-                            dst.execute("INSERT OR IGNORE INTO tags(name) VALUES (?)", (str(tag_name),))
-                            dst.commit()
-                            r = dst.execute("SELECT id FROM tags WHERE name = ?", (str(tag_name),)).fetchone()
-                            if r:
-                                dst_tid = int(r[0])
-                                name_to_id[str(tag_name)] = dst_tid
-                        except Exception:
-                            dst_tid = None
-                    if not dst_tid:
-                        continue
-
-                    dst.execute(
-                        """
-                        INSERT OR IGNORE INTO image_tags(image_path, tag_id, added_at)
-                        VALUES (?, ?, ?)
-                        """,
-                        (key, dst_tid, float(added_at) if added_at is not None else time.time()),
+                dst.execute(f"CREATE TEMP TABLE import_links AS {links}", (now,))
+                dst.execute("DELETE FROM temp.import_links WHERE image_key = '' OR tag_name IS NULL OR tag_name = ''")
+                dst.execute("""
+                    INSERT OR IGNORE INTO images(basename, created_at)
+                    SELECT image_key, MIN(added_at) FROM temp.import_links GROUP BY image_key
+                """)
+                cur = dst.execute("""
+                    INSERT OR IGNORE INTO image_tags(image_id, tag_id, added_at)
+                    SELECT i.id, t.id, l.added_at
+                    FROM temp.import_links l
+                    JOIN images i ON i.basename = l.image_key
+                    JOIN tags t ON t.name = l.tag_name
+                """)
+                stats["image_tags_added"] = max(0, cur.rowcount)
+                dst.execute("DROP TABLE temp.import_links")
+
+            if "images" in src_tables and "prompt" in _table_columns(dst, "images", "src"):
+                # Fill prompts we do not have yet (search index is updated by triggers)
+                dst.execute("""
+                    UPDATE images SET prompt = (
+                        SELECT si.prompt FROM src.images si
+                        WHERE eros_image_key(si.basename) = images.basename AND si.prompt IS NOT NULL
                     )
-            except Exception:
-                pass
+                    WHERE prompt IS NULL AND basename IN (
+                        SELECT eros_image_key(basename) FROM src.images WHERE prompt IS NOT NULL
+                    )
+                """)
             dst.commit()
-            stats["image_tags_added"] = max(0, dst.total_changes - before)
+        except Exception:
+            dst.rollback()
+            raise
         finally:
             try:
-                src.close()
-            except Exception:
-                pass
-            try:
-                dst.close()
+                dst.execute("DETACH DATABASE src")
             except Exception:
                 pass
     finally:
-        try:
-            if tmp_db and os.path.exists(tmp_db):
-                os.remove(tmp_db)
-        except Exception:
-            pass
-
+        dst.close()
     return stats
 
 
-def _merge_generic_db_from_sql(target_db_path: str, sql_text: str) -> dict:
+def _merge_metadata_db_from_sql(target_db_path: str, sql_text: str, cache_root: str) -> dict:
+    """Merge metadata.db content from a SQL dump (legacy export format), non-destructively."""
+    tmp_db = None
+    try:
+        tmp_db = _create_temp_db_from_sql(sql_text)
+        return _merge_metadata_db(target_db_path, tmp_db, cache_root)
+    finally:
+        _remove_quietly(tmp_db)
+
+
+def _merge_generic_db(target_db_path: str, src_db_path: str) -> dict:
     """Best-effort non-destructive merge for unknown DBs.
 
-    - If DB doesn't exist: create it from SQL.
-    - If it exists: create temp DB from SQL and INSERT OR IGNORE rows table-by-table.
+    - If DB doesn't exist: restore it from the snapshot.
+    - If it exists: ATTACH the snapshot and INSERT OR IGNORE rows table-by-table.
     """
     stats = {"created": False, "rows_added": 0}
 
     if not os.path.exists(target_db_path):
-        conn = sqlite3.connect(target_db_path)
+        src = sqlite3.connect(src_db_path)
+        dst = sqlite3.connect(target_db_path)
         try:
-            conn.executescript(sql_text)
-            conn.commit()
+            src.backup(dst)
             stats["created"] = True
         finally:
-            conn.close()
+            src.close()
+            dst.close()
         return stats
 
-    tmp_db = None
+    dst = sqlite3.connect(target_db_path, timeout=30)
     try:
-        tmp_db = _create_temp_db_from_sql(sql_text)
-        dst = sqlite3.connect(target_db_path)
+        before = dst.total_changes
+        dst.execute("ATTACH DATABASE ? AS src", (src_db_path,))
         try:
-            before = dst.total_changes
-            dst.execute("ATTACH DATABASE ? AS src", (tmp_db,))
-            try:
-                tables = dst.execute(
-                    "SELECT name, sql FROM src.sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
-                ).fetchall()
-                for name, create_sql in tables:
-                    if not name:
-                        continue
-                    # Ensure table exists
-                    exists = dst.execute(
-                        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
-                        (name,),
-                    ).fetchone()
-                    if not exists and create_sql:
-                        try:
-                            dst.execute(create_sql)
-                        except Exception:
-                            pass
-
+            tables = dst.execute(
+                "SELECT name, sql FROM src.sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+            ).fetchall()
+            for name, create_sql in tables:
+                if not name:
+                    continue
+                # Ensure table exists
+                exists = dst.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                    (name,),
+                ).fetchone()
+                if not exists and create_sql:
                     try:
-                        dst.execute(f"INSERT OR IGNORE INTO {name} SELECT * FROM src.{name}")
+                        dst.execute(create_sql)
                     except Exception:
                         pass
-                dst.commit()
-            finally:
+
                 try:
-                    dst.execute("DETACH DATABASE src")
+                    dst.execute(f'INSERT OR IGNORE INTO "{name}" SELECT * FROM src."{name}"')
                 except Exception:
                     pass
-            stats["rows_added"] = max(0, dst.total_changes - before)
+            dst.commit()
         finally:
-            dst.close()
+            try:
+                dst.execute("DETACH DATABASE src")
+            except Exception:
+                pass
+        stats["rows_added"] = max(0, dst.total_changes - before)
     finally:
-        try:
-            if tmp_db and os.path.exists(tmp_db):
-                os.remove(tmp_db)
-        except Exception:
-            pass
-
+        dst.close()
     return stats
 
 
+def _merge_generic_db_from_sql(target_db_path: str, sql_text: str) -> dict:
+    """Merge an unknown DB from a SQL dump (legacy export format)."""
+    tmp_db = None
+    try:
+        tmp_db = _create_temp_db_from_sql(sql_text)
+        return _merge_generic_db(target_db_path, tmp_db)
+    finally:
+        _remove_quietly(tmp_db)
+
+
 class CacheMapNode:
     @classmethod
     def INPUT_TYPES(s):
@@ -424,9 +793,27 @@ class CacheMapNode:
     CATEGORY = "ErosDiffusion"
     DESCRIPTION = "Smart caching node for controlnet maps. Checks for existing maps in the cache directory to skip expensive generation. Supports 'auto' mode to automatically detect map types from connections. Use 'Generate All' to batch process all connected inputs."
 
-    def _get_map_types(self):
+    @staticmethod
+    def _get_map_types():
          return load_map_types()
 
+    @classmethod
+    def IS_CHANGED(s, cache_path="", filename=None, map_type="auto", **kwargs):
+        """Fingerprint of the cache files this node reads, so ComfyUI re-runs it only when they change.
+
+        `filename` is usually linked and then not passed here; the mtimes of
+        the type folders it may read from stand in for the file, so changes
+        to other types or other roots leave this node cached.
+        """
+        if map_type == "browser":
+            return ""  # pass-through: ComfyUI tracks the linked input itself
+        types = s._get_map_types() if map_type == "auto" else [map_type]
+        if filename:
+            paths = [p for t in types for p in s._get_cache_file_paths(cache_path, t, filename)[1]]
+            return file_fingerprint(paths)
+        root = s._resolve_cache_path(cache_path)
+        return file_fingerprint([os.path.join(root, t) for t in types])
+
     def _is_connected_input(self, val):
         """Return True if `val` looks like a connected image input from ComfyUI.
         Accepts either a torch.Tensor or a (tensor, ...) tuple/list as produced
@@ -441,14 +828,19 @@ class CacheMapNode:
             return True
         return False
 
-    def _get_cache_file_paths(self, cache_path, map_type, filename):
+    @staticmethod
+    def _resolve_cache_path(cache_path):
         # Normalize cache_path: use default maps dir when empty, and
         # resolve relative paths against Comfy input directory.
         if not cache_path:
-            cache_path = default_maps_dir
-        elif not os.path.isabs(cache_path):
-            cache_path = os.path.join(folder_paths.get_input_directory(), cache_path)
+            return default_maps_dir
+        if not os.path.isabs(cache_path):
+            return os.path.join(folder_paths.get_input_directory(), cache_path)
+        return cache_path
 
+    @classmethod
+    def _get_cache_file_paths(cls, cache_path, map_type, filename):
+        cache_path = cls._resolve_cache_path(cache_path)
         basename = os.path.splitext(os.path.basename(filename))[0]
         target_dir = os.path.join(cache_path, map_type)
         extensions = [".png", ".jpg", ".jpeg", ".webp"]
@@ -584,13 +976,11 @@ class CacheMapNode:
             
             if tag_list:
                 print(f"[CacheMap] Processing {len(tag_list)} unique tag(s) for '{basename}': {tag_list}")
-                for tag in tag_list:
-                    print(f"[CacheMap] Calling metadata_manager.add_tag_to_image('{basename}', '{tag}')")
-                    success = metadata_manager.add_tag_to_image(basename, tag)
-                    if success:
-                        print(f"[CacheMap] ✓ Successfully added tag '{tag}' to '{basename}'")
-                    else:
-                        print(f"[CacheMap] ⚠ Tag '{tag}' already exists for '{basename}' (skipped)")
+                # One write (one transaction) for the whole tag list.
+                if metadata_manager.add_tags_to_image(basename, tag_list):
+                    print(f"[CacheMap] ✓ Successfully added {len(tag_list)} tag(s) to '{basename}'")
+                else:
+                    print(f"[CacheMap] ⚠ Could not add tags to '{basename}'")
 
                 # Verify tags were saved
                 print(f"[CacheMap] Verifying saved tags for '{basename}'...")
@@ -646,6 +1036,7 @@ class CacheMapNode:
                         img = Image.fromarray(img_array)
                         img.save(save_path)
                         print(f"[CacheMap] Generate All: Saved {type_check} -> {save_path}")
+                        _on_map_written(cache_path, type_check, save_path, img)
 
                         # Save tags when generating/regenerating; defer frontend notify
                         save_tags_for_image(filename, tags_str)
@@ -671,6 +1062,7 @@ class CacheMapNode:
                     img = Image.fromarray(img_array)
                     img.save(save_path)
                     print(f"[CacheMap] Generate All: Saved original -> {save_path}")
+                    _on_map_written(cache_path, "original", save_path, img)
 
                     # Save tags for original image (defer notify)
                     save_tags_for_image(filename, tags_str)
@@ -697,6 +1089,7 @@ class CacheMapNode:
                      img = Image.fromarray(img_array)
                      img.save(save_path)
                      print(f"[CacheMap] Saved original image for overlay -> {save_path}")
+                     _on_map_written(cache_path, "original", save_path, img)
                      
                      # Save tags for original image
                      save_tags_for_image(filename, tags_str)
@@ -763,6 +1156,7 @@ class CacheMapNode:
             img = Image.fromarray(img_array)
             img.save(save_path)
             print(f"[CacheMap] Saved {'(FORCED) ' if force_generation else ''}{target_type} map to {save_path}")
+            _on_map_written(cache_path, target_type, save_path, img)
 
             # Save tags when generating/regenerating
             save_tags_for_image(filename, tags_str)
@@ -806,25 +1200,32 @@ class CacheMapBrowserNode:
                 "extra_path": ("STRING", {"default": "", "tooltip": "Additional path to browse."}),
                  # Filename widget will be populated by JS
                 "filename": ("STRING", {"default": "", "tooltip": "Selected filename (relative to cache/extra path)."}),
+                # Batch mode: used instead of `filename` when either is set
+                "filenames": ("STRING", {"default": "", "multiline": True, "tooltip": "Batch: one file per line (ctrl+click in the browser adds/removes files)."}),
+                "query": ("STRING", {"default": "", "tooltip": "Batch: tag expression, e.g. 'portrait AND NOT nsfw'. Loads every match (up to max_images)."}),
+                "query_type": ("STRING", {"default": "", "tooltip": "Batch: restrict the query to one map type (subfolder)."}),
+                "max_images": ("INT", {"default": 64, "min": 1, "max": 4096, "tooltip": "Batch: maximum number of images loaded."}),
+                "fit": (list(BATCH_FIT_MODES), {"default": "letterbox", "tooltip": "Batch: how images of other sizes fill the batch size. Letterbox padding is masked (mask = 1)."}),
+                "width": ("INT", {"default": 0, "min": 0, "max": 16384, "tooltip": "Batch width; 0 = width of the first image."}),
+                "height": ("INT", {"default": 0, "min": 0, "max": 16384, "tooltip": "Batch height; 0 = height of the first image."}),
+                "chunk_size": ("INT", {"default": 0, "min": 0, "max": 4096, "tooltip": "Batch: split into batches of this many images, processed one after another downstream. 0 = one batch."}),
             }
         }
 
-    RETURN_TYPES = ("IMAGE", "MASK")
-    RETURN_NAMES = ("image", "mask")
+    RETURN_TYPES = ("IMAGE", "MASK", "IMAGE", "MASK")
+    RETURN_NAMES = ("image", "mask", "batches", "batch_masks")
+    # image/mask stay single outputs (the first batch in batch mode);
+    # batches/batch_masks list every chunk so each runs downstream separately.
+    OUTPUT_IS_LIST = (False, False, True, True)
     FUNCTION = "load_image"
     CATEGORY = "ErosDiffusion"
     DESCRIPTION = "Visual browser for cache maps. Adds a 'Open Browser' button to browse and select maps from the sidebar."
 
-    def load_image(self, cache_path, filename, extra_path=None):
-        # Determine full path
-        # filename is relative e.g. "depth/my_file.png"
-        
-        image_path = None
-
-        # Defensive: if filename is empty or None, return empty tensors
+    @staticmethod
+    def _resolve_image_path(cache_path, filename, extra_path=None):
+        """Full path of `filename` (relative, e.g. "depth/my_file.png"), or None."""
         if not filename or not str(filename).strip():
-            print(f"[CacheMapBrowser] load_image called with empty filename (cache_path={cache_path})")
-            return (torch.zeros((1, 512, 512, 3)), torch.zeros((1, 512, 512)))
+            return None
 
         # Resolve base cache directory: use provided cache_path or default maps dir
         base_cache = cache_path or default_maps_dir
@@ -835,29 +1236,57 @@ class CacheMapBrowserNode:
         # Try direct join (handles prefixed 'type/filename' entries)
         p1 = os.path.join(base_cache, filename)
         if os.path.exists(p1) and os.path.isfile(p1):
-            image_path = p1
+            return p1
         # Try extra_path if provided
-        elif extra_path:
+        if extra_path:
             ep = extra_path or ""
             if not os.path.isabs(ep):
                 ep = os.path.join(folder_paths.get_input_directory(), ep)
             p2 = os.path.join(ep, filename)
             if os.path.exists(p2) and os.path.isfile(p2):
-                image_path = p2
-        else:
+                return p2
+        elif "/" in filename:
             # As a fallback, if filename contains a prefix like 'type/name', also try splitting
-            if "/" in filename:
-                parts = filename.split("/")
-                sub = parts[0]
-                name_only = "/".join(parts[1:])
-                alt = os.path.join(base_cache, sub, name_only)
-                if os.path.exists(alt) and os.path.isfile(alt):
-                    image_path = alt
-        
+            parts = filename.split("/")
+            sub = parts[0]
+            name_only = "/".join(parts[1:])
+            alt = os.path.join(base_cache, sub, name_only)
+            if os.path.exists(alt) and os.path.isfile(alt):
+                return alt
+        return None
+
+    @classmethod
+    def IS_CHANGED(s, cache_path="", filename="", extra_path=None, filenames="", query="", query_type="", **kwargs):
+        """Selected file(s) plus size/mtime: unchanged selections reuse ComfyUI's cached output."""
+        if query and query.strip():
+            # Any catalog change under the root may change the matches
+            root = os.path.abspath(CacheMapNode._resolve_cache_path(cache_path))
+            return f"query:{query}:{query_type}:{metadata_manager.get_root_fingerprint(root)}"
+        names = _parse_batch_filenames(filenames)
+        if names:
+            return file_fingerprint(
+                [s._resolve_image_path(cache_path, n, extra_path) or f"missing:{n}" for n in names]
+            )
+        image_path = s._resolve_image_path(cache_path, filename, extra_path)
+        if image_path is None:
+            return f"missing:{filename}"
+        return file_fingerprint([image_path])
+
+    def load_image(self, cache_path, filename="", extra_path=None, filenames="", query="", query_type="",
+                   max_images=64, fit="letterbox", width=0, height=0, chunk_size=0):
+        if (query and query.strip()) or _parse_batch_filenames(filenames):
+            return self._load_batch(cache_path, extra_path, filenames, query, query_type,
+                                    max_images, fit, width, height, chunk_size)
+
+        # Defensive: if filename is empty or None, return empty tensors
+        if not filename or not str(filename).strip():
+            print(f"[CacheMapBrowser] load_image called with empty filename (cache_path={cache_path})")
+            return self._outputs([torch.zeros((1, 512, 512, 3))], [torch.zeros((1, 512, 512))])
+
+        image_path = self._resolve_image_path(cache_path, filename, extra_path)
         if image_path is None:
-            #  print(f"[CacheMapBrowser] File not found: {filename}")
-             # Return empty
-             return (torch.zeros((1, 512, 512, 3)), torch.zeros((1, 512, 512)))
+            # File not found: return empty
+            return self._outputs([torch.zeros((1, 512, 512, 3))], [torch.zeros((1, 512, 512))])
 
         img = Image.open(image_path)
         img = ImageOps.exif_transpose(img)
@@ -872,7 +1301,163 @@ class CacheMapBrowserNode:
         output_image = np.array(img).astype(np.float32) / 255.0
         output_image = torch.from_numpy(output_image)[None,]
         
-        return (output_image, mask)
+        return self._outputs([output_image], [mask])
+
+    @staticmethod
+    def _outputs(images, masks):
+        """(image, mask, batches, batch_masks) from per-chunk lists."""
+        return (images[0], masks[0], images, masks)
+
+    def _load_batch(self, cache_path, extra_path, filenames, query, query_type,
+                    max_images, fit, width, height, chunk_size):
+        """Decode many maps in parallel into [B,H,W,3] images and [B,H,W] masks."""
+        if query and query.strip():
+            root = os.path.abspath(CacheMapNode._resolve_cache_path(cache_path))
+            if root not in _catalog_scanned_roots:
+                # Cold catalog: reconcile only the folder being queried; a
+                # warm one is kept current by the nodes, routes and watcher
+                if query_type:
+                    _catalog_scan(root, map_types=[query_type])
+                elif not (metadata_manager.get_root_fingerprint(root) or (0,))[0]:
+                    # Nothing cataloged for this root yet: scan every type
+                    _catalog_scan(root)
+            paths, cursor = [], None
+            while len(paths) < max_images:
+                page = metadata_manager.query_images(
+                    root, expression=query, map_type=query_type or None,
+                    limit=min(1000, max_images - len(paths)), cursor=cursor,
+                )
+                paths += [os.path.join(root, i["map_type"], i["filename"]) for i in page["items"]]
+                cursor = page["next_cursor"]
+                if not cursor:
+                    break
+        else:
+            paths = []
+            for name in _parse_batch_filenames(filenames)[:max_images]:
+                path = self._resolve_image_path(cache_path, name, extra_path)
+                if path is None:
+                    print(f"[CacheMapBrowser] Batch: file not found: {name}")
+                else:
+                    paths.append(path)
+
+        if not paths:
+            print("[CacheMapBrowser] Batch: nothing to load")
+            return self._outputs([torch.zeros((1, 512, 512, 3))], [torch.zeros((1, 512, 512))])
+
+        if not width or not height:
+            first_w, first_h = _first_readable_size(paths)
+            width, height = width or first_w, height or first_h
+
+        size = chunk_size if chunk_size and chunk_size > 0 else len(paths)
+        images, masks = [], []
+        for start in range(0, len(paths), size):
+            chunk_images, chunk_masks = _decode_batch(paths[start:start + size], width, height, fit)
+            images.append(chunk_images)
+            masks.append(chunk_masks)
+        print(f"[CacheMapBrowser] Batch: loaded {len(paths)} map(s) at {width}x{height} in {len(images)} chunk(s)")
+        return self._outputs(images, masks)
+
+
+BATCH_FIT_MODES = ("letterbox", "stretch", "crop")
+BATCH_DECODE_WORKERS = max(2, min(8, os.cpu_count() or 2))
+_batch_pool = None
+
+
+def _parse_batch_filenames(value):
+    """One file per line, or a JSON list."""
+    if not value or not str(value).strip():
+        return []
+    value = str(value).strip()
+    if value.startswith("["):
+        try:
+            return [str(v).strip() for v in json.loads(value) if str(v).strip()]
+        except ValueError:
+            pass
+    return [line.strip() for line in value.splitlines() if line.strip()]
+
+
+def _oriented_size(path):
+    """(width, height) after EXIF rotation, read from the header only."""
+    header = read_image_header(path)
+    if header is not None:
+        return oriented_size(header)
+    with Image.open(path) as img:
+        w, h = img.size
+        try:
+            # Orientations 5-8 are rotated by 90 degrees
+            if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+                w, h = h, w
+        except Exception:
+            pass
+    return w, h
+
+
+def _first_readable_size(paths):
+    """Oriented size of the first file that can be read; 512x512 if none can."""
+    for path in paths:
+        try:
+            return _oriented_size(path)
+        except (OSError, UnidentifiedImageError) as e:
+            print(f"[CacheMapBrowser] Batch: could not read the size of {path}: {e}")
+    return 512, 512
+
+
+def _fit_placement(src_w, src_h, width, height, fit):
+    """(resize_w, resize_h, crop_box or None, paste_x, paste_y) for one image."""
+    if fit == "stretch":
+        return width, height, None, 0, 0
+    if fit == "crop":
+        scale = max(width / src_w, height / src_h)
+        rw, rh = max(width, round(src_w * scale)), max(height, round(src_h * scale))
+        left, top = (rw - width) // 2, (rh - height) // 2
+        return rw, rh, (left, top, left + width, top + height), 0, 0
+    scale = min(width / src_w, height / src_h)
+    rw, rh = max(1, round(src_w * scale)), max(1, round(src_h * scale))
+    return rw, rh, None, (width - rw) // 2, (height - rh) // 2
+
+
+def _decode_into(path, images, masks, index, width, height, fit):
+    """Decode one map into row `index` of the preallocated batch tensors."""
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img)
+        alpha = img.getchannel("A") if "A" in img.getbands() else None
+        rgb = img.convert("RGB")
+    rw, rh, crop, x, y = _fit_placement(rgb.width, rgb.height, width, height, fit)
+
+    def place(layer):
+        if layer.size != (rw, rh):
+            layer = layer.resize((rw, rh), Image.BICUBIC)
+        if crop is not None:
+            layer = layer.crop(crop)
+        return layer
+
+    rgb = place(rgb)
+    h, w = rgb.height, rgb.width
+    images[index, y:y + h, x:x + w] = torch.from_numpy(np.asarray(rgb, dtype=np.float32) / 255.0)
+    if alpha is not None:
+        masks[index, y:y + h, x:x + w] = 1.0 - torch.from_numpy(np.asarray(place(alpha), dtype=np.float32) / 255.0)
+    else:
+        masks[index, y:y + h, x:x + w] = 0.0
+
+
+def _decode_batch(paths, width, height, fit):
+    """Preallocate [B,H,W,3] / [B,H,W] and fill them on a thread pool (PIL releases the GIL)."""
+    global _batch_pool
+    if _batch_pool is None:
+        _batch_pool = ThreadPoolExecutor(max_workers=BATCH_DECODE_WORKERS, thread_name_prefix="eros-batch")
+    images = torch.zeros((len(paths), height, width, 3), dtype=torch.float32)
+    # Padding (and undecodable files) stay masked
+    masks = torch.ones((len(paths), height, width), dtype=torch.float32)
+    futures = [
+        _batch_pool.submit(_decode_into, path, images, masks, i, width, height, fit)
+        for i, path in enumerate(paths)
+    ]
+    for path, future in zip(paths, futures):
+        try:
+            future.result()
+        except Exception as e:
+            print(f"[CacheMapBrowser] Batch: could not decode {path}: {e}")
+    return images, masks
 
 NODE_CLASS_MAPPINGS = {
     "CacheMapNode": CacheMapNode,
@@ -887,7 +1472,17 @@ NODE_DISPLAY_NAME_MAPPINGS = {
 
 # ================= API Routes =================
 
+def _list_dirs(target_path):
+    index = get_input_index()
+    if index.indexes(target_path):
+        return index.dirs(index.relpath(target_path))
+    if not os.path.exists(target_path):
+        return []
+    return sorted(d for d in os.listdir(target_path) if os.path.isdir(os.path.join(target_path, d)))
+
+
 @PromptServer.instance.routes.get("/eros/cache/fetch_dirs")
+@limit_concurrency("listing")
 async def fetch_dirs(request):
     # Use default maps dir when no path provided or path is empty
     target_path = request.rel_url.query.get("path", "")
@@ -897,48 +1492,316 @@ async def fetch_dirs(request):
         # Accept relative paths: resolve against Comfy input directory
         if not os.path.isabs(target_path):
             target_path = os.path.join(folder_paths.get_input_directory(), target_path)
-    if not os.path.exists(target_path):
-         return web.json_response({"dirs": []})
-    
-    dirs = [d for d in os.listdir(target_path) if os.path.isdir(os.path.join(target_path, d))]
-    return web.json_response({"dirs": sorted(dirs)})
 
-@PromptServer.instance.routes.get("/eros/cache/fetch_files")
-async def fetch_files(request):
-    # Use default maps dir when no path provided or path is empty
-    target_path = request.rel_url.query.get("path", "")
-    if not target_path:
-        target_path = default_maps_dir
-    else:
-        if not os.path.isabs(target_path):
-            target_path = os.path.join(folder_paths.get_input_directory(), target_path)
+    dirs = await run_io(_list_dirs, target_path)
+    return web.json_response({"dirs": dirs})
 
-    # Optional subfolder (e.g. map_type)
-    subfolder = request.rel_url.query.get("subfolder", "")
-    # Sanitize accidental object stringification from client-side
-    if isinstance(subfolder, str) and "[object Object]" in subfolder:
-        subfolder = ""
+def _list_image_files(search_path):
+    files = []
+    with os.scandir(search_path) as it:
+        for entry in it:
+            if os.path.splitext(entry.name)[1].lower() in VALID_IMAGE_EXTENSIONS and entry.is_file():
+                files.append(entry.name)
+    return sorted(files)
 
-    search_path = os.path.join(target_path, subfolder) if subfolder else target_path
 
-    if not os.path.exists(search_path):
-         return web.json_response({"files": []})
+FETCH_FILES_SORTS = {
+    "name": lambda e: e["name"],
+    "mtime": lambda e: e["mtime"],
+    "size": lambda e: e["bytes"],
+}
+
+# (path, bytes, mtime) -> (width, height) for files outside the catalog
+_dimension_cache = {}
+_DIMENSION_CACHE_MAX = 50000
+
+
+def _scan_image_entries(search_path):
+    """One os.scandir pass: name, size and mtime of every image in a folder."""
+    entries = []
+    with os.scandir(search_path) as it:
+        for entry in it:
+            if os.path.splitext(entry.name)[1].lower() not in VALID_IMAGE_EXTENSIONS:
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append({"name": entry.name, "bytes": st.st_size, "mtime": st.st_mtime})
+    return entries
+
+
+def _attach_dimensions(search_path, entries):
+    """Fill width/height for a page of entries.
+
+    Catalog rows (one query for the page) are used when their size and mtime
+    still match; other files get a header-only read whose result is memoized
+    in-process.
+    """
+    fulls = [os.path.abspath(os.path.join(search_path, e["name"])) for e in entries]
+    rows = metadata_manager.get_image_files(fulls)
+    for e, full in zip(entries, fulls):
+        width = height = None
+        row = rows.get(full)
+        if row and row["bytes"] == e["bytes"] and row["mtime"] == e["mtime"]:
+            width, height = row["width"], row["height"]
+        if width is None:
+            key = (full, e["bytes"], e["mtime"])
+            dims = _dimension_cache.get(key)
+            if dims is None:
+                try:
+                    with Image.open(full) as im:
+                        dims = im.size
+                except Exception:
+                    dims = (None, None)
+                if len(_dimension_cache) >= _DIMENSION_CACHE_MAX:
+                    _dimension_cache.clear()
+                _dimension_cache[key] = dims
+            width, height = dims
+        e["width"], e["height"] = width, height
+    return entries
+
+
+# search_path -> (folder mtime_ns, scanned_at, entries, {sort: (sorted entries, keys)})
+_listing_cache = collections.OrderedDict()
+_listing_cache_lock = threading.Lock()
+_LISTING_CACHE_MAX = 32
+# Rewriting a file in place leaves the folder mtime alone: rescan after this long anyway
+_LISTING_CACHE_TTL = 10.0
+
+
+def _sorted_image_entries(search_path, sort):
+    """(entries sorted ascending by (sort key, name), their keys), cached per folder.
+
+    Pages of the same folder reuse one scan and one sort while its mtime is
+    unchanged (files added, removed or renamed change it).
+    """
+    key = FETCH_FILES_SORTS[sort]
+    mtime_ns = os.stat(search_path).st_mtime_ns
+    with _listing_cache_lock:
+        cached = _listing_cache.get(search_path)
+        if cached and (cached[0] != mtime_ns or time.monotonic() - cached[1] > _LISTING_CACHE_TTL):
+            cached = None
+        if cached:
+            _listing_cache.move_to_end(search_path)
+            if sort in cached[3]:
+                return cached[3][sort]
+    if cached is None:
+        cached = (mtime_ns, time.monotonic(), _scan_image_entries(search_path), {})
+    ordered = sorted(cached[2], key=lambda e: (key(e), e["name"]))
+    result = (ordered, [(key(e), e["name"]) for e in ordered])
+    with _listing_cache_lock:
+        cached[3][sort] = result
+        _listing_cache[search_path] = cached
+        _listing_cache.move_to_end(search_path)
+        while len(_listing_cache) > _LISTING_CACHE_MAX:
+            _listing_cache.popitem(last=False)
+    return result
+
+
+def _page_image_entries(search_path, sort="name", order="asc", limit=200, cursor=None):
+    """Sorted, keyset-paginated listing for fetch_files v2.
+
+    Returns (entries, next_cursor, total). Raises ValueError for an unknown
+    sort or a malformed cursor.
+    """
+    if sort not in FETCH_FILES_SORTS:
+        raise ValueError(f"Unknown sort '{sort}'")
+    descending = str(order).lower() == "desc"
+    limit = max(1, min(int(limit or 200), 5000))
+
+    ordered, keys = _sorted_image_entries(search_path, sort)
+    total = len(ordered)
+    last = tuple(decode_query_cursor(cursor)) if cursor else None
+    try:
+        if descending:
+            end = bisect.bisect_left(keys, last) if last else total
+            start = max(0, end - limit)
+            page = ordered[start:end][::-1]
+            more = start > 0
+        else:
+            start = bisect.bisect_right(keys, last) if last else 0
+            page = ordered[start:start + limit]
+            more = start + limit < total
+    except TypeError:
+        # e.g. a cursor of another sort
+        raise ValueError("Malformed cursor")
+
+    # Copies: width/height are added per request, the cached entries stay as scanned
+    page = [dict(e) for e in page]
+    next_cursor = None
+    if more and page:
+        next_cursor = encode_query_cursor([FETCH_FILES_SORTS[sort](page[-1]), page[-1]["name"]])
+    return _attach_dimensions(search_path, page), next_cursor, total
+
+
+async def _stream_image_entries(request, search_path, sort, order, limit, cursor):
+    """NDJSON variant of fetch_files v2: one entry per line, then a summary line.
+
+    With sort=none entries are written in directory order while the folder is
+    still being scanned, so the first rows arrive before the scan finishes.
+    """
+    resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await resp.prepare(request)
+
+    async def write_lines(items):
+        if items:
+            await resp.write("".join(json.dumps(i) + "\n" for i in items).encode("utf-8"))
+
+    if sort == "none":
+        # No limit when the client sends none (the JS default)
+        batches = iter_file_batches(search_path, VALID_IMAGE_EXTENSIONS, int(limit) if limit else None)
+        try:
+            while True:
+                batch = await run_io(next, batches, None)
+                if not batch:
+                    break
+                await write_lines(await run_io(_attach_dimensions, search_path, batch))
+        finally:
+            try:
+                batches.close()
+            except ValueError:
+                pass  # cancelled while a batch was being read; the scan ends with it
+        await write_lines([{"done": True, "next_cursor": None, "total": None}])
+    else:
+        entries, next_cursor, total = await run_io(
+            _page_image_entries, search_path, sort, order, limit, cursor
+        )
+        for i in range(0, len(entries), 256):
+            await write_lines(entries[i : i + 256])
+        await write_lines([{"done": True, "next_cursor": next_cursor, "total": total}])
+
+    await resp.write_eof()
+    return resp
+
+
+@PromptServer.instance.routes.get("/eros/cache/fetch_files")
+@limit_concurrency("listing")
+async def fetch_files(request):
+    """List the images in a cache folder.
+
+    Without extra params this returns `{"files": [names]}` sorted by name.
+    Any of the v2 params switches to a paginated, metadata-rich listing:
+      - sort: name | mtime | size (default name); `none` is allowed with ndjson
+      - order: asc | desc
+      - limit: page size (default 200, max 5000)
+      - cursor: `next_cursor` of the previous page
+      - format: json (default) | ndjson (streamed, one entry per line)
+    v2 JSON responses are `{"files", "entries", "next_cursor", "total"}` where
+    each entry has name, bytes, mtime, width and height.
+    """
+    # Use default maps dir when no path provided or path is empty
+    target_path = request.rel_url.query.get("path", "")
+    if not target_path:
+        target_path = default_maps_dir
+    else:
+        if not os.path.isabs(target_path):
+            target_path = os.path.join(folder_paths.get_input_directory(), target_path)
+
+    # Optional subfolder (e.g. map_type)
+    subfolder = request.rel_url.query.get("subfolder", "")
+    # Sanitize accidental object stringification from client-side
+    if isinstance(subfolder, str) and "[object Object]" in subfolder:
+        subfolder = ""
+
+    search_path = os.path.join(target_path, subfolder) if subfolder else target_path
+
+    query = request.rel_url.query
+    v2 = query.get("v") == "2" or any(k in query for k in ("sort", "order", "limit", "cursor", "format"))
+
+    if not await run_io(os.path.exists, search_path):
+         if v2:
+             return web.json_response({"files": [], "entries": [], "next_cursor": None, "total": 0})
+         return web.json_response({"files": []})
+
+    if v2:
+        sort = query.get("sort", "name")
+        order = query.get("order", "asc")
+        limit = query.get("limit") or None
+        cursor = query.get("cursor") or None
+        try:
+            if query.get("format") == "ndjson":
+                # Validate up front: errors cannot be reported once streaming starts.
+                if sort != "none" and sort not in FETCH_FILES_SORTS:
+                    raise ValueError(f"Unknown sort '{sort}'")
+                if limit is not None:
+                    int(limit)
+                if cursor:
+                    decode_query_cursor(cursor)
+                return await _stream_image_entries(request, search_path, sort, order, limit, cursor)
+            entries, next_cursor, total = await run_io(
+                _page_image_entries, search_path, sort, order, limit, cursor
+            )
+        except ValueError as ve:
+            return web.json_response({"error": str(ve)}, status=400)
+        except Exception as e:
+            return web.json_response({"error": str(e)}, status=500)
+        return web.json_response({
+            "files": [e["name"] for e in entries],
+            "entries": entries,
+            "next_cursor": next_cursor,
+            "total": total,
+        })
 
-    valid_ext = {".png", ".jpg", ".jpeg", ".webp", ".bmp"}
-    files = []
-    
     try:
-        for f in os.listdir(search_path):
-            if os.path.isfile(os.path.join(search_path, f)):
-                ext = os.path.splitext(f)[1].lower()
-                if ext in valid_ext:
-                    files.append(f)
+        files = await run_io(_list_image_files, search_path)
     except Exception as e:
          return web.json_response({"error": str(e)}, status=500)
          
-    return web.json_response({"files": sorted(files)})
+    return web.json_response({"files": files})
+
+# Browsers may reuse an image for this long before revalidating with the
+# ETag; the grid changes its URLs after eros.map.saved, so edits show up
+# immediately regardless.
+IMAGE_CACHE_CONTROL = "private, max-age=300"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+async def _cached_file_response(request, path: str, content_type: str = None):
+    """FileResponse with validators; answers conditional requests with 304.
+
+    The ETag is derived from size + mtime of the served file (the same form
+    aiohttp uses), and If-None-Match takes precedence over If-Modified-Since.
+    """
+    st = await run_io(os.stat, path)
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": IMAGE_CACHE_CONTROL,
+    }
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return web.Response(status=304, headers=headers)
+    else:
+        since = request.headers.get("If-Modified-Since")
+        if since:
+            try:
+                if int(st.st_mtime) <= parsedate_to_datetime(since).timestamp():
+                    return web.Response(status=304, headers=headers)
+            except (TypeError, ValueError):
+                pass
+
+    if content_type:
+        headers["Content-Type"] = content_type
+    return web.FileResponse(path, headers=headers)
+
 
 @PromptServer.instance.routes.get("/eros/cache/view_image")
+@limit_concurrency("images")
 async def view_image(request):
     filename = request.rel_url.query.get("filename")
     if not filename:
@@ -958,14 +1821,306 @@ async def view_image(request):
 
     full_path = os.path.join(target_path, subfolder, filename) if subfolder else os.path.join(target_path, filename)
 
-    if not os.path.exists(full_path):
+    if not await run_io(os.path.exists, full_path):
+        return web.Response(status=404)
+
+    # ?size=<px>[&format=webp|jpeg] serves a cached thumbnail instead of the full map
+    size = request.rel_url.query.get("size")
+    if size:
+        fmt = request.rel_url.query.get("format", "webp").lower()
+        try:
+            thumb_path = await thumbnails.get_thumbnail(full_path, size, fmt)
+        except ValueError as ve:
+            return web.json_response({"error": str(ve)}, status=400)
+        except FileNotFoundError:
+            return web.Response(status=404)
+        except Exception as e:
+            print(f"[CacheMap] Thumbnail failed for {full_path}: {e}")
+            return await _cached_file_response(request, full_path)
+        return await _cached_file_response(request, thumb_path, thumbnails.THUMB_FORMATS[fmt][1])
+
+    return await _cached_file_response(request, full_path)
+
+
+@PromptServer.instance.routes.get("/eros/metrics")
+@limit_concurrency("metrics")
+async def eros_metrics(request):
+    """Per-route counters, latency histograms, bytes and phase times (Prometheus text)."""
+    return web.Response(
+        body=route_metrics.render().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+@PromptServer.instance.routes.get("/eros/metrics/slow")
+@limit_concurrency("metrics")
+async def eros_slow_requests(request):
+    """Recent requests over `metrics.slow_request_ms`, newest first, with their query params."""
+    return web.json_response({
+        "slow_request_ms": route_metrics.slow_request_ms,
+        "requests": list(reversed(route_metrics.slow)),
+    })
+
+
+# Atlas responses per (root, query, catalog head); the images themselves are
+# keyed by the page's files, so a catalog change that leaves a page alone
+# re-uses its sheet.
+_ATLAS_RESPONSE_MAX = 128
+_atlas_responses = {}
+_ATLAS_NAME_CHARS = set("0123456789abcdef")
+
+
+@PromptServer.instance.routes.get("/eros/cache/atlas")
+@limit_concurrency("images")
+async def cache_atlas(request):
+    """Contact sheet for one grid page: a packed image plus tile rectangles.
+
+    Query params: those of /eros/cache/query (path, q, type, name, sort,
+    order, cursor, total; limit defaults to 100, max 400) plus
+      - tile: cell edge in px, snapped like thumbnail sizes (default 128)
+      - columns: grid width in tiles (default: roughly square)
+      - format: webp (default) | jpeg
+
+    Returns JSON with `image` (URL of the sheet), `width`/`height`, `tile`,
+    `columns`, `tiles` (the query items, each with `x`, `y`, `w`, `h` of its
+    pixels in the sheet, or `missing: true`) and the page's `next_cursor`.
+    Results are cached by catalog version.
+    """
+    try:
+        query = request.rel_url.query
+        cache_root = _resolve_cache_root(query.get("path", ""))
+        tile = thumbnails.snap_size(query.get("tile", 128))
+        columns = int(query["columns"]) if query.get("columns") else None
+        fmt = query.get("format", "webp").lower()
+        if fmt not in thumbnails.THUMB_FORMATS:
+            raise ValueError(f"Unsupported atlas format '{fmt}'")
+        limit = max(1, min(int(query.get("limit", 100)), thumbnails.ATLAS_MAX_TILES))
+        await run_io(_ensure_catalog, cache_root)
+
+        head = await run_io(metadata_manager.get_catalog_head)
+        params = {k: query.get(k, "") for k in ("q", "type", "name", "sort", "order", "cursor", "total")}
+        cache_key = (cache_root, tuple(sorted(params.items())), limit, tile, columns, fmt, tuple(head))
+        cached = _atlas_responses.get(cache_key)
+        if cached is not None:
+            image_path = os.path.join(thumbnails.ATLAS_DIR, os.path.basename(cached["image"]))
+            if await run_io(os.path.isfile, image_path):
+                return web.json_response(cached)
+
+        page = await run_io(
+            metadata_manager.query_images,
+            cache_root,
+            expression=params["q"],
+            map_type=params["type"] or None,
+            name_contains=params["name"] or None,
+            sort=params["sort"] or "name",
+            order=params["order"] or "asc",
+            limit=limit,
+            cursor=params["cursor"] or None,
+            include_total=params["total"] in ("1", "true"),
+        )
+        items = page["items"]
+        key = thumbnails.atlas_key(
+            cache_root, tile, columns, fmt,
+            [(i["map_type"], i["filename"], i["mtime"], i["bytes"]) for i in items],
+        )
+        sources = [os.path.join(cache_root, i["map_type"], i["filename"]) for i in items]
+        image_path, layout = await thumbnails.get_atlas(key, sources, tile, columns, fmt)
+
+        tiles = []
+        for item, rect in zip(items, layout["rects"]):
+            entry = dict(item)
+            if rect is None:
+                entry["missing"] = True
+            else:
+                entry["x"], entry["y"], entry["w"], entry["h"] = rect
+            tiles.append(entry)
+        result = {
+            "image": f"/eros/cache/atlas/{os.path.basename(image_path)}",
+            "width": layout["width"],
+            "height": layout["height"],
+            "tile": layout["tile"],
+            "columns": layout["columns"],
+            "rows": layout["rows"],
+            "tiles": tiles,
+            "next_cursor": page["next_cursor"],
+            "total": page["total"],
+            "catalog_id": head[0],
+            "version": head[1],
+        }
+        if len(_atlas_responses) >= _ATLAS_RESPONSE_MAX:
+            _atlas_responses.pop(next(iter(_atlas_responses)))
+        _atlas_responses[cache_key] = result
+        return web.json_response(result)
+    except ValueError as ve:
+        return web.json_response({"error": str(ve)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+@PromptServer.instance.routes.get("/eros/cache/atlas/{name}")
+@limit_concurrency("images")
+async def cache_atlas_image(request):
+    name = request.match_info["name"]
+    stem, _, ext = name.partition(".")
+    if ext not in ("webp", "jpg") or len(stem) != 40 or not set(stem) <= _ATLAS_NAME_CHARS:
         return web.Response(status=404)
+    path = os.path.join(thumbnails.ATLAS_DIR, name)
+    if not await run_io(os.path.isfile, path):
+        return web.Response(status=404)
+    return await _cached_file_response(request, path, "image/webp" if ext == "webp" else "image/jpeg")
+
+
+@PromptServer.instance.routes.get("/eros/cache/stats")
+@limit_concurrency("metadata")
+async def catalog_stats(request):
+    """Per-map-type file counts and sizes from the images catalog.
+
+    Query params:
+      - path: optional cache root (relative to input dir). Defaults to input/maps.
+    """
+    try:
+        cache_root = _resolve_cache_root(request.rel_url.query.get("path", ""))
+        return web.json_response(await run_io(metadata_manager.get_catalog_stats, cache_root))
+    except ValueError as ve:
+        return web.json_response({"error": str(ve)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+@PromptServer.instance.routes.get("/eros/cache/catalog")
+@limit_concurrency("metadata")
+async def catalog_snapshot(request):
+    """Types, files, tag assignments and favorites for a cache root in one payload.
+
+    Query params:
+      - path: optional cache root (relative to input dir). Defaults to input/maps.
+      - since: `version` of a previous response; returns only the changes after it
+      - catalog_id: `catalog_id` of that response (a mismatch forces a snapshot)
+
+    Responses carry `full: true` for snapshots (also returned when a delta is
+    not possible) and `full: false` for deltas.
+    """
+    try:
+        query = request.rel_url.query
+        cache_root = _resolve_cache_root(query.get("path", ""))
+        catalog_events.watch_root(cache_root)
+        await run_io(_ensure_catalog, cache_root)
+        since = query.get("since", "")
+        if since:
+            result = await run_io(
+                metadata_manager.get_catalog_delta, cache_root, int(since), query.get("catalog_id") or None
+            )
+        else:
+            result = await run_io(metadata_manager.get_catalog_snapshot, cache_root)
+        if result["full"]:
+            # Empty map folders exist on disk only
+            dirs = await run_io(_list_dirs, cache_root)
+            result["types"] = sorted(set(result["types"]) | set(dirs))
+        return web.json_response(result)
+    except ValueError as ve:
+        return web.json_response({"error": str(ve)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+@PromptServer.instance.routes.get("/eros/cache/query")
+@limit_concurrency("metadata")
+async def query_cache(request):
+    """Filter cached maps server-side with a boolean tag expression.
+
+    Query params:
+      - path: optional cache root (relative to input dir). Defaults to input/maps.
+      - q: tag expression, e.g. `depth AND (portrait OR favorite) AND NOT nsfw`
+      - type: optional map type (subfolder)
+      - name: optional filename substring
+      - sort: name | mtime | size | added_at (default name)
+      - order: asc | desc
+      - limit: page size (default 100, max 1000)
+      - cursor: `next_cursor` from the previous page
+      - total: 1 to include the total match count
+    """
+    try:
+        query = request.rel_url.query
+        cache_root = _resolve_cache_root(query.get("path", ""))
+        await run_io(_ensure_catalog, cache_root)
+        result = await run_io(
+            metadata_manager.query_images,
+            cache_root,
+            expression=query.get("q", ""),
+            map_type=query.get("type", "") or None,
+            name_contains=query.get("name", "") or None,
+            sort=query.get("sort", "name"),
+            order=query.get("order", "asc"),
+            limit=int(query.get("limit", 100)),
+            cursor=query.get("cursor") or None,
+            include_total=query.get("total", "") in ("1", "true"),
+        )
+        return web.json_response(result)
+    except ValueError as ve:
+        return web.json_response({"error": str(ve)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
 
-    return web.FileResponse(full_path)
+
+@PromptServer.instance.routes.get("/eros/search")
+@limit_concurrency("metadata")
+async def search_maps(request):
+    """Ranked full-text search over basenames, tags and prompts.
+
+    Query params:
+      - q: free text; every word is matched as a prefix
+      - path: optional cache root (relative to input dir). Defaults to input/maps.
+      - type: optional map type
+      - limit / offset: paging (offset comes back as `next_offset`)
+    """
+    try:
+        query = request.rel_url.query
+        cache_root = _resolve_cache_root(query.get("path", ""))
+        if not await run_io(metadata_manager.has_search_index):
+            return web.json_response({"error": "Full-text search is not available (SQLite built without FTS5)"}, status=501)
+        await run_io(_ensure_catalog, cache_root)
+        result = await run_io(
+            metadata_manager.search_images,
+            query.get("q", ""),
+            root=cache_root,
+            map_type=query.get("type", "") or None,
+            limit=int(query.get("limit", 50)),
+            offset=int(query.get("offset", 0)),
+        )
+        return web.json_response(result)
+    except ValueError as ve:
+        return web.json_response({"error": str(ve)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+@PromptServer.instance.routes.post("/eros/cache/reindex")
+@limit_concurrency("archive")
+async def reindex_cache(request):
+    """Rebuild the images catalog for a cache root from the files on disk.
+
+    JSON body:
+      - path: optional cache root
+    """
+    try:
+        data = await request.json()
+    except Exception:
+        data = {}
+
+    try:
+        raw_path = data.get("path", "") if isinstance(data, dict) else ""
+        cache_root = _resolve_cache_root(raw_path)
+        stats = await run_io(_catalog_scan, cache_root)
+        return web.json_response({"success": True, **stats})
+    except ValueError as ve:
+        return web.json_response({"error": str(ve)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
 
 # ================= Favorites API =================
 
 @PromptServer.instance.routes.post("/eros/favorites/toggle")
+@limit_concurrency("metadata")
 async def toggle_favorite(request):
     try:
         data = await request.json()
@@ -973,20 +2128,22 @@ async def toggle_favorite(request):
         if not path:
             return web.json_response({"error": "Missing path"}, status=400)
         
-        is_fav = metadata_manager.toggle_favorite(path)
+        is_fav = await run_io(metadata_manager.toggle_favorite, path)
         return web.json_response({"path": path, "is_favorite": is_fav})
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
 @PromptServer.instance.routes.get("/eros/favorites/list")
+@limit_concurrency("metadata")
 async def list_favorites(request):
     try:
-        favs = metadata_manager.get_favorites()
+        favs = await run_io(metadata_manager.get_favorites)
         return web.json_response({"favorites": favs})
     except Exception as e:
         return web.json_response({"success": False, "error": str(e)}, status=500)
 
 @PromptServer.instance.routes.post("/eros/tags/auto_tag")
+@limit_concurrency("metadata")
 async def auto_tag_image(request):
     """
     Auto-tag an image using AI/LLM (placeholder implementation).
@@ -1008,6 +2165,7 @@ async def auto_tag_image(request):
 # ================= Tags API =================
 
 @PromptServer.instance.routes.post("/eros/tags/create")
+@limit_concurrency("metadata")
 async def create_tag(request):
     try:
         data = await request.json()
@@ -1015,7 +2173,7 @@ async def create_tag(request):
         if not name:
             return web.json_response({"error": "Missing tag name"}, status=400)
         
-        tag_id = metadata_manager.create_tag(name)
+        tag_id = await run_io(metadata_manager.create_tag, name)
         if tag_id:
             return web.json_response({"tag_id": tag_id, "name": name})
         else:
@@ -1024,6 +2182,7 @@ async def create_tag(request):
         return web.json_response({"error": str(e)}, status=500)
 
 @PromptServer.instance.routes.post("/eros/tags/add_to_image")
+@limit_concurrency("metadata")
 async def add_tag_to_image(request):
     try:
         data = await request.json()
@@ -1032,12 +2191,13 @@ async def add_tag_to_image(request):
         if not path or not tag:
             return web.json_response({"error": "Missing path or tag"}, status=400)
         
-        success = metadata_manager.add_tag_to_image(path, tag)
+        success = await run_io(metadata_manager.add_tag_to_image, path, tag)
         return web.json_response({"success": success, "path": path, "tag": tag})
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
 @PromptServer.instance.routes.post("/eros/tags/remove_from_image")
+@limit_concurrency("metadata")
 async def remove_tag_from_image(request):
     try:
         data = await request.json()
@@ -1046,32 +2206,35 @@ async def remove_tag_from_image(request):
         if not path or not tag:
             return web.json_response({"error": "Missing path or tag"}, status=400)
         
-        success = metadata_manager.remove_tag_from_image(path, tag)
+        success = await run_io(metadata_manager.remove_tag_from_image, path, tag)
         return web.json_response({"success": success, "path": path, "tag": tag})
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
 @PromptServer.instance.routes.get("/eros/tags/list")
+@limit_concurrency("metadata")
 async def list_tags(request):
     try:
-        tags = metadata_manager.get_all_tags()
+        tags = await run_io(metadata_manager.get_all_tags)
         return web.json_response({"tags": tags})
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
 @PromptServer.instance.routes.get("/eros/tags/for_image")
+@limit_concurrency("metadata")
 async def get_tags_for_image(request):
     try:
         path = request.rel_url.query.get("path")
         if not path:
             return web.json_response({"error": "Missing path"}, status=400)
         
-        tags = metadata_manager.get_tags_for_image(path)
+        tags = await run_io(metadata_manager.get_tags_for_image, path)
         return web.json_response({"path": path, "tags": tags})
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
 @PromptServer.instance.routes.delete("/eros/tags/delete")
+@limit_concurrency("metadata")
 async def delete_tag(request):
     try:
         data = await request.json()
@@ -1079,13 +2242,114 @@ async def delete_tag(request):
         if not name:
             return web.json_response({"error": "Missing tag name"}, status=400)
         
-        success = metadata_manager.delete_tag(name)
+        success = await run_io(metadata_manager.delete_tag, name)
         return web.json_response({"success": success, "name": name})
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
 
+def _resolve_map_targets(cache_root, basenames, map_types=None):
+    """Files of each basename under `<cache_root>/<map_type>/`, without walking the tree.
+
+    Catalog rows are combined with one probe per map type folder and image
+    extension (for files not cataloged yet), so the cost is O(map types) per
+    basename regardless of library size. Returns {basename: [path, ...]}.
+    """
+    cache_root = os.path.abspath(cache_root)
+    types = list(map_types) if map_types else _list_dirs(cache_root)
+    allowed = set(types)
+    targets = {}
+    seen = set()
+
+    def add(basename, path):
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen:
+            seen.add(key)
+            targets.setdefault(basename, []).append(os.path.abspath(path))
+
+    catalog = metadata_manager.get_files_for_basenames(cache_root, basenames)
+    for basename in basenames:
+        for map_type, filename, path in catalog.get(basename, []):
+            if map_type in allowed and os.path.isfile(path):
+                add(basename, path)
+        for map_type in types:
+            for ext in VALID_IMAGE_EXTENSIONS:
+                for candidate in (basename + ext, basename + ext.upper()):
+                    path = os.path.join(cache_root, map_type, candidate)
+                    if os.path.isfile(path):
+                        add(basename, path)
+    return targets
+
+
+def _remove_map_file(path):
+    os.remove(path)
+    try:
+        thumbnails.invalidate(path)
+    except Exception:
+        pass
+
+
+def _delete_map_files(target_path, subfolder, filename, basename, delete_all):
+    """Blocking part of delete_map. Returns (deleted, removed_tag_links), or None
+    when `delete_all` targets a cache path that does not exist."""
+    deleted = []
+    removed_paths = []
+
+    if delete_all:
+        if not os.path.exists(target_path):
+            return None
+        candidates = _resolve_map_targets(target_path, [basename]).get(basename, [])
+    elif filename:
+        # Accept either a subfolder+filename or filename that may already include subfolder
+        if subfolder and "/" not in filename:
+            candidates = [os.path.join(target_path, subfolder, filename)]
+        else:
+            candidates = [os.path.join(target_path, filename)]
+    elif subfolder and basename:
+        candidates = _resolve_map_targets(target_path, [basename], [subfolder]).get(basename, [])
+    else:
+        candidates = []
+
+    for full in candidates:
+        if not os.path.isfile(full):
+            continue
+        try:
+            _remove_map_file(full)
+            deleted.append(os.path.relpath(full, start=target_path))
+            removed_paths.append(os.path.abspath(full))
+        except Exception:
+            pass
+
+    # Remove tag associations for this basename and drop the catalog entry
+    # once no files or tags reference it, in one transaction.
+    removed_count = metadata_manager.forget_images(removed_paths, [basename] if basename else [])
+    return deleted, removed_count
+
+
+BULK_DELETE_LIMIT = 10000
+
+
+def _bulk_delete_maps(cache_root, basenames, map_types=None, remove_tags=True):
+    """Blocking part of bulk_delete: remove files, then update the DB in one batch."""
+    targets = _resolve_map_targets(cache_root, basenames, map_types)
+    results = []
+    removed_paths = []
+    for basename in basenames:
+        deleted = []
+        for full in targets.get(basename, []):
+            try:
+                _remove_map_file(full)
+                deleted.append(os.path.relpath(full, start=cache_root).replace("\\", "/"))
+                removed_paths.append(full)
+            except Exception:
+                pass
+        results.append({"basename": basename, "deleted": deleted})
+    removed_tag_links = metadata_manager.forget_images(removed_paths, basenames, remove_tags=remove_tags)
+    return results, removed_tag_links
+
+
 @PromptServer.instance.routes.post("/eros/cache/delete_map")
+@limit_concurrency("metadata")
 async def delete_map(request):
     """Delete a cached map file. JSON body expects:
        { "cache_path": <optional>, "subfolder": <optional>, "filename": <required>, "basename": <optional>, "delete_all": <bool> }
@@ -1115,50 +2379,14 @@ async def delete_map(request):
             if not os.path.isabs(target_path):
                 target_path = os.path.join(folder_paths.get_input_directory(), target_path)
 
-        deleted = []
-
         # Determine basename if missing
         if not basename and filename:
             basename = os.path.splitext(os.path.basename(filename))[0]
 
-        # If delete_all, scan subdirectories
-        if delete_all:
-            if not os.path.exists(target_path):
-                return web.json_response({"deleted": deleted})
-            for root, dirs, files in os.walk(target_path):
-                for f in list(files):
-                    if os.path.splitext(f)[0] == basename:
-                        p = os.path.join(root, f)
-                        try:
-                            os.remove(p)
-                            deleted.append(os.path.relpath(p, start=target_path))
-                        except Exception:
-                            pass
-        else:
-            # Delete the specific file path
-            # Accept either a subfolder+filename or filename that may already include subfolder
-            if subfolder and filename:
-                full = os.path.join(target_path, subfolder, filename)
-            elif filename and "/" in filename:
-                full = os.path.join(target_path, filename)
-            elif filename:
-                # try currentTab-like resolution: search for file in subfolders
-                full = os.path.join(target_path, filename)
-
-            if os.path.exists(full) and os.path.isfile(full):
-                try:
-                    os.remove(full)
-                    deleted.append(os.path.relpath(full, start=target_path))
-                except Exception:
-                    pass
-
-        # Remove tag associations for this basename
-        removed_count = 0
-        if basename:
-            try:
-                removed_count = metadata_manager.remove_tags_for_image(basename)
-            except Exception:
-                removed_count = 0
+        result = await run_io(_delete_map_files, target_path, subfolder, filename, basename, delete_all)
+        if result is None:
+            return web.json_response({"deleted": []})
+        deleted, removed_count = result
 
         # Notify frontend(s)
         try:
@@ -1173,424 +2401,1441 @@ async def delete_map(request):
         return web.json_response({"error": str(e)}, status=500)
 
 
-@PromptServer.instance.routes.get("/eros/cache/export_zip")
-async def export_zip(request):
-    """Export cache folder + sqlite dbs as a zip.
+@PromptServer.instance.routes.post("/eros/cache/bulk_delete")
+@limit_concurrency("metadata")
+async def bulk_delete(request):
+    """Delete the maps of many images at once. JSON body:
+       { "path": <optional cache root>, "basenames": [...], "types": [<optional map types>],
+         "remove_tags": <bool, default true unless types are given> }
 
-    Query params:
-      - path: optional cache root (relative to input dir). Defaults to input/maps.
+    Files are located per map type (no tree walk), catalog rows and tag links
+    are removed in one DB transaction, and a single `eros.images.deleted`
+    event is sent for the whole batch.
     """
     try:
-        raw_path = request.rel_url.query.get("path", "")
-        cache_root = _resolve_cache_root(raw_path)
-
-        if not os.path.exists(cache_root):
-            os.makedirs(cache_root, exist_ok=True)
-
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        out_name = f"eros_maps_export_{ts}.zip"
-
-        fd, tmp_path = tempfile.mkstemp(prefix="eros_maps_export_", suffix=".zip")
-        os.close(fd)
-
-        input_dir = os.path.abspath(folder_paths.get_input_directory())
-        cache_rel = os.path.relpath(cache_root, start=input_dir).replace("\\", "/")
-
+        data = await request.json()
+        cache_root = _resolve_cache_root(data.get("path", data.get("cache_path", "")))
+        basenames = [_sanitize_image_key(b) for b in (data.get("basenames") or []) if b]
+        basenames = list(dict.fromkeys(b for b in basenames if b))
+        if not basenames:
+            return web.json_response({"error": "Missing basenames"}, status=400)
+        if len(basenames) > BULK_DELETE_LIMIT:
+            return web.json_response({"error": f"At most {BULK_DELETE_LIMIT} basenames per request"}, status=400)
+        map_types = [str(t) for t in (data.get("types") or []) if t]
+        for t in map_types:
+            if t in (".", "..") or "/" in t or "\\" in t:
+                raise ValueError(f"Invalid map type '{t}'")
+        remove_tags = bool(data.get("remove_tags", not map_types))
+
+        results, removed_tag_links = await run_io(_bulk_delete_maps, cache_root, basenames, map_types, remove_tags)
+        payload = {"path": _describe_cache_root(cache_root), "items": results, "removed_tag_links": removed_tag_links}
         try:
-            with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-                # maps/*
-                for root, dirs, files in os.walk(cache_root):
-                    for f in files:
-                        full = os.path.join(root, f)
-                        rel = os.path.relpath(full, start=cache_root).replace("\\", "/")
-                        zf.write(full, arcname=f"maps/{rel}")
-
-                # db/*.sql
-                db_files = [
-                    os.path.join(NODE_DIR, f)
-                    for f in os.listdir(NODE_DIR)
-                    if f.lower().endswith(".db") and os.path.isfile(os.path.join(NODE_DIR, f))
-                ]
-                # Always include the metadata.db dump even if the file is missing
-                # (fresh install) so imports can still recreate it.
-                if DB_PATH not in db_files:
-                    db_files.append(DB_PATH)
-
-                for dbp in db_files:
-                    db_name = os.path.basename(dbp)
-                    sql_text = _dump_sqlite_db_to_sql(dbp, cache_root)
-                    zf.writestr(f"db/{db_name}.sql", sql_text)
-
-                # manifest
-                manifest = {
-                    "version": 1,
-                    "cache_root": cache_rel,
-                    "exported_at": ts,
-                    "db": [os.path.basename(p) + ".sql" for p in db_files],
-                }
-                zf.writestr("manifest.json", json.dumps(manifest, indent=2))
-
-            with open(tmp_path, "rb") as rf:
-                body = rf.read()
-
-            try:
-                os.remove(tmp_path)
-            except Exception:
-                pass
-
-            return web.Response(
-                body=body,
-                headers={
-                    "Content-Type": "application/zip",
-                    "Content-Disposition": f'attachment; filename="{out_name}"',
-                },
-            )
+            PromptServer.instance.send_sync("eros.images.deleted", payload)
         except Exception:
-            try:
-                if os.path.exists(tmp_path):
-                    os.remove(tmp_path)
-            except Exception:
-                pass
-            raise
+            pass
+        return web.json_response({"success": True, **payload})
+    except json.JSONDecodeError:
+        return web.json_response({"error": "Invalid JSON body"}, status=400)
     except ValueError as ve:
         return web.json_response({"error": str(ve)}, status=400)
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
 
-@PromptServer.instance.routes.post("/eros/cache/import_zip")
-async def import_zip(request):
-    """Import a zip created by /eros/cache/export_zip.
+# Already-compressed image formats are stored as-is; deflating them costs CPU
+# for ~0% gain. Everything else (SQL dumps, manifest, BMP) is deflated.
+_STORED_EXTENSIONS = {".png", ".webp", ".jpg", ".jpeg"}
 
-    Query params:
-      - path: optional cache root (relative to input dir). Defaults to input/maps.
 
-    Non-destructive merge: keeps existing local cache + DBs and adds missing data.
-    """
-    global metadata_manager
-    try:
-        raw_path = request.rel_url.query.get("path", "")
-        cache_root = _resolve_cache_root(raw_path)
-        os.makedirs(cache_root, exist_ok=True)
+def _export_compression(name: str) -> int:
+    if os.path.splitext(name)[1].lower() in _STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
 
-        reader = await request.multipart()
-        part = None
-        while True:
-            p = await reader.next()
-            if p is None:
-                break
-            if p.name in ("file", "archive"):
-                part = p
-                break
 
-        if not part:
-            return web.json_response({"error": "Missing upload field 'file'"}, status=400)
+def _export_db_files() -> list:
+    db_files = [
+        os.path.join(NODE_DIR, f)
+        for f in os.listdir(NODE_DIR)
+        if f.lower().endswith(".db") and os.path.isfile(os.path.join(NODE_DIR, f))
+    ]
+    # Always include the metadata.db dump even if the file is missing
+    # (fresh install) so imports can still recreate it.
+    if DB_PATH not in db_files:
+        db_files.append(DB_PATH)
+    return db_files
 
-        fd, tmp_zip = tempfile.mkstemp(prefix="eros_maps_import_", suffix=".zip")
-        os.close(fd)
-        try:
-            with open(tmp_zip, "wb") as f:
-                while True:
-                    chunk = await part.read_chunk(size=1024 * 512)
-                    if not chunk:
-                        break
-                    f.write(chunk)
-
-            imported_files = 0
-            skipped_files = 0
-            imported_dbs = 0
-            db_rows_added = 0
-            metadata_merge = {"favorites_added": 0, "tags_added": 0, "image_tags_added": 0}
-
-            with zipfile.ZipFile(tmp_zip, "r") as zf:
-                sql_by_db = {}
-                for info in _safe_zip_members(zf):
-                    name = info.filename
-                    if name.startswith("maps/"):
-                        rel = name[len("maps/") :]
-                        if not rel:
-                            continue
-                        # Prevent zip slip
-                        rel_parts = [p for p in rel.split("/") if p]
-                        if any(p == ".." for p in rel_parts):
-                            continue
-                        dest = os.path.abspath(os.path.join(cache_root, *rel_parts))
-                        if os.path.commonpath([cache_root, dest]) != cache_root:
-                            continue
-                        os.makedirs(os.path.dirname(dest), exist_ok=True)
-                        if os.path.exists(dest):
-                            skipped_files += 1
-                        else:
-                            with zf.open(info, "r") as src, open(dest, "wb") as out:
-                                shutil.copyfileobj(src, out)
-                            imported_files += 1
-                    elif name.startswith("db/") and name.endswith(".sql"):
-                        db_name = os.path.basename(name[:-4])  # strip .sql
-                        try:
-                            sql_text = zf.read(info).decode("utf-8", errors="replace")
-                            sql_by_db[db_name] = sql_text
-                        except Exception:
-                            pass
 
-                # Restore DBs from SQL
-                for db_name, sql_text in sql_by_db.items():
-                    # db_name should be like metadata.db
-                    if not db_name.lower().endswith(".db"):
-                        continue
-                    db_path = os.path.join(NODE_DIR, db_name)
-                    try:
-                        if os.path.abspath(db_path) == os.path.abspath(DB_PATH):
-                            m = _merge_metadata_db_from_sql(db_path, sql_text, cache_root)
-                            metadata_merge["favorites_added"] += int(m.get("favorites_added", 0) or 0)
-                            metadata_merge["tags_added"] += int(m.get("tags_added", 0) or 0)
-                            metadata_merge["image_tags_added"] += int(m.get("image_tags_added", 0) or 0)
-                            db_rows_added += (
-                                int(m.get("favorites_added", 0) or 0)
-                                + int(m.get("tags_added", 0) or 0)
-                                + int(m.get("image_tags_added", 0) or 0)
-                            )
-                            imported_dbs += 1
-                        else:
-                            g = _merge_generic_db_from_sql(db_path, sql_text)
-                            db_rows_added += int(g.get("rows_added", 0) or 0)
-                            imported_dbs += 1
-                    except Exception:
-                        # best-effort; continue
-                        pass
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
 
-            # Re-init metadata manager to ensure schema is available post-import
-            try:
-                metadata_manager = MetadataManager(DB_PATH)
-            except Exception:
-                pass
 
-            try:
-                PromptServer.instance.send_sync(
-                    "eros.cache.imported",
-                    {
-                        "imported_files": imported_files,
-                        "skipped_files": skipped_files,
-                        "imported_dbs": imported_dbs,
-                        "db_rows_added": db_rows_added,
-                        "metadata_merge": metadata_merge,
-                    },
-                )
-            except Exception:
-                pass
+def _parse_export_filters(params) -> dict:
+    """Export filters from query params or a JSON body. Raises ValueError."""
+    raw_types = params.get("types") or params.get("type") or []
+    if isinstance(raw_types, str):
+        raw_types = raw_types.split(",")
+    types = sorted({str(t).strip() for t in raw_types if str(t).strip()})
+    for t in types:
+        if t in (".", "..") or "/" in t or "\\" in t:
+            raise ValueError(f"Invalid map type '{t}'")
 
-            return web.json_response(
-                {
-                    "success": True,
-                    "imported_files": imported_files,
-                    "skipped_files": skipped_files,
-                    "imported_dbs": imported_dbs,
-                    "db_rows_added": db_rows_added,
-                    "metadata_merge": metadata_merge,
-                }
-            )
-        finally:
+    tags = str(params.get("tags") or params.get("q") or "").strip()
+    if tags:
+        parse_tag_query(tags)  # validate before streaming starts
+
+    favorites = params.get("favorites")
+    favorites = favorites is True or str(favorites).lower() in ("1", "true")
+
+    since = params.get("modified_since")
+    if since in (None, ""):
+        since = None
+    else:
+        try:
+            since = float(since)
+        except (TypeError, ValueError):
             try:
-                if os.path.exists(tmp_zip):
-                    os.remove(tmp_zip)
-            except Exception:
-                pass
+                since = datetime.fromisoformat(str(since)).timestamp()
+            except ValueError:
+                raise ValueError("modified_since must be unix seconds or an ISO 8601 date")
+    return {"types": types, "tags": tags, "favorites": favorites, "modified_since": since}
+
+
+def _same_content(path: str, size: int, previous) -> bool:
+    """Compare a file with a previous manifest entry (size, plus sha256 when given)."""
+    if isinstance(previous, dict):
+        prev_size, prev_hash = previous.get("size"), previous.get("sha256")
+    else:
+        prev_size, prev_hash = previous, None
+    if prev_size is None or int(prev_size) != size:
+        return False
+    return not prev_hash or _file_sha256(path) == prev_hash
+
+
+def _plan_export(cache_root: str, filters: dict, previous=None) -> dict:
+    """Pick the maps and metadata rows a filtered or differential export contains.
+
+    `previous` is the manifest.json of an earlier export (or just its
+    `files` mapping of arcname -> {size, sha256}); files that still match it
+    are left out, and metadata rows are limited to what changed since its
+    `exported_at_epoch` plus everything about the files being sent.
+    """
+    _ensure_catalog(cache_root)
+    rows = metadata_manager.select_export_files(
+        cache_root,
+        map_types=filters["types"],
+        expression=filters["tags"] or None,
+        favorites_only=filters["favorites"],
+        modified_since=filters["modified_since"],
+    )
+    prev_files, since = {}, None
+    if isinstance(previous, dict):
+        prev_files = previous.get("files", previous)
+        if not isinstance(prev_files, dict):
+            raise ValueError("manifest.files must map archive paths to sizes/hashes")
+        since = previous.get("exported_at_epoch")
+
+    files, selected_arcs, fresh = [], set(), set()
+    unchanged = 0
+    for r in rows:
+        arcname = f"maps/{r['map_type']}/{r['filename']}"
+        full = os.path.join(cache_root, r["map_type"], r["filename"])
+        try:
+            size = os.stat(full).st_size
+        except OSError:
+            continue
+        selected_arcs.add(arcname)
+        previous_entry = prev_files.get(arcname)
+        if previous_entry is not None and _same_content(full, size, previous_entry):
+            unchanged += 1
+            continue
+        files.append((full, arcname))
+        fresh.add(r["basename"])
+
+    return {
+        "files": files,
+        "basenames": sorted({r["basename"] for r in rows}),
+        "fresh": sorted(fresh),
+        "since": float(since) if since is not None else None,
+        "unchanged": unchanged,
+        "removed": sorted(a for a in prev_files if a.startswith("maps/") and a not in selected_arcs),
+        "filters": filters,
+        "differential": previous is not None,
+    }
+
+
+def _write_export_member(zf: zipfile.ZipFile, full: str, arcname: str) -> dict:
+    """Copy one file into the archive, hashing it on the way. Returns its manifest entry."""
+    zinfo = zipfile.ZipInfo.from_file(full, arcname)
+    zinfo.compress_type = _export_compression(full)
+    h = hashlib.sha256()
+    with open(full, "rb") as src, zf.open(zinfo, "w") as dst:
+        for chunk in iter(lambda: src.read(1 << 20), b""):
+            h.update(chunk)
+            dst.write(chunk)
+    return {"size": zinfo.file_size, "sha256": h.hexdigest()}
+
+
+# db/ members: binary SQLite snapshots by default, SQL text on request
+# (for installs that predate snapshot imports).
+EXPORT_DB_FORMATS = ("sqlite", "sql")
+
+
+def _export_db_snapshot(db_path: str, cache_root: str, db_format: str, keep=None):
+    """Produce one db/ member: a snapshot temp path, or SQL text for db_format='sql'.
+
+    metadata.db is sanitized for portability; other databases are copied as-is.
+    """
+    is_metadata = os.path.abspath(db_path) == os.path.abspath(DB_PATH)
+    sanitize_root = cache_root if is_metadata else None
+    if db_format == "sql":
+        return _dump_sqlite_db_to_sql(db_path, sanitize_root, keep)
+    if not os.path.isfile(db_path):
+        if not is_metadata:
+            return None
+        # Fresh install (or deleted file): let the live manager recreate the
+        # schema so imports can still recreate it
+        metadata_manager.reopen()
+    return _snapshot_sqlite_db(db_path, sanitize_root, keep)
+
+
+def _write_export_zip(
+    target, cache_root: str, cache_rel: str, ts: str, plan=None, db_format: str = "sqlite", on_progress=None
+) -> dict:
+    """Blocking part of export_zip: write maps + DB snapshots + manifest to `target`.
+
+    `target` is a path or a write-only file object; zipfile falls back to
+    data descriptors when it cannot seek, so the archive can be streamed.
+    The DB snapshots are produced on a second thread while the maps are written.
+
+    Without a `plan` everything under the cache root and every .db is
+    exported. With one (see _plan_export) only its files are written and
+    metadata.db is reduced to the matching rows.
+
+    `on_progress(phase=..., files_done=..., files_total=...)` is called
+    between members; raising from it aborts the export.
+    """
+    exported_at = time.time()
+    if plan is None:
+        db_files = _export_db_files()
+        members = []
+        for root, dirs, files in os.walk(cache_root):
+            for f in files:
+                full = os.path.join(root, f)
+                rel = os.path.relpath(full, start=cache_root).replace("\\", "/")
+                members.append((full, f"maps/{rel}"))
+        keep = None
+    else:
+        db_files = [DB_PATH]
+        members = plan["files"]
+        keep = (plan["basenames"], plan["fresh"], plan["since"])
+
+    ext = ".sqlite" if db_format == "sqlite" else ".sql"
+    dumper = ThreadPoolExecutor(max_workers=1, thread_name_prefix="eros-export-dump")
+    dumps = []
+    try:
+        dumps = [dumper.submit(_export_db_snapshot, dbp, cache_root, db_format, keep) for dbp in db_files]
+        with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            # maps/*
+            file_entries = {}
+            for done, (full, arcname) in enumerate(members):
+                if on_progress is not None:
+                    on_progress(phase="maps", files_done=done, files_total=len(members))
+                try:
+                    file_entries[arcname] = _write_export_member(zf, full, arcname)
+                except FileNotFoundError:
+                    continue
+
+            # db/*.sqlite (or db/*.sql)
+            if on_progress is not None:
+                on_progress(phase="metadata", files_done=len(members), files_total=len(members))
+            db_members = []
+            for dbp, dump in zip(db_files, dumps):
+                try:
+                    result = dump.result()
+                except Exception as e:
+                    print(f"[CacheMap] Warning: could not snapshot {os.path.basename(dbp)}: {e}")
+                    continue
+                if result is None:
+                    continue
+                arcname = f"db/{os.path.basename(dbp)}{ext}"
+                if db_format == "sql":
+                    zf.writestr(arcname, result, compress_type=zipfile.ZIP_DEFLATED)
+                else:
+                    zf.write(result, arcname=arcname, compress_type=zipfile.ZIP_DEFLATED)
+                db_members.append(os.path.basename(dbp) + ext)
+
+            # manifest (send it back as `manifest` for a differential export)
+            manifest = {
+                "version": 1,
+                "cache_root": cache_rel,
+                "exported_at": ts,
+                "exported_at_epoch": exported_at,
+                "db": db_members,
+                "db_format": db_format,
+                "files": file_entries,
+            }
+            if plan is not None:
+                manifest["filters"] = plan["filters"]
+                manifest["differential"] = plan["differential"]
+                manifest["unchanged"] = plan["unchanged"]
+                manifest["removed"] = plan["removed"]
+            zf.writestr("manifest.json", json.dumps(manifest, indent=2), compress_type=zipfile.ZIP_DEFLATED)
+        return {"files": len(file_entries), "db": db_members}
+    finally:
+        dumper.shutdown(wait=True, cancel_futures=True)
+        if db_format == "sqlite":
+            for dump in dumps:
+                if dump.done() and not dump.cancelled() and dump.exception() is None:
+                    _remove_quietly(dump.result())
+
+
+class _ResponseSink:
+    """Write-only file object feeding an aiohttp StreamResponse from a worker thread.
+
+    Bytes are gathered into CHUNK-sized blocks; each block is written on the
+    event loop and the worker waits for it, so a slow client throttles the
+    producer and at most one block is held in memory.
+    """
+
+    CHUNK = 256 * 1024
+
+    def __init__(self, response, loop):
+        self._response = response
+        self._loop = loop
+        self._buf = bytearray()
+        self.bytes_sent = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buf += data
+        if len(self._buf) >= self.CHUNK:
+            self._drain()
+        return len(data)
+
+    def flush(self):
+        if self._buf:
+            self._drain()
+
+    def _drain(self):
+        chunk = bytes(self._buf)
+        self._buf.clear()
+        asyncio.run_coroutine_threadsafe(self._response.write(chunk), self._loop).result()
+        self.bytes_sent += len(chunk)
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        if path and os.path.exists(path):
+            os.remove(path)
+    except Exception:
+        pass
+
+
+@PromptServer.instance.routes.get("/eros/cache/export_zip")
+@limit_concurrency("archive")
+async def export_zip(request):
+    """Export cache folder + sqlite dbs as a zip, streamed as it is written.
+
+    Query params:
+      - path: optional cache root (relative to input dir). Defaults to input/maps.
+      - types: comma separated map types to include
+      - tags: tag expression (same syntax as /eros/cache/query `q`)
+      - favorites: 1 to export favorites only
+      - modified_since: unix seconds or ISO 8601; only maps modified after it
+      - db_format: sqlite (default, binary snapshots) | sql (text dumps)
+      - async: 1 to run as a background job (202 + job; fetch the zip from
+        /eros/jobs/{id}/result)
+
+    Any filter switches to a selective export: only matching maps and their
+    metadata rows (tags, favorites) are included.
+    """
+    try:
+        query = request.rel_url.query
+        cache_root = _resolve_cache_root(query.get("path", ""))
+        filters = _parse_export_filters(query)
+        db_format = _parse_db_format(query)
+        if _truthy(query.get("async")):
+            params = {k: v for k, v in query.items() if k != "async"}
+            return web.json_response({"job": await run_io(job_manager.submit, "export", params)}, status=202)
+        await run_io(os.makedirs, cache_root, exist_ok=True)
+        plan = None
+        if _has_export_filters(filters):
+            plan = await run_io(_plan_export, cache_root, filters)
     except ValueError as ve:
         return web.json_response({"error": str(ve)}, status=400)
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
+    return await _stream_export(request, cache_root, plan, db_format)
 
 
-@PromptServer.instance.routes.post("/eros/cache/reset")
-async def reset_cache(request):
-    """Delete all cached maps under cache root and wipe metadata.
+@PromptServer.instance.routes.post("/eros/cache/export_zip")
+@limit_concurrency("archive")
+async def export_zip_differential(request):
+    """Differential (and optionally filtered) export.
 
-    JSON body:
-      - path: optional cache root
-      - wipe_other_dbs: bool (if true, also deletes other .db files in NODE_DIR)
+    JSON body: `path` and the filters of the GET route, plus `manifest`: the
+    manifest.json of a previous export, or a mapping of archive path ->
+    {size, sha256}. Only new or changed maps are sent, with the metadata rows
+    added since that export; manifest.json lists `removed` paths.
+    `async: true` runs it as a background job.
     """
-    global metadata_manager
     try:
-        data = await request.json()
-    except Exception:
-        data = {}
+        body = await request.json()
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object")
+        cache_root = _resolve_cache_root(body.get("path", ""))
+        filters = _parse_export_filters(body)
+        db_format = _parse_db_format(body)
+        previous = body.get("manifest") or {}
+        if not isinstance(previous, dict):
+            raise ValueError("manifest must be an object")
+        if _truthy(body.get("async")):
+            params = {k: v for k, v in body.items() if k != "async"}
+            params["manifest"] = previous
+            return web.json_response({"job": await run_io(job_manager.submit, "export", params)}, status=202)
+        await run_io(os.makedirs, cache_root, exist_ok=True)
+        plan = await run_io(_plan_export, cache_root, filters, previous)
+    except json.JSONDecodeError:
+        return web.json_response({"error": "Invalid JSON body"}, status=400)
+    except ValueError as ve:
+        return web.json_response({"error": str(ve)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+    return await _stream_export(request, cache_root, plan, db_format)
+
+
+def _truthy(value) -> bool:
+    return value is True or str(value).lower() in ("1", "true")
+
 
+def _parse_db_format(params) -> str:
+    db_format = str(params.get("db_format") or "sqlite").lower()
+    if db_format not in EXPORT_DB_FORMATS:
+        raise ValueError(f"db_format must be one of {', '.join(EXPORT_DB_FORMATS)}")
+    return db_format
+
+
+def _export_names(cache_root: str, plan=None):
+    """(timestamp, download file name, cache root relative to the input dir)."""
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    kind = "delta" if plan is not None and plan["differential"] else "export"
+    input_dir = os.path.abspath(folder_paths.get_input_directory())
+    cache_rel = os.path.relpath(cache_root, start=input_dir).replace("\\", "/")
+    return ts, f"eros_maps_{kind}_{ts}.zip", cache_rel
+
+
+def _has_export_filters(filters: dict) -> bool:
+    return bool(filters["types"] or filters["tags"] or filters["favorites"] or filters["modified_since"] is not None)
+
+
+async def _stream_export(request, cache_root: str, plan=None, db_format: str = "sqlite"):
+    ts, out_name, cache_rel = _export_names(cache_root, plan)
+
+    response = web.StreamResponse(
+        headers={
+            "Content-Type": "application/zip",
+            "Content-Disposition": f'attachment; filename="{out_name}"',
+        }
+    )
+    await response.prepare(request)
+    sink = _ResponseSink(response, asyncio.get_running_loop())
     try:
-        raw_path = data.get("path", "") if isinstance(data, dict) else ""
-        # Default to full reset (most reliable) if caller doesn't specify.
-        wipe_other_dbs = bool(data.get("wipe_other_dbs", True)) if isinstance(data, dict) else True
-        cache_root = _resolve_cache_root(raw_path)
-        os.makedirs(cache_root, exist_ok=True)
+        await run_io(_write_export_zip, sink, cache_root, cache_rel, ts, plan, db_format)
+        await run_io(sink.flush)
+    except (ConnectionResetError, asyncio.CancelledError):
+        print("[CacheMap] Export aborted: client disconnected")
+        raise
+    except Exception as e:
+        # Headers are gone; truncating the body makes the download fail visibly.
+        print(f"[CacheMap] Export failed after {sink.bytes_sent} bytes: {e}")
+        if request.transport is not None:
+            request.transport.close()
+        return response
+    await response.write_eof()
+    return response
+
+
+# Conflict handling when an imported map differs from the local file:
+# report (keep local, list it), rename (store as <stem>.<hash8><ext>) or overwrite.
+IMPORT_CONFLICT_POLICIES = ("report", "rename", "overwrite")
+IMPORT_WORKERS = max(2, min(8, os.cpu_count() or 2))
+# Members up to this size are buffered in memory for the worker pool, larger
+# ones are spooled to a hidden temp file next to their destination.
+_IMPORT_BUFFER_LIMIT = 8 * 1024 * 1024
+_IMPORT_REPORT_LIMIT = 1000
+
+
+class _ImportProgress:
+    """Throttled `eros.cache.import_progress` websocket events (thread-safe).
+
+    With a `job` the state is reported as job progress instead, and
+    `check()` raises once the job was cancelled.
+    """
 
-        removed_files = 0
-        for name in os.listdir(cache_root):
-            p = os.path.join(cache_root, name)
-            try:
-                if os.path.isdir(p):
-                    shutil.rmtree(p)
+    EVENT = "eros.cache.import_progress"
+
+    def __init__(self, import_id, bytes_total=None, interval=0.25, job=None):
+        self.interval = interval
+        self.job = job
+        self._lock = threading.Lock()
+        self._last = 0.0
+        self.state = {
+            "import_id": import_id,
+            "phase": "upload",
+            "bytes_received": 0,
+            "bytes_total": bytes_total,
+            "files_done": 0,
+            "imported": 0,
+            "identical": 0,
+            "conflicts": 0,
+        }
+
+    def add(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self.state[key] = self.state.get(key, 0) + value
+        self.emit()
+
+    def set(self, **fields):
+        with self._lock:
+            self.state.update(fields)
+        self.emit(force=True)
+
+    def emit(self, force=False):
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last < self.interval:
+                return
+            self._last = now
+            payload = dict(self.state)
+        if self.job is not None:
+            self.job.report(force=force, **payload)
+            return
+        try:
+            PromptServer.instance.send_sync(self.EVENT, payload)
+        except Exception:
+            pass
+
+    def check(self):
+        if self.job is not None:
+            self.job.check_cancelled()
+
+
+class _UploadSource:
+    """Blocking `read()` over a multipart part, for use from a worker thread.
+
+    Each chunk is awaited on the event loop and appended to `spool`, so the
+    complete archive is still available for the zipfile fallback.
+    """
+
+    CHUNK = 512 * 1024
+
+    def __init__(self, part, loop, spool, progress):
+        self._part = part
+        self._loop = loop
+        self._spool = spool
+        self._progress = progress
+        self._eof = False
+
+    def read(self, n=-1):
+        if self._eof:
+            return b""
+        chunk = asyncio.run_coroutine_threadsafe(self._part.read_chunk(size=self.CHUNK), self._loop).result()
+        if not chunk:
+            self._eof = True
+            return b""
+        self._spool.write(chunk)
+        self._progress.add(bytes_received=len(chunk))
+        return chunk
+
+    def drain(self):
+        while self.read():
+            pass
+        self._spool.flush()
+
+
+def _import_dest_parts(name: str, cache_root: str):
+    """Path parts below cache_root for a maps/* member, or None if it must be skipped."""
+    rel = name[len("maps/"):]
+    rel_parts = [p for p in rel.split("/") if p]
+    if not rel_parts or any(p == ".." for p in rel_parts):
+        return None
+    dest = os.path.abspath(os.path.join(cache_root, *rel_parts))
+    if os.path.commonpath([cache_root, dest]) != cache_root:
+        return None
+    return rel_parts
+
+
+def _read_import_member(chunks, dest_dir: str):
+    """Consume a member's data, hashing it. Returns (data, tmp_path, sha256, size)."""
+    h = hashlib.sha256()
+    buf = bytearray()
+    tmp_path, out, size = None, None, 0
+    try:
+        for chunk in chunks:
+            h.update(chunk)
+            size += len(chunk)
+            if out is None and len(buf) + len(chunk) > _IMPORT_BUFFER_LIMIT:
+                os.makedirs(dest_dir, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(prefix=".eros_import_", dir=dest_dir)
+                out = os.fdopen(fd, "wb")
+                out.write(buf)
+                buf = None
+            if out is not None:
+                out.write(chunk)
+            else:
+                buf += chunk
+    except BaseException:
+        if out is not None:
+            out.close()
+        _remove_quietly(tmp_path)
+        raise
+    if out is not None:
+        out.close()
+        return None, tmp_path, h.hexdigest(), size
+    return bytes(buf), None, h.hexdigest(), size
+
+
+def _same_file(path: str, size: int, digest: str) -> bool:
+    try:
+        return os.path.getsize(path) == size and _file_sha256(path) == digest
+    except OSError:
+        return False
+
+
+def _place_import_file(cache_root: str, rel_parts, data, tmp_path, digest: str, size: int, policy: str) -> dict:
+    """Write one imported map unless an identical file is already there.
+
+    Returns {"status": imported|identical|conflict|renamed|overwritten, "path": ...}.
+    """
+    dest = os.path.join(cache_root, *rel_parts)
+    final, status = dest, "imported"
+    try:
+        if os.path.exists(dest):
+            if _same_file(dest, size, digest):
+                status = "identical"
+            elif policy == "overwrite":
+                status = "overwritten"
+            elif policy == "rename":
+                stem, ext = os.path.splitext(dest)
+                final = f"{stem}.{digest[:8]}{ext}"
+                status = "identical" if _same_file(final, size, digest) else "renamed"
+            else:
+                status = "conflict"
+
+        if status in ("imported", "overwritten", "renamed"):
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            if tmp_path is None:
+                fd, tmp_path = tempfile.mkstemp(prefix=".eros_import_", dir=os.path.dirname(final))
+                with os.fdopen(fd, "wb") as out:
+                    out.write(data)
+            os.replace(tmp_path, final)
+            tmp_path = None
+            thumbnails.invalidate(final)
+    finally:
+        _remove_quietly(tmp_path)
+
+    # maps/<type>/<file>: keep the images catalog in sync
+    if len(rel_parts) == 2 and os.path.splitext(final)[1].lower() in VALID_IMAGE_EXTENSIONS:
+        if status not in ("identical", "conflict") or metadata_manager.get_image_file(os.path.abspath(final)) is None:
+            _catalog_record(cache_root, rel_parts[0], final)
+    return {"status": status, "path": "/".join(rel_parts), "final": os.path.relpath(final, cache_root).replace("\\", "/")}
+
+
+def _merge_imported_dbs(db_members: dict, cache_root: str) -> dict:
+    """Merge db/ members from an archive into the local databases.
+
+    `db_members` maps a db file name to ("sqlite", snapshot_path) or
+    ("sql", dump_text); snapshot temp files are removed afterwards.
+    """
+    imported_dbs = 0
+    db_rows_added = 0
+    metadata_merge = {"favorites_added": 0, "tags_added": 0, "image_tags_added": 0}
+    for db_name, (kind, payload) in db_members.items():
+        try:
+            # db_name should be like metadata.db
+            if not db_name.lower().endswith(".db"):
+                continue
+            db_path = os.path.join(NODE_DIR, db_name)
+            if os.path.abspath(db_path) == os.path.abspath(DB_PATH):
+                # ATTACH cannot run inside the writer's transactions: close the
+                # manager so the merge is the only writer; calls arriving
+                # meanwhile wait for reopen(), which also re-runs the backfills.
+                metadata_manager.close()
+                try:
+                    if kind == "sqlite":
+                        m = _merge_metadata_db(db_path, payload, cache_root)
+                    else:
+                        m = _merge_metadata_db_from_sql(db_path, payload, cache_root)
+                finally:
+                    metadata_manager.reopen()
+                metadata_merge["favorites_added"] += int(m.get("favorites_added", 0) or 0)
+                metadata_merge["tags_added"] += int(m.get("tags_added", 0) or 0)
+                metadata_merge["image_tags_added"] += int(m.get("image_tags_added", 0) or 0)
+                db_rows_added += (
+                    int(m.get("favorites_added", 0) or 0)
+                    + int(m.get("tags_added", 0) or 0)
+                    + int(m.get("image_tags_added", 0) or 0)
+                )
+                imported_dbs += 1
+            else:
+                if kind == "sqlite":
+                    g = _merge_generic_db(db_path, payload)
                 else:
-                    os.remove(p)
-                removed_files += 1
+                    g = _merge_generic_db_from_sql(db_path, payload)
+                db_rows_added += int(g.get("rows_added", 0) or 0)
+                imported_dbs += 1
+        except Exception as e:
+            # best-effort; continue
+            print(f"[CacheMap] Warning: could not merge {db_name}: {e}")
+        finally:
+            if kind == "sqlite":
+                _remove_quietly(payload)
+    return {"imported_dbs": imported_dbs, "db_rows_added": db_rows_added, "metadata_merge": metadata_merge}
+
+
+def _spool_db_snapshot(chunks):
+    """Write an imported db/*.sqlite member to a temp file; None if it is not SQLite."""
+    fd, tmp_db = tempfile.mkstemp(prefix="eros_import_", suffix=".db")
+    with os.fdopen(fd, "wb") as out:
+        for chunk in chunks:
+            out.write(chunk)
+    with open(tmp_db, "rb") as f:
+        if f.read(16) != b"SQLite format 3\x00":
+            _remove_quietly(tmp_db)
+            return None
+    return tmp_db
+
+
+def _import_archive(read, spool_path: str, cache_root: str, policy: str, progress, drain=None) -> dict:
+    """Blocking part of import_zip: extract maps and merge DB dumps.
+
+    Members are taken from the local headers as `read()` delivers bytes, so
+    extraction overlaps the upload; hashing, comparing and writing run on a
+    worker pool. If the stream cannot be parsed front to back, the rest of
+    the upload is spooled and the remaining members are read through the
+    central directory of `spool_path`.
+    """
+    counts = {"imported": 0, "identical": 0, "conflict": 0, "renamed": 0, "overwritten": 0}
+    conflicts = []
+    db_members = {}
+    done = set()
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(IMPORT_WORKERS * 2)
+    pool = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="eros-import")
+    futures = []
+
+    def finished(future):
+        slots.release()
+        try:
+            res = future.result()
+        except Exception as e:
+            print(f"[CacheMap] Warning: could not import map: {e}")
+            return
+        with lock:
+            counts[res["status"]] += 1
+            if res["status"] in ("conflict", "renamed", "overwritten") and len(conflicts) < _IMPORT_REPORT_LIMIT:
+                conflicts.append(res)
+        progress.add(
+            files_done=1,
+            imported=int(res["status"] in ("imported", "renamed", "overwritten")),
+            identical=int(res["status"] == "identical"),
+            conflicts=int(res["status"] != "imported" and res["status"] != "identical"),
+        )
+
+    def handle(name, chunks):
+        if name.startswith("maps/"):
+            rel_parts = _import_dest_parts(name, cache_root)
+            if rel_parts is None:
+                return
+            dest_dir = os.path.join(cache_root, *rel_parts[:-1])
+            data, tmp_path, digest, size = _read_import_member(chunks, dest_dir)
+            slots.acquire()
+            future = pool.submit(_place_import_file, cache_root, rel_parts, data, tmp_path, digest, size, policy)
+            future.add_done_callback(finished)
+            futures.append(future)
+        elif name.startswith("db/") and name.endswith(".sqlite"):
+            db_name = os.path.basename(name[:-len(".sqlite")])
+            tmp_db = _spool_db_snapshot(chunks)
+            if tmp_db is not None:
+                db_members[db_name] = ("sqlite", tmp_db)
+        elif name.startswith("db/") and name.endswith(".sql"):
+            db_name = os.path.basename(name[:-4])  # strip .sql
+            try:
+                db_members[db_name] = ("sql", b"".join(chunks).decode("utf-8", errors="replace"))
+            except Exception:
+                pass
+
+    try:
+        progress.set(phase="extract")
+        try:
+            for member in iter_zip_stream(read):
+                name = member.filename
+                if not name or name.endswith("/") or name.startswith(("/", "\\")):
+                    continue
+                progress.check()
+                handle(name, member.chunks())
+                done.add(name)
+        except (ZipStreamError, zlib.error) as e:
+            print(f"[CacheMap] Streaming import fell back to the central directory: {e}")
+        if drain is not None:
+            drain()
+
+        with zipfile.ZipFile(spool_path, "r") as zf:
+            for info in _safe_zip_members(zf):
+                if info.filename in done:
+                    continue
+                progress.check()
+                with zf.open(info, "r") as src:
+                    handle(info.filename, iter(lambda: src.read(1 << 20), b""))
+
+        for future in futures:
+            try:
+                future.result()
             except Exception:
                 pass
+    except BaseException:
+        for kind, payload in db_members.values():
+            if kind == "sqlite":
+                _remove_quietly(payload)
+        raise
+    finally:
+        pool.shutdown(wait=True)
+
+    progress.set(phase="metadata")
+    merged = _merge_imported_dbs(db_members, cache_root)
+    return {
+        "imported_files": counts["imported"] + counts["renamed"] + counts["overwritten"],
+        "skipped_files": counts["identical"] + counts["conflict"],
+        "identical_files": counts["identical"],
+        "conflicts": conflicts,
+        "conflict_policy": policy,
+        "renamed_files": counts["renamed"],
+        "overwritten_files": counts["overwritten"],
+        **merged,
+    }
+
+
+def _finish_import(result: dict, progress) -> None:
+    # Search terms etc. of merged rows were backfilled by reopen() in
+    # _merge_imported_dbs; listeners still need to hear about the merge
+    metadata_manager.notify_committed()
+    progress.set(phase="done")
+    try:
+        PromptServer.instance.send_sync("eros.cache.imported", result)
+    except Exception:
+        pass
+
+
+def _import_upload(part, loop, spool_path: str, cache_root: str, policy: str, progress) -> dict:
+    with open(spool_path, "wb") as spool:
+        source = _UploadSource(part, loop, spool, progress)
+        return _import_archive(source.read, spool_path, cache_root, policy, progress, drain=source.drain)
+
+
+@PromptServer.instance.routes.post("/eros/cache/import_zip")
+@limit_concurrency("archive")
+async def import_zip(request):
+    """Import a zip created by /eros/cache/export_zip.
+
+    Query params:
+      - path: optional cache root (relative to input dir). Defaults to input/maps.
+      - on_conflict: report (default) | rename | overwrite, for maps that
+        exist locally with different content. Identical maps are skipped.
+      - import_id: optional id echoed in `eros.cache.import_progress` events
+      - async: 1 to store the upload and import it as a background job (202 + job)
+
+    Non-destructive merge by default: keeps existing local cache + DBs and adds missing data.
+    """
+    try:
+        query = request.rel_url.query
+        cache_root = _resolve_cache_root(query.get("path", ""))
+        policy = query.get("on_conflict", "report") or "report"
+        if policy not in IMPORT_CONFLICT_POLICIES:
+            raise ValueError(f"on_conflict must be one of {', '.join(IMPORT_CONFLICT_POLICIES)}")
+        await run_io(os.makedirs, cache_root, exist_ok=True)
+
+        reader = await request.multipart()
+        part = None
+        while True:
+            p = await reader.next()
+            if p is None:
+                break
+            if p.name in ("file", "archive"):
+                part = p
+                break
 
-        def _try_delete_db_file(db_path: str) -> bool:
+        if not part:
+            return web.json_response({"error": "Missing upload field 'file'"}, status=400)
+
+        if _truthy(query.get("async")):
+            job = await _submit_import_job(part, {"path": query.get("path", ""), "on_conflict": policy})
+            return web.json_response({"job": job}, status=202)
+
+        progress = _ImportProgress(query.get("import_id") or uuid.uuid4().hex, request.content_length)
+        fd, tmp_zip = tempfile.mkstemp(prefix="eros_maps_import_", suffix=".zip")
+        os.close(fd)
+        try:
+            result = await run_io(
+                _import_upload, part, asyncio.get_running_loop(), tmp_zip, cache_root, policy, progress
+            )
+            await run_io(_finish_import, result, progress)
+            return web.json_response({"success": True, "import_id": progress.state["import_id"], **result})
+        except zipfile.BadZipFile as e:
+            progress.set(phase="failed")
+            return web.json_response({"error": f"Not a valid zip archive: {e}"}, status=400)
+        finally:
+            await run_io(_remove_quietly, tmp_zip)
+    except ValueError as ve:
+        return web.json_response({"error": str(ve)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+def _reset_cache_files(cache_root: str, wipe_other_dbs: bool) -> dict:
+    """Blocking part of reset_cache: delete maps and wipe DB files/tables."""
+    os.makedirs(cache_root, exist_ok=True)
+
+    removed_files = 0
+    for name in os.listdir(cache_root):
+        p = os.path.join(cache_root, name)
+        try:
+            if os.path.isdir(p):
+                shutil.rmtree(p)
+            else:
+                os.remove(p)
+            removed_files += 1
+        except Exception:
+            pass
+    thumbnails.clear()
+
+    def _try_delete_db_file(db_path: str) -> bool:
+        ok = False
+        try:
+            if os.path.isfile(db_path):
+                os.remove(db_path)
+                ok = True
+        except Exception:
             ok = False
+        # Also try to remove sqlite sidecar files
+        for suffix in ("-wal", "-shm", "-journal"):
             try:
-                if os.path.isfile(db_path):
-                    os.remove(db_path)
-                    ok = True
+                side = db_path + suffix
+                if os.path.isfile(side):
+                    os.remove(side)
             except Exception:
-                ok = False
-            # Also try to remove sqlite sidecar files
-            for suffix in ("-wal", "-shm", "-journal"):
-                try:
-                    side = db_path + suffix
-                    if os.path.isfile(side):
-                        os.remove(side)
-                except Exception:
-                    pass
-            return ok
+                pass
+        return ok
 
-        def _clear_all_user_tables(db_path: str) -> bool:
-            """Fallback for when a DB file can't be deleted (Windows locks).
+    def _clear_all_user_tables(db_path: str) -> bool:
+        """Fallback for when a DB file can't be deleted (Windows locks).
 
-            Deletes rows from all non-sqlite_* tables. Best-effort.
-            """
+        Deletes rows from all non-sqlite_* tables. Best-effort.
+        """
+        try:
+            conn = sqlite3.connect(db_path, timeout=2.0)
+        except Exception:
+            return False
+        try:
             try:
-                conn = sqlite3.connect(db_path, timeout=2.0)
+                conn.execute("PRAGMA busy_timeout=2000")
             except Exception:
-                return False
+                pass
             try:
-                try:
-                    conn.execute("PRAGMA busy_timeout=2000")
-                except Exception:
-                    pass
-                try:
-                    conn.execute("PRAGMA foreign_keys=OFF")
-                except Exception:
-                    pass
-
-                try:
-                    tables = conn.execute(
-                        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
-                    ).fetchall()
-                except Exception:
-                    tables = []
+                conn.execute("PRAGMA foreign_keys=OFF")
+            except Exception:
+                pass
 
-                for (name,) in tables:
-                    if not name:
-                        continue
-                    try:
-                        conn.execute(f"DELETE FROM {name}")
-                    except Exception:
-                        # ignore per-table failures
-                        pass
+            try:
+                tables = conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+                ).fetchall()
+            except Exception:
+                tables = []
 
+            for (name,) in tables:
+                if not name:
+                    continue
                 try:
-                    conn.commit()
+                    conn.execute(f"DELETE FROM {name}")
                 except Exception:
+                    # ignore per-table failures
                     pass
 
-                try:
-                    conn.execute("VACUUM")
-                except Exception:
-                    pass
-                return True
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            try:
+                conn.commit()
+            except Exception:
+                pass
 
-        # Always wipe metadata.db (robustly)
-        metadata_cleared = False
-        removed_dbs = 0
-        try:
-            if _try_delete_db_file(DB_PATH):
-                removed_dbs += 1
-                metadata_cleared = True
-            else:
-                # If Windows file locks prevent deletion, clear tables instead.
-                try:
-                    MetadataManager(DB_PATH)
-                except Exception:
-                    pass
-                try:
-                    conn = sqlite3.connect(DB_PATH)
-                    try:
-                        conn.execute("PRAGMA foreign_keys=OFF")
-                        # Clear known tables
-                        for tbl in ("image_tags", "tags", "favorites"):
-                            try:
-                                conn.execute(f"DELETE FROM {tbl}")
-                            except Exception:
-                                pass
-                        try:
-                            conn.commit()
-                        except Exception:
-                            pass
-                        try:
-                            conn.execute("VACUUM")
-                        except Exception:
-                            pass
-                        metadata_cleared = True
-                    finally:
-                        conn.close()
-                except Exception:
-                    metadata_cleared = False
-        except Exception:
-            metadata_cleared = False
+            try:
+                conn.execute("VACUUM")
+            except Exception:
+                pass
+            return True
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
 
-        removed_other_dbs = 0
-        if wipe_other_dbs:
+    # Always wipe metadata.db (robustly)
+    metadata_cleared = False
+    removed_dbs = 0
+    try:
+        if _try_delete_db_file(DB_PATH):
+            removed_dbs += 1
+            metadata_cleared = True
+        else:
+            # If Windows file locks prevent deletion, clear tables instead.
+            # The manager is closed (see _reset_cache), so this is the only
+            # connection; reopen() recreates whatever is missing.
             try:
-                for f in os.listdir(NODE_DIR):
-                    if not f.lower().endswith(".db"):
-                        continue
-                    dbp = os.path.join(NODE_DIR, f)
-                    if os.path.abspath(dbp) == os.path.abspath(DB_PATH):
-                        continue
-                    if _try_delete_db_file(dbp):
-                        removed_other_dbs += 1
-                    else:
-                        # If locked, clear tables instead.
+                conn = sqlite3.connect(DB_PATH)
+                try:
+                    conn.execute("PRAGMA foreign_keys=OFF")
+                    # Clear known tables
+                    for tbl in ("image_tags", "image_files", "images", "tags", "favorites"):
                         try:
-                            if _clear_all_user_tables(dbp):
-                                removed_other_dbs += 1
+                            conn.execute(f"DELETE FROM {tbl}")
                         except Exception:
                             pass
+                    try:
+                        conn.commit()
+                    except Exception:
+                        pass
+                    try:
+                        conn.execute("VACUUM")
+                    except Exception:
+                        pass
+                    metadata_cleared = True
+                finally:
+                    conn.close()
             except Exception:
-                pass
+                metadata_cleared = False
+    except Exception:
+        metadata_cleared = False
 
+    removed_other_dbs = 0
+    if wipe_other_dbs:
         try:
-            metadata_manager = MetadataManager(DB_PATH)
+            for f in os.listdir(NODE_DIR):
+                if not f.lower().endswith(".db"):
+                    continue
+                dbp = os.path.join(NODE_DIR, f)
+                if os.path.abspath(dbp) == os.path.abspath(DB_PATH):
+                    continue
+                if _try_delete_db_file(dbp):
+                    removed_other_dbs += 1
+                else:
+                    # If locked, clear tables instead.
+                    try:
+                        if _clear_all_user_tables(dbp):
+                            removed_other_dbs += 1
+                    except Exception:
+                        pass
         except Exception:
             pass
 
-        try:
-            PromptServer.instance.send_sync(
-                "eros.cache.reset",
-                {
-                    "removed_files": removed_files,
-                    "removed_dbs": removed_dbs,
-                    "removed_other_dbs": removed_other_dbs,
-                    "metadata_cleared": metadata_cleared,
-                    "wipe_other_dbs": wipe_other_dbs,
-                },
-            )
-        except Exception:
-            pass
+    return {
+        "removed_files": removed_files,
+        "removed_dbs": removed_dbs,
+        "removed_other_dbs": removed_other_dbs,
+        "metadata_cleared": metadata_cleared,
+        "wipe_other_dbs": wipe_other_dbs,
+    }
 
-        return web.json_response(
-            {
-                "success": True,
-                "removed_files": removed_files,
-                "removed_dbs": removed_dbs,
-                "removed_other_dbs": removed_other_dbs,
-                "metadata_cleared": metadata_cleared,
-                "wipe_other_dbs": wipe_other_dbs,
-            }
+
+def _reset_cache(cache_root: str, wipe_other_dbs: bool) -> dict:
+    # Release every connection first so the DB file can be deleted;
+    # reads/writes arriving meanwhile wait for reopen().
+    metadata_manager.close()
+    try:
+        result = _reset_cache_files(cache_root, wipe_other_dbs)
+    finally:
+        metadata_manager.reopen()
+        metadata_manager.notify_committed()
+        # The job records went with the old database
+        job_manager.persist_all()
+
+    try:
+        PromptServer.instance.send_sync("eros.cache.reset", result)
+    except Exception:
+        pass
+    return result
+
+
+@PromptServer.instance.routes.post("/eros/cache/reset")
+@limit_concurrency("archive")
+async def reset_cache(request):
+    """Delete all cached maps under cache root and wipe metadata.
+
+    JSON body:
+      - path: optional cache root
+      - wipe_other_dbs: bool (if true, also deletes other .db files in NODE_DIR)
+      - async: bool (run as a background job, returns 202 + job)
+    """
+    try:
+        data = await request.json()
+    except Exception:
+        data = {}
+
+    try:
+        raw_path = data.get("path", "") if isinstance(data, dict) else ""
+        # Default to full reset (most reliable) if caller doesn't specify.
+        wipe_other_dbs = bool(data.get("wipe_other_dbs", True)) if isinstance(data, dict) else True
+        cache_root = _resolve_cache_root(raw_path)
+        if isinstance(data, dict) and _truthy(data.get("async")):
+            job = await run_io(job_manager.submit, "reset", {"path": raw_path, "wipe_other_dbs": wipe_other_dbs})
+            return web.json_response({"job": job}, status=202)
+        result = await run_io(_reset_cache, cache_root, wipe_other_dbs)
+        return web.json_response({"success": True, **result})
+    except ValueError as ve:
+        return web.json_response({"error": str(ve)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+# ----- Background jobs -----
+# export / import / reset (and reindex) can run as jobs: persisted in
+# metadata.db, progress as `eros.job` websocket events, results under .jobs/.
+
+JOB_DIR = os.path.join(NODE_DIR, ".jobs")
+
+
+def _export_job(job) -> dict:
+    params = job.params
+    cache_root = _resolve_cache_root(params.get("path", ""))
+    filters = _parse_export_filters(params)
+    db_format = _parse_db_format(params)
+    previous = params.get("manifest")
+    os.makedirs(cache_root, exist_ok=True)
+    plan = None
+    if previous is not None or _has_export_filters(filters):
+        plan = _plan_export(cache_root, filters, previous)
+    job.check_cancelled()
+
+    def on_progress(**fields):
+        job.check_cancelled()
+        job.report(**fields)
+
+    ts, out_name, cache_rel = _export_names(cache_root, plan)
+    part_path = job.path(".zip.part")
+    final_path = job.path(".zip")
+    try:
+        summary = _write_export_zip(part_path, cache_root, cache_rel, ts, plan, db_format, on_progress)
+        os.replace(part_path, final_path)
+    finally:
+        _remove_quietly(part_path)
+    return {
+        "file": os.path.basename(final_path),
+        "filename": out_name,
+        "size": os.path.getsize(final_path),
+        **summary,
+    }
+
+
+def _import_job(job) -> dict:
+    """Import an archive stored by _submit_import_job. Cancelling stops
+    between members: maps already placed stay, DB snapshots are not merged."""
+    params = job.params
+    cache_root = _resolve_cache_root(params.get("path", ""))
+    policy = params.get("on_conflict") or "report"
+    upload = job.path(".upload.zip")
+    if not os.path.isfile(upload):
+        raise RuntimeError("The uploaded archive is no longer available")
+    os.makedirs(cache_root, exist_ok=True)
+    progress = _ImportProgress(job.id, os.path.getsize(upload), job=job)
+    try:
+        with open(upload, "rb") as f:
+            result = _import_archive(f.read, upload, cache_root, policy, progress)
+    except zipfile.BadZipFile as e:
+        raise RuntimeError(f"Not a valid zip archive: {e}")
+    finally:
+        _remove_quietly(upload)
+    _finish_import(result, progress)
+    return result
+
+
+def _reset_job(job) -> dict:
+    params = job.params
+    cache_root = _resolve_cache_root(params.get("path", ""))
+    return _reset_cache(cache_root, bool(params.get("wipe_other_dbs", True)))
+
+
+def _reindex_job(job) -> dict:
+    cache_root = _resolve_cache_root(job.params.get("path", ""))
+    return _catalog_scan(cache_root)
+
+
+def _prompt_index_paths(cache_root: str):
+    """(paths, scope) for the prompt index: the input folder without the maps
+    cache, plus the cache originals."""
+    index = get_input_index()
+    exclude = ()
+    if index.indexes(cache_root) and index.relpath(cache_root):
+        # A cache root other than default_maps_dir (which the index skips)
+        exclude = (index.relpath(cache_root),)
+    paths = [
+        os.path.join(index.root, os.path.normpath(rel))
+        for rel in index.files(exclude_dirs=exclude)
+        if os.path.splitext(rel)[1].lower() in prompt_index.INDEX_EXTENSIONS
+    ]
+    originals = os.path.join(cache_root, "original")
+    paths += prompt_index.collect_image_paths([originals])
+    return sorted(set(paths)), (index.root, originals)
+
+
+def _prompt_index_job(job) -> dict:
+    """Index generation parameters (see prompt_index) into metadata.db."""
+    cache_root = _resolve_cache_root(job.params.get("path", ""))
+    job.report(force=True, phase="listing")
+    paths, scope = _prompt_index_paths(cache_root)
+    job.check_cancelled()
+
+    def on_progress(done, total):
+        job.report(phase="reading", files_done=done, files_total=total)
+
+    summary = prompt_index.index_files(
+        metadata_manager,
+        paths,
+        scope=scope,
+        on_progress=on_progress,
+        check_cancelled=job.check_cancelled,
+    )
+    print(f"[PromptIndex] {summary}")
+    return summary
+
+
+async def _submit_import_job(part, params: dict) -> dict:
+    """Store an uploaded archive under .jobs/ and queue its import."""
+    job_id = uuid.uuid4().hex
+    upload = os.path.join(JOB_DIR, f"{job_id}.upload.zip")
+    await run_io(os.makedirs, JOB_DIR, exist_ok=True)
+    f = await run_io(open, upload, "wb")
+    try:
+        while True:
+            chunk = await part.read_chunk(_UploadSource.CHUNK)
+            if not chunk:
+                break
+            await run_io(f.write, chunk)
+    except BaseException:
+        await run_io(f.close)
+        await run_io(_remove_quietly, upload)
+        raise
+    await run_io(f.close)
+    return await run_io(job_manager.submit, "import", params, job_id=job_id)
+
+
+def _check_job_params(kind: str, params: dict) -> None:
+    """Reject bad parameters at submission time. Raises ValueError."""
+    if not isinstance(params, dict):
+        raise ValueError("params must be an object")
+    _resolve_cache_root(params.get("path", ""))
+    if kind == "export":
+        _parse_export_filters(params)
+        _parse_db_format(params)
+        if params.get("manifest") is not None and not isinstance(params["manifest"], dict):
+            raise ValueError("manifest must be an object")
+    elif kind == "import":
+        raise ValueError("Upload archives to /eros/jobs/import")
+
+
+job_manager = JobManager(
+    metadata_manager,
+    lambda event, payload: PromptServer.instance.send_sync(event, payload),
+    JOB_DIR,
+)
+# Archive jobs share one slot, like the synchronous archive routes.
+job_manager.register("export", _export_job, limit=1, group="archive")
+job_manager.register("import", _import_job, limit=1, group="archive")
+job_manager.register("reset", _reset_job, limit=1, group="archive")
+job_manager.register("reindex", _reindex_job, limit=1)
+job_manager.register("prompt_index", _prompt_index_job, limit=1)
+
+try:
+    os.makedirs(JOB_DIR, exist_ok=True)
+    job_manager.recover()
+except Exception as e:
+    print(f"[CacheMap] Warning: could not recover background jobs: {e}")
+
+
+@PromptServer.instance.routes.get("/eros/jobs")
+@limit_concurrency("jobs")
+async def list_jobs(request):
+    """List jobs, newest first. Query params: kind, state, limit (default 50)."""
+    query = request.rel_url.query
+    try:
+        limit = max(1, min(1000, int(query.get("limit", 50))))
+    except ValueError:
+        return web.json_response({"error": "limit must be an integer"}, status=400)
+    jobs = job_manager.list(kind=query.get("kind") or None, state=query.get("state") or None, limit=limit)
+    return web.json_response({"jobs": jobs, "kinds": job_manager.kinds()})
+
+
+@PromptServer.instance.routes.post("/eros/jobs")
+@limit_concurrency("jobs")
+async def submit_job(request):
+    """Queue a job. JSON body: {kind: export|reset|reindex|prompt_index, params: {...}}.
+
+    params are those of the matching synchronous route (path, filters,
+    db_format, manifest, wipe_other_dbs). Imports are submitted with an
+    upload to /eros/jobs/import. Returns 202 with the job record.
+    """
+    try:
+        body = await request.json()
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object")
+        kind = str(body.get("kind") or "")
+        if kind not in job_manager.kinds():
+            raise ValueError(f"kind must be one of {', '.join(job_manager.kinds())}")
+        params = body.get("params") or {}
+        _check_job_params(kind, params)
+        return web.json_response({"job": await run_io(job_manager.submit, kind, params)}, status=202)
+    except json.JSONDecodeError:
+        return web.json_response({"error": "Invalid JSON body"}, status=400)
+    except ValueError as ve:
+        return web.json_response({"error": str(ve)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+@PromptServer.instance.routes.post("/eros/jobs/import")
+@limit_concurrency("archive")
+async def submit_import_job(request):
+    """Upload an archive (multipart field 'file') and import it as a job.
+
+    Query params: path, on_conflict (see /eros/cache/import_zip).
+    """
+    try:
+        query = request.rel_url.query
+        params = {"path": query.get("path", ""), "on_conflict": query.get("on_conflict", "report") or "report"}
+        _resolve_cache_root(params["path"])
+        if params["on_conflict"] not in IMPORT_CONFLICT_POLICIES:
+            raise ValueError(f"on_conflict must be one of {', '.join(IMPORT_CONFLICT_POLICIES)}")
+        reader = await request.multipart()
+        part = None
+        while True:
+            p = await reader.next()
+            if p is None:
+                break
+            if p.name in ("file", "archive"):
+                part = p
+                break
+        if not part:
+            return web.json_response({"error": "Missing upload field 'file'"}, status=400)
+        job = await _submit_import_job(part, params)
+        return web.json_response({"job": job}, status=202)
+    except ValueError as ve:
+        return web.json_response({"error": str(ve)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+@PromptServer.instance.routes.get("/eros/jobs/{job_id}")
+@limit_concurrency("jobs")
+async def get_job(request):
+    job = job_manager.get(request.match_info["job_id"])
+    if job is None:
+        return web.json_response({"error": "Unknown job"}, status=404)
+    return web.json_response({"job": job})
+
+
+@PromptServer.instance.routes.post("/eros/jobs/{job_id}/cancel")
+@limit_concurrency("jobs")
+async def cancel_job(request):
+    """Cancel a queued job, or ask a running one to stop at its next checkpoint."""
+    job = await run_io(job_manager.cancel, request.match_info["job_id"])
+    if job is None:
+        return web.json_response({"error": "Unknown job"}, status=404)
+    return web.json_response({"job": job})
+
+
+@PromptServer.instance.routes.get("/eros/jobs/{job_id}/result")
+@limit_concurrency("jobs")
+async def get_job_result(request):
+    """The zip of a finished export job, or the JSON result of any other job."""
+    job_id = request.match_info["job_id"]
+    job = job_manager.get(job_id)
+    if job is None:
+        return web.json_response({"error": "Unknown job"}, status=404)
+    if job["state"] in ("queued", "running"):
+        return web.json_response({"error": "Job has not finished", "job": job}, status=409)
+    path = job_manager.result_file(job_id)
+    if path is not None:
+        filename = job["result"].get("filename") or os.path.basename(path)
+        return web.FileResponse(
+            path,
+            headers={
+                "Content-Type": "application/zip",
+                "Content-Disposition": f'attachment; filename="{filename}"',
+            },
+        )
+    if job["result"] and job["result"].get("file"):
+        return web.json_response({"error": "Result file is no longer available", "job": job}, status=410)
+    return web.json_response({"state": job["state"], "result": job["result"], "error": job["error"]})
+
+
+# ===== Generation parameters (prompt index) =====
+
+def _optional_int(query, name):
+    value = query.get(name, "")
+    if value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+
+@PromptServer.instance.routes.get("/eros/prompts/search")
+@limit_concurrency("metadata")
+async def search_generation_params(request):
+    """Search files indexed by the prompt_index job.
+
+    Query params (all optional, combined with AND):
+      - q: substring of the positive or negative prompt
+      - seed, sampler, model, width, height: exact values
+      - limit / offset: paging (offset comes back as `next_offset`)
+    """
+    try:
+        query = request.rel_url.query
+        result = await run_io(
+            metadata_manager.search_generation_params,
+            text=query.get("q", "") or None,
+            seed=_optional_int(query, "seed"),
+            sampler=query.get("sampler", "") or None,
+            model=query.get("model", "") or None,
+            width=_optional_int(query, "width"),
+            height=_optional_int(query, "height"),
+            limit=_optional_int(query, "limit") or 50,
+            offset=_optional_int(query, "offset") or 0,
+        )
+        return web.json_response(result)
+    except ValueError as ve:
+        return web.json_response({"error": str(ve)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+@PromptServer.instance.routes.get("/eros/prompts/duplicates")
+@limit_concurrency("metadata")
+async def generation_duplicates(request):
+    """Groups of indexed files with identical generation parameters. Query params: limit, offset."""
+    try:
+        query = request.rel_url.query
+        result = await run_io(
+            metadata_manager.find_generation_duplicates,
+            limit=_optional_int(query, "limit") or 50,
+            offset=_optional_int(query, "offset") or 0,
         )
+        return web.json_response(result)
     except ValueError as ve:
         return web.json_response({"error": str(ve)}, status=400)
     except Exception as e:
@@ -0,0 +1,229 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# inotify(7) flags
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+ROOT_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+TYPE_DIR_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+
+
+class CacheWatcher(threading.Thread):
+    """Watches `<root>/<map_type>/*` and reports changed image files.
+
+    `on_change(root, changes)` receives a list of `(action, map_type, path)`
+    tuples, action being "upsert" or "remove", after events settle for
+    `debounce` seconds. Hidden files (rsync temp names) and non-image
+    extensions are ignored.
+
+    Uses inotify when available. Otherwise it polls: each interval it stats
+    the type folders and re-lists only the ones whose mtime changed (adding,
+    removing or renaming a file, which is what rsync does, bumps it), diffing
+    against the previous os.scandir snapshot.
+    """
+
+    def __init__(self, root, on_change, extensions, poll_interval=5.0, debounce=0.5, force_polling=False):
+        super().__init__(name=f"eros-watch-{os.path.basename(root)}", daemon=True)
+        self.root = os.path.abspath(root)
+        self.on_change = on_change
+        self.extensions = {e.lower() for e in extensions}
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.force_polling = force_polling
+        self._stop_event = threading.Event()
+        self._pending = {}  # path -> (action, map_type)
+        self.backend = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _wanted(self, name):
+        return not name.startswith(".") and os.path.splitext(name)[1].lower() in self.extensions
+
+    def _queue(self, action, map_type, name):
+        if self._wanted(name):
+            self._pending[os.path.join(self.root, map_type, name)] = (action, map_type)
+
+    def _dispatch(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        changes = [(action, map_type, path) for path, (action, map_type) in sorted(pending.items())]
+        try:
+            self.on_change(self.root, changes)
+        except Exception as e:
+            print(f"[CacheWatcher] Change handler failed: {e}")
+
+    def _list_type_dir(self, map_type):
+        snapshot = {}
+        try:
+            with os.scandir(os.path.join(self.root, map_type)) as it:
+                for entry in it:
+                    if self._wanted(entry.name) and entry.is_file():
+                        st = entry.stat()
+                        snapshot[entry.name] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            pass
+        return snapshot
+
+    def run(self):
+        try:
+            if not self.force_polling and sys.platform.startswith("linux"):
+                try:
+                    self._run_inotify()
+                    return
+                except OSError as e:
+                    print(f"[CacheWatcher] inotify unavailable ({e}), polling {self.root}")
+            self._run_polling()
+        except Exception as e:
+            print(f"[CacheWatcher] Watcher for {self.root} stopped: {e}")
+
+    # ----- inotify backend -----
+
+    def _run_inotify(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.backend = "inotify"
+        watches = {}  # wd -> map_type ("" for the root)
+
+        def add_watch(path, mask, map_type):
+            wd = libc.inotify_add_watch(fd, os.fsencode(path), mask)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+            watches[wd] = map_type
+
+        def watch_type_dir(map_type, report_existing):
+            try:
+                add_watch(os.path.join(self.root, map_type), TYPE_DIR_MASK, map_type)
+            except OSError as e:
+                print(f"[CacheWatcher] Cannot watch {map_type}: {e}")
+                return
+            if report_existing:
+                # Files may have landed before the watch existed
+                for name in self._list_type_dir(map_type):
+                    self._queue("upsert", map_type, name)
+
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            add_watch(self.root, ROOT_MASK, "")
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if entry.is_dir() and not entry.name.startswith("."):
+                        watch_type_dir(entry.name, report_existing=False)
+
+            deadline = None
+            while not self._stop_event.is_set():
+                timeout = 1.0 if deadline is None else max(0.0, deadline - time.monotonic())
+                ready, _, _ = select.select([fd], [], [], timeout)
+                if ready:
+                    try:
+                        data = os.read(fd, 64 * 1024)
+                    except BlockingIOError:
+                        data = b""
+                    offset = 0
+                    while offset + _EVENT_HEADER.size <= len(data):
+                        wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                        offset += _EVENT_HEADER.size
+                        name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+                        offset += length
+                        if mask & IN_Q_OVERFLOW:
+                            # Events were dropped; rediff every folder.
+                            for map_type in set(watches.values()) - {""}:
+                                for n in self._list_type_dir(map_type):
+                                    self._queue("upsert", map_type, n)
+                            continue
+                        map_type = watches.get(wd)
+                        if map_type is None:
+                            continue
+                        if mask & IN_IGNORED:
+                            watches.pop(wd, None)
+                            continue
+                        if map_type == "":
+                            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                                print(f"[CacheWatcher] {self.root} was removed; watcher stopping")
+                                self._stop_event.set()
+                            elif mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith("."):
+                                watch_type_dir(name, report_existing=True)
+                            continue
+                        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                            self._queue("upsert", map_type, name)
+                        elif mask & (IN_DELETE | IN_MOVED_FROM):
+                            self._queue("remove", map_type, name)
+                    if self._pending:
+                        deadline = time.monotonic() + self.debounce
+                elif deadline is not None:
+                    deadline = None
+                    self._dispatch()
+            self._dispatch()
+        finally:
+            os.close(fd)
+
+    # ----- polling backend -----
+
+    def _run_polling(self):
+        self.backend = "polling"
+        dir_mtimes = {}  # map_type -> st_mtime_ns
+        snapshots = {}  # map_type -> {name: (size, mtime_ns)}
+        first = True
+        while not self._stop_event.is_set():
+            try:
+                with os.scandir(self.root) as it:
+                    type_dirs = {
+                        e.name: e.stat().st_mtime_ns
+                        for e in it
+                        if e.is_dir() and not e.name.startswith(".")
+                    }
+            except OSError:
+                type_dirs = {}
+
+            for map_type in set(snapshots) - set(type_dirs):
+                for name in snapshots.pop(map_type):
+                    self._queue("remove", map_type, name)
+                dir_mtimes.pop(map_type, None)
+
+            for map_type, mtime_ns in type_dirs.items():
+                if dir_mtimes.get(map_type) == mtime_ns:
+                    continue
+                dir_mtimes[map_type] = mtime_ns
+                old = snapshots.get(map_type, {})
+                new = self._list_type_dir(map_type)
+                snapshots[map_type] = new
+                if first:
+                    continue
+                for name, sig in new.items():
+                    if old.get(name) != sig:
+                        self._queue("upsert", map_type, name)
+                for name in set(old) - set(new):
+                    self._queue("remove", map_type, name)
+
+            first = False
+            self._dispatch()
+            self._stop_event.wait(self.poll_interval)
@@ -0,0 +1,111 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import threading
+import time
+
+
+class CatalogEventBus:
+    """Coalesces catalog changes into versioned `eros.catalog.delta` messages.
+
+    `touch()` is cheap and may be called from any thread (the metadata
+    writer calls it after every group commit). The first touch opens a short
+    window; when it closes, one delta per affected cache root is read from
+    the catalog change log and broadcast. A `generate_all` sweep therefore
+    produces a handful of small messages instead of one refresh per file.
+
+    Message payload: the `get_catalog_delta()` result plus `root`, `path`
+    (root as given by `describe_root`) and `base_version`. Clients apply it
+    only when `base_version` equals their catalog version and resync through
+    /eros/cache/catalog otherwise. `resync: true` (no data) is sent when the
+    database was replaced, e.g. by a reset.
+    """
+
+    EVENT = "eros.catalog.delta"
+
+    def __init__(self, manager, send, describe_root=None, default_root=None, window=0.25):
+        self.manager = manager
+        self.send = send
+        self.describe_root = describe_root or (lambda root: root)
+        self.default_root = default_root
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = threading.Event()
+        self._worker = None
+        self._known_roots = set()
+        self._catalog_id, self._version = manager.get_catalog_head()
+
+    def watch_root(self, root):
+        """Remember a cache root clients are browsing (tag-only changes go to all of them)."""
+        with self._lock:
+            self._known_roots.add(root)
+
+    def touch(self):
+        """Note that the catalog changed; a delta is sent when the window closes."""
+        with self._lock:
+            if self._worker is None:
+                # One long-lived thread: its catalog reader connection is reused
+                self._worker = threading.Thread(target=self._run, name="eros-catalog-events", daemon=True)
+                self._worker.start()
+        self._pending.set()
+
+    def _run(self):
+        while True:
+            self._pending.wait()
+            time.sleep(self.window)
+            # Touches from here on open the next window
+            self._pending.clear()
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            base_id, base = self._catalog_id, self._version
+            known = set(self._known_roots)
+        started = time.perf_counter()
+        try:
+            catalog_id, head = self.manager.get_catalog_head()
+            if self.default_root:
+                known.add(self.default_root)
+            if catalog_id != base_id or head < base:
+                for root in sorted(known):
+                    self._send({"resync": True, "catalog_id": catalog_id, "version": head}, root, base)
+                self._advance(catalog_id, head)
+                return
+            if head == base:
+                return
+
+            roots, tags_changed = self.manager.get_changed_roots(base)
+            if tags_changed:
+                roots |= known
+            newest = head
+            for root in sorted(r for r in roots if r):
+                delta = self.manager.get_catalog_delta(root, base, base_id)
+                newest = max(newest, delta.get("version", head))
+                if delta.get("full"):
+                    delta = {"resync": True, "catalog_id": delta.get("catalog_id"), "version": delta.get("version")}
+                self._send(delta, root, base)
+            self._advance(catalog_id, newest)
+        except Exception as e:
+            print(f"[CatalogEvents] Could not publish catalog delta: {e}")
+        finally:
+            elapsed = time.perf_counter() - started
+            if elapsed > 1.0:
+                print(f"[CatalogEvents] Delta publication took {elapsed:.2f}s")
+
+    def _advance(self, catalog_id, version):
+        with self._lock:
+            self._catalog_id = catalog_id
+            self._version = max(version, 0)
+
+    def _send(self, payload, root, base):
+        payload = dict(payload)
+        payload["root"] = root
+        payload["path"] = self.describe_root(root)
+        payload["base_version"] = base
+        try:
+            self.send(self.EVENT, payload)
+        except Exception as e:
+            print(f"[CatalogEvents] Send failed: {e}")
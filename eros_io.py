@@ -0,0 +1,160 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from .route_metrics import phase
+
+# Dedicated pool for this package's blocking work (SQLite, filesystem, zip).
+# Kept separate from the loop's default executor so a long export cannot
+# starve other extensions, and bounded so a request storm cannot spawn
+# unbounded threads.
+IO_WORKERS = max(4, min(16, (os.cpu_count() or 4) * 2))
+_io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="eros-io")
+
+
+def _timed_call(call, phase_name):
+    with phase(phase_name, inherit=True):
+        return call()
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking callable on the package I/O pool and await its result.
+
+    The request context is carried over, so the time is reported to
+    /eros/metrics: as `fs`, or as the `METRICS_PHASE` of the object a bound
+    method belongs to (MetadataManager: `sqlite`).
+    """
+    loop = asyncio.get_running_loop()
+    phase_name = getattr(getattr(fn, "__self__", None), "METRICS_PHASE", "fs")
+    ctx = contextvars.copy_context()
+    call = functools.partial(fn, *args, **kwargs)
+    return await loop.run_in_executor(_io_executor, ctx.run, _timed_call, call, phase_name)
+
+
+def file_fingerprint(paths):
+    """`path:size:mtime_ns` for each existing file, `path:missing` otherwise.
+
+    Used by the nodes' IS_CHANGED: a stat per file instead of hashing the
+    contents, and any rewrite of a file changes its mtime.
+    """
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{path}:{st.st_size}:{st.st_mtime_ns}")
+        except OSError:
+            parts.append(f"{path}:missing")
+    return "|".join(parts)
+
+
+# Max in-flight requests per route group. Heavy archive operations are
+# serialized, image serving is capped below the pool size so thumbnails
+# cannot occupy every worker, and metadata calls get their own budget. Job
+# routes only queue, inspect or cancel work, so they share a small budget,
+# and /eros/metrics scrapes are served one at a time.
+ROUTE_LIMITS = {
+    "images": max(2, IO_WORKERS // 2),
+    "listing": 4,
+    "metadata": 4,
+    "archive": 1,
+    "jobs": 4,
+    "metrics": 1,
+}
+
+_route_semaphores = {}
+
+
+def _semaphore(group):
+    sem = _route_semaphores.get(group)
+    if sem is None:
+        sem = asyncio.Semaphore(ROUTE_LIMITS.get(group, 4))
+        _route_semaphores[group] = sem
+    return sem
+
+
+def limit_concurrency(group):
+    """Decorator capping concurrent executions of an aiohttp handler per group.
+
+    Requests over the cap wait on the event loop (not in the pool), so other
+    groups keep their workers. The slot is held until the response body has
+    been sent (a FileResponse only streams its file after the handler
+    returned): the response goes back unprepared, so outer middlewares can
+    still set headers, and its write_eof() releases the slot.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            sem = _semaphore(group)
+            await sem.acquire()
+            release = _SlotRelease(sem)
+            try:
+                response = await handler(request)
+            except BaseException:
+                release()
+                raise
+            if response is None or response.prepared:
+                # Already streamed by the handler (exports, NDJSON)
+                release()
+                return response
+            try:
+                _release_after_send(response, release)
+            except AttributeError:
+                # Response classes with __slots__: release right away
+                release()
+            return response
+        return wrapper
+    return decorator
+
+
+class _SlotRelease:
+    """Releases a route slot once, however many paths end the response."""
+
+    def __init__(self, sem):
+        self._sem = sem
+        self._loop = asyncio.get_running_loop()
+
+    def __call__(self):
+        sem, self._sem = self._sem, None
+        if sem is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            sem.release()
+        elif not self._loop.is_closed():
+            # Finalizer run by the GC on another thread
+            self._loop.call_soon_threadsafe(sem.release)
+
+
+def _release_after_send(response, release):
+    prepare, write_eof = response.prepare, response.write_eof
+
+    async def prepare_or_release(request):
+        try:
+            return await prepare(request)
+        except BaseException:
+            # Client gone before the headers went out: write_eof will not come
+            release()
+            raise
+
+    async def write_eof_and_release(data=b""):
+        try:
+            return await write_eof(data)
+        finally:
+            release()
+
+    response.prepare = prepare_or_release
+    response.write_eof = write_eof_and_release
+    # Never sent at all (connection dropped between handler and send)
+    weakref.finalize(response, release)
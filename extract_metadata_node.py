@@ -5,100 +5,95 @@ Year: 2025
 """
 
 import torch
-import os
-import json
 from PIL import Image, ImageOps
 import folder_paths
 import numpy as np
+from .eros_io import file_fingerprint
+from .input_index import get_input_index
+from .image_header import read_image_header, oriented_size
+from .prompt_graph import resolve_prompt
+
+# Stand-in IMAGE when decode_image is off
+PLACEHOLDER_SIZE = 64
+
+
+def parse_prompt_metadata(prompt_text):
+    """Parse a ComfyUI API-format `prompt` JSON string.
+
+    Returns (positive_prompt, width, height); missing values are "" / 0.
+    The prompt of the first sampler is followed through reroutes,
+    primitives and concatenations (see prompt_graph), memoized per prompt.
+    """
+    try:
+        summary = resolve_prompt(prompt_text)
+    except Exception as e:
+        print(f"Error parsing metadata: {e}")
+        return "", 0, 0
+    return summary["positive"] or "", summary["width"] or 0, summary["height"] or 0
+
+
+def _read_header_or_open(image_path):
+    """read_image_header(), with PIL as fallback for other formats."""
+    header = read_image_header(image_path)
+    if header is None:
+        with Image.open(image_path) as img:
+            header = {
+                "format": img.format,
+                "width": img.width,
+                "height": img.height,
+                "orientation": img.getexif().get(0x0112, 1),
+                "text": {k: v for k, v in img.info.items() if isinstance(v, str)},
+            }
+    return header
+
 
 class ImageMetadataExtractor:
     @classmethod
     def INPUT_TYPES(s):
-        input_dir = folder_paths.get_input_directory()
-        files = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f))]
+        # Subfolders included; the index leaves out the maps cache, which is
+        # browsed with CacheMapBrowserNode
+        files = get_input_index().files()
         return {"required":
-                    {"image": (sorted(files), {"image_upload": True})},
+                    {"image": (files, {"image_upload": True})},
+                "optional":
+                    {"decode_image": ("BOOLEAN", {"default": True, "tooltip": "Decode the pixels for the image output. Turn off when only the prompt, size or filename are used; the image output is then a 64x64 placeholder."})},
                 }
 
+    @classmethod
+    def IS_CHANGED(s, image, decode_image=True, **kwargs):
+        # size/mtime of the selected file; cheaper than hashing its contents.
+        # (decode_image is a widget, so ComfyUI already keys the cache on it.)
+        return file_fingerprint([folder_paths.get_annotated_filepath(image)])
+
     RETURN_TYPES = ("IMAGE", "STRING", "INT", "INT", "STRING")
     RETURN_NAMES = ("image", "positive_prompt", "width", "height", "filename")
     FUNCTION = "extract_metadata"
     CATEGORY = "ErosDiffusion/utils"
 
-    def extract_metadata(self, image):
+    def extract_metadata(self, image, decode_image=True):
         image_path = folder_paths.get_annotated_filepath(image)
-        img = Image.open(image_path)
-        
-        output_image = ImageOps.exif_transpose(img)
-        output_image = output_image.convert("RGB")
-        output_image = np.array(output_image).astype(np.float32) / 255.0
-        output_image = torch.from_numpy(output_image)[None,]
+        # Text chunks / EXIF only; pixels are decoded below if needed
+        header = _read_header_or_open(image_path)
 
         positive_prompt = ""
         width = 0
         height = 0
 
         # Extract from 'prompt' (API format) which is what ComfyUI uses for execution
-        if 'prompt' in img.info:
-            try:
-                prompt = json.loads(img.info['prompt'])
-                
-                # 1. Find Positive Prompt
-                # Strategy: Find KSampler -> positive input -> CLIPTextEncode -> text
-                ksampler_nodes = []
-                for node_id, node in prompt.items():
-                    class_type = node.get('class_type', '')
-                    if 'KSampler' in class_type or 'SamplerCustom' in class_type:
-                        ksampler_nodes.append(node)
-                
-                for ksampler in ksampler_nodes:
-                    inputs = ksampler.get('inputs', {})
-                    if 'positive' in inputs:
-                        positive_link = inputs['positive']
-                        if isinstance(positive_link, list): # It's a link [node_id, slot_index]
-                            positive_node_id = str(positive_link[0])
-                            if positive_node_id in prompt:
-                                positive_node = prompt[positive_node_id]
-                                if positive_node.get('class_type') == 'CLIPTextEncode':
-                                    positive_prompt = positive_node.get('inputs', {}).get('text', "")
-                                    break # Found it
-                
-                # Fallback: Look for any CLIPTextEncode with "positive" in title/meta if not found via KSampler
-                if not positive_prompt:
-                     candidates = []
-                     for node_id, node in prompt.items():
-                        if node.get('class_type') == 'CLIPTextEncode':
-                            title = node.get('_meta', {}).get('title', '').lower()
-                            text = node.get('inputs', {}).get('text', "")
-                            if 'positive' in title and 'negative' not in title:
-                                candidates.append(text)
-                            # Also consider just long text if no clear title match
-                            elif len(text) > 50:
-                                candidates.append(text)
-                     
-                     # Pick the longest candidate if any found
-                     if candidates:
-                         positive_prompt = max(candidates, key=len)
-
-                # 2. Find Width/Height
-                # Strategy: Find EmptyLatentImage
-                for node_id, node in prompt.items():
-                    if node.get('class_type') == 'EmptyLatentImage':
-                        width = node.get('inputs', {}).get('width', 0)
-                        height = node.get('inputs', {}).get('height', 0)
-                        break
-                
-                # Fallback: Look for width/height in any node if still 0
-                if width == 0 or height == 0:
-                     for node_id, node in prompt.items():
-                        inputs = node.get('inputs', {})
-                        if 'width' in inputs and 'height' in inputs:
-                            width = inputs['width']
-                            height = inputs['height']
-                            break
-
-            except Exception as e:
-                print(f"Error parsing metadata: {e}")
+        if 'prompt' in header["text"]:
+            positive_prompt, width, height = parse_prompt_metadata(header["text"]['prompt'])
+        if not width or not height:
+            # No generation size recorded: use the image's own
+            width, height = oriented_size(header)
+
+        if decode_image:
+            with Image.open(image_path) as img:
+                output_image = ImageOps.exif_transpose(img)
+                output_image = output_image.convert("RGB")
+            output_image = np.array(output_image).astype(np.float32) / 255.0
+            output_image = torch.from_numpy(output_image)[None,]
+        else:
+            output_image = torch.zeros((1, PLACEHOLDER_SIZE, PLACEHOLDER_SIZE, 3), dtype=torch.float32)
 
         return (output_image, positive_prompt, width, height, image)
 
@@ -0,0 +1,304 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import re
+import struct
+import zlib
+
+# Reads dimensions and embedded generation metadata (ComfyUI `prompt` and
+# `workflow` JSON, A1111 `parameters`) from PNG, WebP and JPEG files without
+# decoding pixels: only the chunks/segments ahead of the image data are read.
+# Plain standard library, so it can run in worker processes and CLIs.
+
+# Text chunks beyond this total are ignored (PIL's MAX_TEXT_MEMORY)
+MAX_TEXT_BYTES = 64 * 1024 * 1024
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# EXIF tags
+TAG_IMAGE_DESCRIPTION = 0x010E
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_ORIENTATION = 0x0112
+TAG_EXIF_IFD = 0x8769
+TAG_USER_COMMENT = 0x9286
+
+# ComfyUI stores WebP metadata as "<key>:<json>" in EXIF strings
+# (prompt in Model, workflow in Make, further keys below it).
+_KEYED_JSON = re.compile(r"^([A-Za-z_][\w-]*):\s*([\[{].*)$", re.S)
+
+
+def read_image_header(path):
+    """Header information of a PNG, WebP or JPEG file, without pixel decode.
+
+    Returns {"format", "width", "height", "orientation", "text"} where width
+    and height are the stored size (before EXIF rotation), format uses PIL's
+    names ("PNG", "WEBP", "JPEG") and text holds the metadata strings
+    ("prompt", "workflow", "parameters", ...). Returns None for other or
+    malformed files; OSError from opening the file propagates.
+    """
+    with open(path, "rb") as f:
+        head = f.read(12)
+        f.seek(0)
+        try:
+            if head.startswith(PNG_SIGNATURE):
+                return _read_png(f)
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                return _read_webp(f)
+            if head[:2] == b"\xff\xd8":
+                return _read_jpeg(f)
+        except (ValueError, struct.error, zlib.error, UnicodeDecodeError):
+            return None
+    return None
+
+
+def oriented_size(header):
+    """(width, height) of a header after EXIF rotation (orientations 5-8 swap them)."""
+    w, h = header["width"], header["height"]
+    return (h, w) if header.get("orientation", 1) in (5, 6, 7, 8) else (w, h)
+
+
+def _result(fmt, width, height):
+    return {"format": fmt, "width": width, "height": height, "orientation": 1, "text": {}}
+
+
+def _read_exact(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError("truncated file")
+    return data
+
+
+class _TextBudget:
+    def __init__(self):
+        self.left = MAX_TEXT_BYTES
+
+    def take(self, n):
+        if n > self.left:
+            return False
+        self.left -= n
+        return True
+
+
+# ----- PNG -----
+
+def _read_png(f):
+    f.seek(len(PNG_SIGNATURE))
+    info = None
+    budget = _TextBudget()
+    while True:
+        length, ctype = struct.unpack(">I4s", _read_exact(f, 8))
+        if ctype == b"IHDR":
+            w, h = struct.unpack(">II", _read_exact(f, 8))
+            info = _result("PNG", w, h)
+            f.seek(length - 8 + 4, 1)
+            continue
+        if info is None:
+            raise ValueError("PNG without IHDR")
+        if ctype in (b"IDAT", b"IEND"):
+            # Like PIL, text after the pixel data is not looked at
+            return info
+        if ctype in (b"tEXt", b"zTXt", b"iTXt", b"eXIf") and budget.take(length):
+            data = _read_exact(f, length)
+            f.seek(4, 1)  # CRC
+            if ctype == b"eXIf":
+                _apply_exif(info, data)
+            else:
+                key, value = _png_text(ctype, data)
+                if key and key not in info["text"]:
+                    info["text"][key] = value
+        else:
+            f.seek(length + 4, 1)
+
+
+def _png_text(ctype, data):
+    key, _, rest = data.partition(b"\0")
+    key = key.decode("latin-1")
+    if ctype == b"tEXt":
+        return key, rest.decode("latin-1")
+    if ctype == b"zTXt":
+        return key, zlib.decompress(rest[1:]).decode("latin-1")
+    # iTXt: compression flag, method, language tag, translated keyword, text
+    compressed = rest[:1] == b"\x01"
+    _lang, _, rest = rest[2:].partition(b"\0")
+    _translated, _, text = rest.partition(b"\0")
+    if compressed:
+        text = zlib.decompress(text)
+    return key, text.decode("utf-8")
+
+
+# ----- WebP -----
+
+def _read_webp(f):
+    riff_size = struct.unpack("<I", _read_exact(f, 12)[4:8])[0]
+    end = riff_size + 8
+    info = None
+    exif = xmp = None
+    budget = _TextBudget()
+    while f.tell() + 8 <= end:
+        ctype, length = struct.unpack("<4sI", _read_exact(f, 8))
+        padded = length + (length & 1)
+        if ctype == b"VP8X":
+            data = _read_exact(f, 10)
+            w = 1 + int.from_bytes(data[4:7], "little")
+            h = 1 + int.from_bytes(data[7:10], "little")
+            info = _result("WEBP", w, h)
+            f.seek(padded - 10, 1)
+        elif ctype == b"VP8 " and info is None:
+            data = _read_exact(f, 10)
+            if data[3:6] != b"\x9d\x01\x2a":
+                raise ValueError("bad VP8 frame")
+            w, h = struct.unpack("<HH", data[6:10])
+            info = _result("WEBP", w & 0x3FFF, h & 0x3FFF)
+            return info  # simple file: nothing but pixels follows
+        elif ctype == b"VP8L" and info is None:
+            data = _read_exact(f, 5)
+            if data[0] != 0x2F:
+                raise ValueError("bad VP8L signature")
+            bits = int.from_bytes(data[1:5], "little")
+            info = _result("WEBP", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+            return info
+        elif ctype == b"EXIF" and budget.take(length):
+            exif = _read_exact(f, length)
+            f.seek(padded - length, 1)
+        elif ctype == b"XMP " and budget.take(length):
+            xmp = _read_exact(f, length)
+            f.seek(padded - length, 1)
+        else:
+            # Extended files keep EXIF/XMP after the frames: skip pixel data
+            f.seek(padded, 1)
+    if info is None:
+        raise ValueError("WebP without a frame header")
+    if exif:
+        _apply_exif(info, exif)
+    if xmp:
+        info["text"].setdefault("XML:com.adobe.xmp", xmp.decode("utf-8", "replace"))
+    return info
+
+
+# ----- JPEG -----
+
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_XMP_ID = b"http://ns.adobe.com/xap/1.0/\0"
+
+
+def _read_jpeg(f):
+    f.seek(2)
+    info = None
+    text = {}
+    exif = None
+    budget = _TextBudget()
+    while True:
+        byte = _read_exact(f, 1)
+        if byte != b"\xff":
+            raise ValueError("bad JPEG marker")
+        marker = _read_exact(f, 1)[0]
+        while marker == 0xFF:  # fill bytes
+            marker = _read_exact(f, 1)[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue  # no payload
+        if marker in (0xDA, 0xD9):
+            break  # start of scan: pixel data follows
+        length = struct.unpack(">H", _read_exact(f, 2))[0] - 2
+        if marker in _JPEG_SOF:
+            data = _read_exact(f, 5)
+            h, w = struct.unpack(">HH", data[1:5])
+            info = _result("JPEG", w, h)
+            f.seek(length - 5, 1)
+        elif marker in (0xE1, 0xFE) and budget.take(length):
+            data = _read_exact(f, length)
+            if marker == 0xFE:
+                text.setdefault("comment", data.decode("utf-8", "replace"))
+            elif data.startswith(b"Exif\0\0") and exif is None:
+                exif = data
+            elif data.startswith(_XMP_ID):
+                text.setdefault("XML:com.adobe.xmp", data[len(_XMP_ID):].decode("utf-8", "replace"))
+        else:
+            f.seek(length, 1)
+    if info is None:
+        raise ValueError("JPEG without a frame header")
+    if exif:
+        _apply_exif(info, exif)
+    for key, value in text.items():
+        info["text"].setdefault(key, value)
+    return info
+
+
+# ----- EXIF -----
+
+def _apply_exif(info, data):
+    """Merge orientation and metadata strings from an EXIF (TIFF) block into `info`."""
+    if data.startswith(b"Exif\0\0"):
+        data = data[6:]
+    try:
+        tags = _parse_tiff(data)
+    except (ValueError, struct.error, IndexError):
+        return
+    orientation = tags.get(TAG_ORIENTATION)
+    if isinstance(orientation, int):
+        info["orientation"] = orientation
+    text = info["text"]
+    for tag in sorted(tags):
+        value = tags[tag]
+        if not isinstance(value, str):
+            continue
+        match = _KEYED_JSON.match(value)
+        if match:
+            text.setdefault(match.group(1), match.group(2))
+    comment = tags.get(TAG_USER_COMMENT)
+    if isinstance(comment, str) and comment.strip():
+        text.setdefault("parameters", comment)
+
+
+def _parse_tiff(data):
+    """IFD0 and Exif IFD entries: strings and the first value of integer tags."""
+    order = {b"II": "<", b"MM": ">"}.get(data[:2])
+    if order is None:
+        raise ValueError("bad TIFF header")
+    tags = {}
+    ifd = struct.unpack(order + "I", data[4:8])[0]
+    pending = [ifd]
+    visited = set()
+    while pending:
+        offset = pending.pop()
+        if offset in visited or offset + 2 > len(data):
+            continue
+        visited.add(offset)
+        count = struct.unpack(order + "H", data[offset:offset + 2])[0]
+        for i in range(count):
+            entry = offset + 2 + i * 12
+            tag, typ, n = struct.unpack(order + "HHI", data[entry:entry + 8])
+            raw = data[entry + 8:entry + 12]
+            size = {1: 1, 2: 1, 3: 2, 4: 4, 7: 1, 13: 4}.get(typ)
+            if size is None:
+                continue
+            if size * n > 4:
+                start = struct.unpack(order + "I", raw)[0]
+                raw = data[start:start + size * n]
+            if typ == 3:
+                tags[tag] = struct.unpack(order + "H", raw[:2])[0]
+            elif typ in (4, 13):  # 13: IFD offset
+                value = struct.unpack(order + "I", raw[:4])[0]
+                if tag == TAG_EXIF_IFD:
+                    pending.append(value)
+                else:
+                    tags[tag] = value
+            elif typ == 2:
+                tags[tag] = raw[:n].split(b"\0", 1)[0].decode("utf-8", "replace")
+            elif typ in (1, 7) and tag == TAG_USER_COMMENT:
+                tags[tag] = _user_comment(raw[:n], order)
+    return tags
+
+
+def _user_comment(raw, order):
+    # 8-byte character code, then the text
+    code, body = raw[:8], raw[8:]
+    if code.startswith(b"UNICODE"):
+        # piexif (A1111) writes big-endian UTF-16 whatever the TIFF byte
+        # order; the zero high byte of the first (ASCII) character tells
+        encoding = "utf-16-be" if body[:1] == b"\0" else "utf-16-le"
+        return body.decode(encoding, "replace").rstrip("\0")
+    return body.decode("utf-8", "replace").rstrip("\0")
@@ -0,0 +1,275 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import os
+import threading
+import time
+
+
+class _DirListing:
+    __slots__ = ("mtime_ns", "files", "subdirs")
+
+    def __init__(self, mtime_ns, files, subdirs):
+        self.mtime_ns = mtime_ns
+        self.files = files
+        self.subdirs = subdirs
+
+
+class InputIndex:
+    """Cached recursive listing of a directory tree (the ComfyUI input folder).
+
+    Each directory is listed with os.scandir and kept with its mtime, which
+    changes whenever an entry is added, removed or renamed in it. A refresh
+    stats every directory and re-lists only the changed ones, so it costs one
+    stat per folder instead of one per file. Callers get the cached listing
+    right away: a change of the root folder (uploads land there) is picked
+    up synchronously, deeper changes by a background refresh started when
+    the listing is older than `refresh_interval` seconds. Hidden folders and
+    the `exclude`d ones (see exclude()) are never walked.
+    """
+
+    def __init__(self, root, refresh_interval=2.0, exclude=()):
+        self._root = root  # path or callable returning it
+        self.refresh_interval = refresh_interval
+        self._excluded = {os.path.abspath(p) for p in exclude}
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._dirs = {}  # relative dir ("" for the root) -> _DirListing
+        self._scanned_root = None
+        self._scanned_at = 0.0
+        self._refreshing = False
+        self._sorted = {}  # listing options -> sorted relative paths
+        self.generation = 0
+
+    @property
+    def root(self):
+        return os.path.abspath(self._root() if callable(self._root) else self._root)
+
+    def exclude(self, path):
+        """Leave the folder `path` (and its subtree) out of the index from now on."""
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self._excluded:
+                return
+            self._excluded.add(path)
+            self._scanned_root = None  # next query re-walks without it
+
+    def _excluded_rels(self, root):
+        with self._lock:
+            excluded = set(self._excluded)
+        return {self.relpath(p) for p in excluded if self.contains(p, root) and p != root}
+
+    # ----- queries -----
+
+    def files(self, subfolders=True, exclude_dirs=()):
+        """Sorted file paths relative to the root ("sub/name.png"), with "/" separators.
+
+        `exclude_dirs` are relative folders left out together with their subtree.
+        """
+        dirs = self._current()
+        key = (subfolders, tuple(sorted(exclude_dirs)))
+        with self._lock:
+            cached = self._sorted.get(key)
+            if cached is not None and cached[0] == self.generation:
+                return cached[1]
+            generation = self.generation
+        excluded = tuple(d.strip("/") for d in exclude_dirs)
+        result = []
+        for rel, listing in dirs.items():
+            if rel and not subfolders:
+                continue
+            if excluded and any(rel == d or rel.startswith(d + "/") for d in excluded):
+                continue
+            prefix = rel + "/" if rel else ""
+            result.extend(prefix + name for name in listing.files)
+        result.sort()
+        with self._lock:
+            if generation == self.generation:
+                self._sorted[key] = (generation, result)
+        return result
+
+    def dirs(self, rel=""):
+        """Sorted subfolder names of a folder of the tree ([] if unknown).
+
+        The folder itself is checked against its mtime, so a subfolder created
+        a moment ago is listed without waiting for the background refresh.
+        """
+        rel = rel.strip("/").replace("\\", "/")
+        listing = self._current().get(rel)
+        try:
+            mtime_ns = os.stat(os.path.join(self.root, rel)).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        if listing is None or listing.mtime_ns != mtime_ns:
+            listing = self.refresh().get(rel)
+        return sorted(listing.subdirs) if listing else []
+
+    def walk(self):
+        """(relative dir, [file names]) for every indexed folder."""
+        return [(rel, list(listing.files)) for rel, listing in sorted(self._current().items())]
+
+    def contains(self, path, root=None):
+        """True if `path` lies inside the root (excluded folders included)."""
+        root = root or self.root
+        try:
+            return os.path.commonpath([root, os.path.abspath(path)]) == root
+        except ValueError:
+            return False
+
+    def indexes(self, path):
+        """True if `path` lies inside the root and outside the excluded folders."""
+        path = os.path.abspath(path)
+        if not self.contains(path):
+            return False
+        with self._lock:
+            excluded = set(self._excluded)
+        return not any(self.contains(path, root=e) for e in excluded)
+
+    def relpath(self, path):
+        rel = os.path.relpath(os.path.abspath(path), self.root).replace("\\", "/")
+        return "" if rel == "." else rel
+
+    # ----- refresh -----
+
+    def _current(self):
+        root = self.root
+        with self._lock:
+            dirs, scanned_root, age = self._dirs, self._scanned_root, time.monotonic() - self._scanned_at
+            top = dirs.get("")
+        if scanned_root != root or top is None:
+            return self.refresh()
+        try:
+            root_changed = os.stat(root).st_mtime_ns != top.mtime_ns
+        except OSError:
+            root_changed = True
+        if root_changed:
+            return self.refresh()
+        if age > self.refresh_interval:
+            self._refresh_in_background()
+        return dirs
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[InputIndex] Background refresh failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="eros-input-index", daemon=True).start()
+
+    def refresh(self):
+        """Re-list changed folders now; returns the new {relative dir: listing} map."""
+        with self._scan_lock:
+            root = self.root
+            with self._lock:
+                previous = self._dirs if self._scanned_root == root else {}
+            current = {}
+            changed = False
+            excluded = self._excluded_rels(root)
+            seen = set()  # (st_dev, st_ino): symlinked folders may loop
+            stack = [""]
+            while stack:
+                rel = stack.pop()
+                path = os.path.join(root, rel) if rel else root
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if (st.st_dev, st.st_ino) in seen:
+                    continue
+                seen.add((st.st_dev, st.st_ino))
+                mtime_ns = st.st_mtime_ns
+                listing = previous.get(rel)
+                if listing is None or listing.mtime_ns != mtime_ns:
+                    listing = self._list_dir(path, mtime_ns)
+                    changed = True
+                current[rel] = listing
+                for d in listing.subdirs:
+                    sub = f"{rel}/{d}" if rel else d
+                    if sub not in excluded:
+                        stack.append(sub)
+            if current.keys() != previous.keys():
+                changed = True
+            with self._lock:
+                self._dirs = current
+                self._scanned_root = root
+                self._scanned_at = time.monotonic()
+                if changed:
+                    self.generation += 1
+                    self._sorted.clear()
+            return current
+
+    @staticmethod
+    def _list_dir(path, mtime_ns):
+        files, subdirs = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            if not entry.name.startswith("."):
+                                subdirs.append(entry.name)
+                        elif entry.is_file():
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return _DirListing(mtime_ns, files, subdirs)
+
+
+def iter_file_batches(path, extensions, limit=None, batch_size=256):
+    """Yield lists of {"name", "bytes", "mtime"} for the files of one folder, in directory order.
+
+    Only names ending in `extensions` (lowercase, with the dot) are listed;
+    `limit` (None for no limit) caps the total. Each batch is read when it
+    is asked for, so callers can send the first rows before the scan ends.
+    """
+    sent = 0
+    with os.scandir(path) as it:
+        batch = []
+        for entry in it:
+            if limit is not None and sent + len(batch) >= limit:
+                break
+            if os.path.splitext(entry.name)[1].lower() not in extensions:
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            batch.append({"name": entry.name, "bytes": st.st_size, "mtime": st.st_mtime})
+            if len(batch) >= batch_size:
+                sent += len(batch)
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+_input_index = None
+_input_index_lock = threading.Lock()
+
+
+def get_input_index():
+    """The InputIndex of ComfyUI's input directory, shared by this package's nodes and routes."""
+    global _input_index
+    with _input_index_lock:
+        if _input_index is None:
+            import folder_paths
+
+            # cache_map_nodes excludes the maps cache (see default_maps_dir)
+            _input_index = InputIndex(folder_paths.get_input_directory)
+        return _input_index
@@ -0,0 +1,276 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import glob
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED, INTERRUPTED)
+
+
+class JobCancelled(Exception):
+    """Raised by Job.check_cancelled() once cancellation was requested."""
+
+
+class Job:
+    """Handle passed to job functions: parameters, progress reporting, cancellation."""
+
+    def __init__(self, manager, record):
+        self._manager = manager
+        self.record = record
+        self._cancel = threading.Event()
+        self._last_report = 0.0
+
+    @property
+    def id(self):
+        return self.record["id"]
+
+    @property
+    def kind(self):
+        return self.record["kind"]
+
+    @property
+    def params(self):
+        return self.record.get("params") or {}
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def path(self, suffix):
+        """A file in the jobs directory owned by this job (removed when the job is pruned)."""
+        return os.path.join(self._manager.job_dir, f"{self.id}{suffix}")
+
+    def report(self, force=False, **progress):
+        """Merge progress fields and broadcast them (throttled unless `force`)."""
+        with self._manager._lock:
+            merged = dict(self.record.get("progress") or {})
+            merged.update(progress)
+            self.record["progress"] = merged
+        now = time.monotonic()
+        if force or now - self._last_report >= self._manager.report_interval:
+            self._last_report = now
+            self._manager._broadcast(self)
+
+
+class JobManager:
+    """Runs long cache operations in the background.
+
+    Job functions are registered per kind with a concurrency limit and are
+    called as `fn(job)` on a worker pool; kinds registered with the same
+    `group` share that group's limit. Functions report progress through
+    `job.report(...)`, poll `job.check_cancelled()` at safe points and return
+    a JSON-serializable result (a `file` key names a result file in
+    `job_dir`). Records are persisted through `store`
+    (MetadataManager.save_job/load_jobs/delete_jobs) on every state change,
+    so queued jobs are picked up again after a restart and jobs that were
+    running are marked interrupted. Each change is broadcast as `EVENT`.
+    """
+
+    EVENT = "eros.job"
+    # submit()/cancel() persist through the metadata writer (see eros_io.run_io)
+    METRICS_PHASE = "sqlite"
+
+    def __init__(self, store, send, job_dir, workers=2, keep=100, report_interval=0.25):
+        self.store = store
+        self.send = send
+        self.job_dir = job_dir
+        self.keep = keep
+        self.report_interval = report_interval
+        self._lock = threading.RLock()
+        self._kinds = {}  # kind -> (fn, group)
+        self._limits = {}  # group -> max running
+        self._jobs = {}  # id -> Job
+        self._queue = []  # ids, FIFO
+        self._running = {}  # group -> count
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eros-job")
+
+    def register(self, kind, fn, limit=1, group=None):
+        group = group or kind
+        self._kinds[kind] = (fn, group)
+        self._limits[group] = max(1, int(limit))
+
+    def kinds(self):
+        return sorted(self._kinds)
+
+    # ----- public API -----
+
+    def submit(self, kind, params=None, job_id=None):
+        """Queue a job and return its record. Raises ValueError for unknown kinds."""
+        if kind not in self._kinds:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        record = {
+            "id": job_id or uuid.uuid4().hex,
+            "kind": kind,
+            "state": QUEUED,
+            "params": params or {},
+            "progress": {},
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        job = Job(self, record)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._queue.append(job.id)
+        self._persist(job)
+        self._broadcast(job)
+        self._prune()
+        self._dispatch()
+        return self.get(job.id)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job.record) if job else None
+
+    def list(self, kind=None, state=None, limit=50):
+        with self._lock:
+            records = [dict(j.record) for j in self._jobs.values()]
+        if kind:
+            records = [r for r in records if r["kind"] == kind]
+        if state:
+            records = [r for r in records if r["state"] == state]
+        records.sort(key=lambda r: r["created_at"], reverse=True)
+        return records[:limit]
+
+    def cancel(self, job_id):
+        """Cancel a queued job now, or ask a running one to stop. Returns the record."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job._cancel.set()
+            if job.record["state"] == QUEUED:
+                self._queue.remove(job_id)
+                self._finish(job, CANCELLED)
+        return self.get(job_id)
+
+    def result_file(self, job_id):
+        """Path of a finished job's file result, if it has one and it still exists."""
+        record = self.get(job_id)
+        if not record or record["state"] != SUCCEEDED:
+            return None
+        name = (record.get("result") or {}).get("file")
+        path = os.path.join(self.job_dir, os.path.basename(name)) if name else None
+        return path if path and os.path.isfile(path) else None
+
+    def recover(self):
+        """Load persisted jobs: re-queue queued ones, mark running ones interrupted."""
+        for record in self.store.load_jobs():
+            if record["id"] in self._jobs:
+                continue
+            job = Job(self, record)
+            with self._lock:
+                self._jobs[job.id] = job
+            if record["state"] == RUNNING:
+                record["error"] = "Interrupted by a restart"
+                self._finish(job, INTERRUPTED)
+            elif record["state"] == QUEUED:
+                if record["kind"] in self._kinds:
+                    with self._lock:
+                        self._queue.append(job.id)
+                else:
+                    record["error"] = f"Unknown job kind '{record['kind']}'"
+                    self._finish(job, FAILED)
+        self._dispatch()
+
+    def persist_all(self):
+        """Write every known job again (e.g. after the database was recreated)."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            self._persist(job)
+
+    # ----- internals -----
+
+    def _dispatch(self):
+        to_start = []
+        with self._lock:
+            for job_id in list(self._queue):
+                job = self._jobs[job_id]
+                _fn, group = self._kinds[job.kind]
+                if self._running.get(group, 0) >= self._limits[group]:
+                    continue
+                self._queue.remove(job_id)
+                self._running[group] = self._running.get(group, 0) + 1
+                job.record["state"] = RUNNING
+                job.record["started_at"] = time.time()
+                to_start.append(job)
+        for job in to_start:
+            self._persist(job)
+            self._broadcast(job)
+            self._pool.submit(self._run, job)
+
+    def _run(self, job):
+        fn, group = self._kinds[job.kind]
+        try:
+            job.check_cancelled()
+            result = fn(job)
+            job.record["result"] = result
+            self._finish(job, SUCCEEDED)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            print(f"[Jobs] {job.kind} job {job.id} failed: {e}")
+            job.record["error"] = str(e)
+            self._finish(job, FAILED)
+        finally:
+            with self._lock:
+                self._running[group] = max(0, self._running.get(group, 1) - 1)
+            self._dispatch()
+
+    def _finish(self, job, state):
+        job.record["state"] = state
+        job.record["finished_at"] = time.time()
+        self._persist(job)
+        self._broadcast(job)
+
+    def _persist(self, job):
+        self.store.save_job(job.record)
+
+    def _broadcast(self, job):
+        try:
+            with self._lock:
+                payload = dict(job.record)
+            self.send(self.EVENT, payload)
+        except Exception as e:
+            print(f"[Jobs] Send failed: {e}")
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond `keep`, with their files."""
+        with self._lock:
+            finished = sorted(
+                (j for j in self._jobs.values() if j.record["state"] in FINISHED_STATES),
+                key=lambda j: j.record["created_at"],
+            )
+            stale = finished[:max(0, len(finished) - self.keep)]
+            for job in stale:
+                del self._jobs[job.id]
+        if not stale:
+            return
+        self.store.delete_jobs(job.id for job in stale)
+        for job in stale:
+            for path in glob.glob(os.path.join(glob.escape(self.job_dir), f"{job.id}*")):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
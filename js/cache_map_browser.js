@@ -32,10 +32,14 @@ import { api } from "../../scripts/api.js";
     [
       "eros.tags.updated",
       "eros.image.deleted",
+      "eros.images.deleted",
       "eros.map.saved",
       "eros.image.saved",
       "eros.cache.imported",
+      "eros.cache.import_progress",
       "eros.cache.reset",
+      "eros.catalog.delta",
+      "eros.job",
     ].forEach(forward);
   } catch (e) {
     // ignore
@@ -487,7 +491,7 @@ app.registerExtension({
                 cache
               )}&subfolder=${encodeURIComponent(
                 sub
-              )}&filename=${encodeURIComponent(file)}&t=${Date.now()}`;
+              )}&filename=${encodeURIComponent(file)}`;
 
               const img = new Image();
               img.onload = () => {
@@ -127,18 +127,6 @@ class ErosLitControls extends LitElement {
               />
               Show Badges
             </label>
-            <label class="eros-overlay-toggle">
-              <input
-                type="checkbox"
-                .checked=${!!c.cacheBusting}
-                @change=${(e) =>
-                  this.emit("setting-change", {
-                    key: "cacheBusting",
-                    value: e.target.checked,
-                  })}
-              />
-              Cache Busting
-            </label>
           </div>
 
           <label class="eros-overlay-controls">
@@ -234,12 +222,16 @@ class ErosLitGrid extends LitElement {
     currentTab: { type: String },
     config: { type: Object },
     selectedFilename: { type: String },
+    revisions: { type: Object }, // Map basename -> revision
+    cacheEpoch: { type: Number },
   };
 
   constructor() {
     super();
     this.files = [];
     this.config = {};
+    this.revisions = new Map();
+    this.cacheEpoch = 0;
   }
 
   render() {
@@ -286,18 +278,20 @@ class ErosLitGrid extends LitElement {
       filename = parts.slice(1).join("/");
     }
     const base = filename.replace(/\.[^/.]+$/, "");
-    const ts = c.cacheBusting ? `&t=${Date.now()}` : "";
-    // Note: Using Date.now() in render() forces reload on every update?
-    // Better to store timestamp in state if we want to control it, implies simple cache busting might cause reloads.
-    // For now adhering to logic: if c.cacheBusting is true, we might generate new URL?
-    // Just use a fixed TS or depend on upstream trigger?
-    // The WC version uses Date.now() *at render time*.
+    // The server sends ETag/Last-Modified, so URLs stay stable and the
+    // browser cache is reused; they only change after this map was re-saved
+    // (or the cache was imported/reset), which forces a fresh fetch.
+    const rev = (this.revisions && this.revisions.get(base)) || 0;
+    const ts = rev || this.cacheEpoch ? `&v=${this.cacheEpoch}.${rev}` : "";
 
     const imgPath = `/eros/cache/view_image?path=${encodeURIComponent(
       this.cachePath
     )}&subfolder=${encodeURIComponent(sub)}&filename=${encodeURIComponent(
       filename
     )}${ts}`;
+    // Grid cells only need a tile-sized rendition; the server snaps the size
+    // to a few buckets and caches the result. Selection still uses imgPath.
+    const thumbPath = `${imgPath}&size=${this._thumbSize(c)}`;
     const tags = this.imageTags.get(base);
     const isFav = this._hasTag(tags, "favorite");
 
@@ -307,7 +301,7 @@ class ErosLitGrid extends LitElement {
         this.selectedFilename === base
           ? "selected"
           : ""}"
-        @click=${() => this.select(f, imgPath)}
+        @click=${(e) => this.select(f, imgPath, e)}
       >
         <div
           class="eros-star ${isFav ? "active" : ""}"
@@ -318,7 +312,7 @@ class ErosLitGrid extends LitElement {
         </div>
         <div class="eros-loader"></div>
         <img
-          src="${imgPath}"
+          src="${thumbPath}"
           loading="lazy"
           style="opacity:0; transition:opacity 0.2s;"
           @load=${(e) => {
@@ -335,7 +329,7 @@ class ErosLitGrid extends LitElement {
                   this.cachePath
                 )}&subfolder=original&filename=${encodeURIComponent(
                   filename
-                )}${ts}"
+                )}${ts}&size=${this._thumbSize(c)}"
                 loading="lazy"
                 style="opacity:${c.opacity}; mix-blend-mode:${c.blendMode}; position:absolute; top:0; left:0; width:100%; height:100%; pointer-events:none;"
                 @error=${(e) => (e.target.style.display = "none")}
@@ -390,7 +384,13 @@ class ErosLitGrid extends LitElement {
     );
   }
 
-  select(f, path) {
+  _thumbSize(c) {
+    const cols = c.columns || 4;
+    const width = this.clientWidth || 640;
+    return Math.ceil((width / cols) * (window.devicePixelRatio || 1));
+  }
+
+  select(f, path, e) {
     // Remove .selected class from others? Lit render handles class binding if we track selection state.
     // But for simplicity/hybrid, we can just use DOM or track 'selected' prop.
     // Let's rely on parent to track selection or just use rudimentary DOM queries if needed,
@@ -398,7 +398,12 @@ class ErosLitGrid extends LitElement {
     // Dispatch event
     this.dispatchEvent(
       new CustomEvent("image-selected", {
-        detail: { filename: f, imgPath: path },
+        detail: {
+          filename: f,
+          imgPath: path,
+          // ctrl/cmd+click adds to / removes from the node's batch list
+          additive: !!(e && (e.ctrlKey || e.metaKey)),
+        },
         bubbles: true,
         composed: true,
       })
@@ -757,6 +762,7 @@ export class ErosLitBrowser extends LitElement {
     selectedFilename: { type: String },
     _busyExport: { type: Boolean },
     _busyImport: { type: Boolean },
+    _importProgress: { type: String },
     _busyReset: { type: Boolean },
     _resetWipeOtherDbs: { type: Boolean },
   };
@@ -771,11 +777,15 @@ export class ErosLitBrowser extends LitElement {
     this.isOpen = false;
     this._busyExport = false;
     this._busyImport = false;
+    this._importProgress = "";
     this._busyReset = false;
     // Most reliable default: full reset clears all extension DBs.
     this._resetWipeOtherDbs = true;
     this._patchedContainer = null;
     this._originalContainerStyle = null;
+    // Image URL revisions, bumped only when maps are rewritten.
+    this._mapRevisions = new Map(); // basename -> counter
+    this._cacheEpoch = 0;
 
     // Load settings
     const defaults = {
@@ -785,7 +795,6 @@ export class ErosLitBrowser extends LitElement {
       opacity: 0.25,
       columns: 4,
       badgeSize: 9,
-      cacheBusting: true,
       blendModes:
         "normal,multiply,screen,overlay,darken,lighten,color-dodge,color-burn,hard-light,soft-light,difference,exclusion,hue,saturation,color,luminosity",
       currentTab: "depth",
@@ -838,6 +847,7 @@ export class ErosLitBrowser extends LitElement {
     // Listen for backend-driven updates (tags, image deleted/saved) so the
     // sidebar refreshes immediately when maps are created/deleted/tags change.
     this._onCacheChanged = async (ev) => {
+      this._cacheEpoch += 1;
       try {
         await this.fetchFiles(false, true);
         await this.cache.loadTags();
@@ -845,6 +855,8 @@ export class ErosLitBrowser extends LitElement {
       } catch (e) {}
     };
     this._onTagsUpdated = async (ev) => {
+      // With a catalog copy, eros.catalog.delta carries the change.
+      if (this.cache.catalog) return;
       try {
         await this.cache.loadTags();
         await this.fetchFiles(false, true);
@@ -852,6 +864,7 @@ export class ErosLitBrowser extends LitElement {
       } catch (e) {}
     };
     this._onImageDeleted = async (ev) => {
+      if (this.cache.catalog) return;
       try {
         await this.fetchFiles(false, true);
         await this.cache.loadTags();
@@ -859,6 +872,17 @@ export class ErosLitBrowser extends LitElement {
       } catch (e) {}
     };
     this._onMapSaved = async (ev) => {
+      const saved = ev?.detail?.saved || [];
+      const base = ev?.detail?.basename;
+      for (const b of base ? [base] : saved.map((m) => m && m.basename)) {
+        if (b) this._mapRevisions.set(b, (this._mapRevisions.get(b) || 0) + 1);
+      }
+      if (this.cache.catalog) {
+        // New files arrive through eros.catalog.delta; just redraw the
+        // grid so re-saved maps pick up their new URLs.
+        this.requestUpdate();
+        return;
+      }
       try {
         // map saved may include basename/type; force full refresh.
         // Filesystem visibility can lag; do an immediate refresh and a
@@ -875,9 +899,29 @@ export class ErosLitBrowser extends LitElement {
         }, 350);
       } catch (e) {}
     };
+    this._onCatalogDelta = async (ev) => {
+      const d = ev?.detail;
+      if (!d) return;
+      const cat = this.cache.catalog;
+      const mine = this.cache.isSameCachePath(d.path);
+      try {
+        if (mine && !d.resync && cat && cat.version === d.base_version) {
+          this.cache.applyCatalog(d);
+        } else if (mine || d.resync) {
+          // Missed a message (or the DB was replaced): catch up in one request.
+          await this.cache.syncCatalog();
+        } else {
+          return;
+        }
+        this.files = this._filesFromCatalog();
+        this.requestUpdate();
+      } catch (e) {}
+    };
     try {
+      window.addEventListener("eros.catalog.delta", this._onCatalogDelta);
       window.addEventListener("eros.tags.updated", this._onTagsUpdated);
       window.addEventListener("eros.image.deleted", this._onImageDeleted);
+      window.addEventListener("eros.images.deleted", this._onImageDeleted);
       window.addEventListener("eros.map.saved", this._onMapSaved);
       window.addEventListener("eros.image.saved", this._onMapSaved);
       window.addEventListener("eros.cache.imported", this._onCacheChanged);
@@ -899,8 +943,10 @@ export class ErosLitBrowser extends LitElement {
       this._removeContainerFix();
     } catch (e) {}
     try {
+      window.removeEventListener("eros.catalog.delta", this._onCatalogDelta);
       window.removeEventListener("eros.tags.updated", this._onTagsUpdated);
       window.removeEventListener("eros.image.deleted", this._onImageDeleted);
+      window.removeEventListener("eros.images.deleted", this._onImageDeleted);
       window.removeEventListener("eros.map.saved", this._onMapSaved);
       window.removeEventListener("eros.image.saved", this._onMapSaved);
       window.removeEventListener("eros.cache.imported", this._onCacheChanged);
@@ -1001,6 +1047,27 @@ export class ErosLitBrowser extends LitElement {
     this.isOpen = false;
   }
 
+  // Helper: add/remove a file in the node's `filenames` (batch) widget
+  _toggleBatchFile(filename) {
+    if (!this.activeNode) return;
+    const w = this.activeNode.widgets?.find((w) => w.name === "filenames");
+    if (!w) return;
+    const name =
+      filename && filename.includes("/")
+        ? filename
+        : `${this.currentTab}/${filename}`;
+    const names = String(w.value || "")
+      .split("\n")
+      .map((n) => n.trim())
+      .filter(Boolean);
+    const at = names.indexOf(name);
+    if (at >= 0) names.splice(at, 1);
+    else names.push(name);
+    w.value = names.join("\n");
+    w.callback?.(w.value);
+    app.graph.setDirtyCanvas(true);
+  }
+
   // Helper: Update the actual node widget/preview
   _updateNode(filename, imgPath) {
     if (!this.activeNode) return;
@@ -1056,32 +1123,54 @@ export class ErosLitBrowser extends LitElement {
     ];
 
     let combined = [];
+    let synced = false;
     try {
-      // When forceAll is true we refresh all tabs into `_filesByTab`.
-      if (forceAll) {
-        for (const t of MAP_TYPES) {
+      // One request (a delta after the first load) refreshes every tab.
+      await this.cache.syncCatalog();
+      combined = this._filesFromCatalog(MAP_TYPES);
+      synced = true;
+    } catch (e) {
+      console.warn("[CacheMapBrowser] Catalog sync failed, listing folders:", e);
+    }
+    if (!synced) {
+      try {
+        // When forceAll is true we refresh all tabs into `_filesByTab`.
+        if (forceAll) {
+          for (const t of MAP_TYPES) {
+            try {
+              const parts = await this.cache.fetchFiles(t);
+              this._filesByTab.set(t, parts || []);
+            } catch (e) {
+              this._filesByTab.set(t, []);
+            }
+          }
+
+          // Always keep the visible grid scoped to the currently selected tab.
+          // This preserves the user's "type" + tag filter expectations.
+          const tab = this.currentTab || "original";
+          const parts = this._filesByTab.get(tab) || [];
+          combined = parts.map((p) => `${tab}/${p}`);
+        } else {
+          // Normal refresh: only load current tab. Rows are streamed so large
+          // folders start rendering before the server finishes scanning.
+          const tab = this.currentTab || "original";
+          let f;
           try {
-            const parts = await this.cache.fetchFiles(t);
-            this._filesByTab.set(t, parts || []);
+            const streamed = [];
+            const entries = await this.cache.streamFiles(tab, (batch) => {
+              for (const e of batch) streamed.push(`${tab}/${e.name}`);
+              if (this.currentTab === tab) this.files = [...streamed];
+            });
+            f = entries.map((e) => e.name).sort();
           } catch (e) {
-            this._filesByTab.set(t, []);
+            f = await this.cache.fetchFiles(tab);
           }
+          this._filesByTab.set(tab, f || []);
+          combined = (f || []).map((p) => `${tab}/${p}`);
         }
-
-        // Always keep the visible grid scoped to the currently selected tab.
-        // This preserves the user's "type" + tag filter expectations.
-        const tab = this.currentTab || "original";
-        const parts = this._filesByTab.get(tab) || [];
-        combined = parts.map((p) => `${tab}/${p}`);
-      } else {
-        // Normal refresh: only load current tab.
-        const tab = this.currentTab || "original";
-        const f = await this.cache.fetchFiles(tab);
-        this._filesByTab.set(tab, f || []);
-        combined = (f || []).map((p) => `${tab}/${p}`);
+      } catch (e) {
+        combined = [];
       }
-    } catch (e) {
-      combined = [];
     }
 
     this.files = combined;
@@ -1107,6 +1196,17 @@ export class ErosLitBrowser extends LitElement {
     });
   }
 
+  /** Refill `_filesByTab` from the catalog copy; returns the current tab's files. */
+  _filesFromCatalog(types = []) {
+    const catalog = this.cache.catalog;
+    if (!catalog) return this.files;
+    for (const t of new Set([...types, ...this._filesByTab.keys(), ...catalog.types])) {
+      this._filesByTab.set(t, this.cache.catalogFiles(t));
+    }
+    const tab = this.currentTab || "original";
+    return (this._filesByTab.get(tab) || []).map((p) => `${tab}/${p}`);
+  }
+
   firstUpdated() {
     // Resize handled by ComfyUI sidebar now — no-op.
   }
@@ -1264,7 +1364,9 @@ export class ErosLitBrowser extends LitElement {
                 } catch (e) {}
               }}
             >
-              Import
+              ${this._busyImport && this._importProgress
+                ? `Import ${this._importProgress}`
+                : "Import"}
             </button>
 
             <button
@@ -1369,7 +1471,16 @@ export class ErosLitBrowser extends LitElement {
                     detail: "Importing zip...",
                     life: 2500,
                   });
-                  const res = await this.cache.importZip(file);
+                  const res = await this.cache.importZip(file, {
+                    onProgress: (p) => {
+                      this._importProgress = p.bytes_total
+                        ? `${Math.min(
+                            100,
+                            Math.round((100 * p.bytes_received) / p.bytes_total)
+                          )}%`
+                        : `${p.files_done || 0}`;
+                    },
+                  });
 
                   this.selectedFilename = null;
                   this.activeFilters = new Set();
@@ -1381,7 +1492,14 @@ export class ErosLitBrowser extends LitElement {
                   toast({
                     severity: "success",
                     summary: "Import",
-                    detail: `Imported ${res.imported_files || 0} files`,
+                    detail:
+                      `Imported ${res.imported_files || 0} files` +
+                      (res.identical_files
+                        ? `, ${res.identical_files} already present`
+                        : "") +
+                      ((res.conflicts || []).length
+                        ? `, ${res.conflicts.length} kept local (different content)`
+                        : ""),
                     life: 3500,
                   });
                 } catch (err) {
@@ -1393,6 +1511,7 @@ export class ErosLitBrowser extends LitElement {
                   });
                 } finally {
                   this._busyImport = false;
+                  this._importProgress = "";
                   this.requestUpdate();
                 }
               }}
@@ -1419,7 +1538,10 @@ export class ErosLitBrowser extends LitElement {
               .config=${this.settings}
               @setting-change=${this._handleSetting}
               @tab-changed=${this._handleTab}
-              @refresh-requested=${() => this.fetchFiles(false)}
+              @refresh-requested=${async () => {
+                await this.cache.reindex();
+                this.fetchFiles(false);
+              }}
             ></eros-lit-controls>
 
             <eros-lit-grid
@@ -1429,6 +1551,8 @@ export class ErosLitBrowser extends LitElement {
               .currentTab=${this.currentTab}
               .config=${this.settings}
               .selectedFilename=${this.selectedFilename}
+              .revisions=${new Map(this._mapRevisions)}
+              .cacheEpoch=${this._cacheEpoch}
               @favorite-toggle=${(e) => {
                 const base = e?.detail?.basename;
                 if (!base) return;
@@ -1455,7 +1579,8 @@ export class ErosLitBrowser extends LitElement {
                 // Filename may be prefixed with subfolder (type/file.png)
                 const fn = e.detail.filename;
                 this.selectedFilename = fn;
-                this._updateNode(fn, e.detail.imgPath);
+                if (e.detail.additive) this._toggleBatchFile(fn);
+                else this._updateNode(fn, e.detail.imgPath);
               }}
             ></eros-lit-grid>
           </div>
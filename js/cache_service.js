@@ -65,6 +65,241 @@ export class CacheService {
     }
   }
 
+  /**
+   * One page of a folder listing with size/mtime/dimensions.
+   * opts: { sort: "name"|"mtime"|"size", order, limit, cursor }
+   * Resolves to { files, entries, next_cursor, total }.
+   */
+  async fetchFilesPage(subfolder, opts = {}) {
+    const params = new URLSearchParams({
+      path: this.cachePath || "",
+      subfolder: subfolder || "",
+      v: "2",
+    });
+    for (const key of ["sort", "order", "limit", "cursor"]) {
+      if (opts[key] !== undefined && opts[key] !== null && opts[key] !== "")
+        params.set(key, String(opts[key]));
+    }
+    try {
+      const resp = await api.fetchApi(`/eros/cache/fetch_files?${params}`);
+      const data = await resp.json();
+      if (!resp.ok) throw new Error(data.error || `Listing failed (${resp.status})`);
+      return data;
+    } catch (e) {
+      console.error("API Error:", e);
+      return { files: [], entries: [], next_cursor: null, total: 0, error: String(e) };
+    }
+  }
+
+  /**
+   * Streamed folder listing (NDJSON). `onEntries(batch)` is called as rows
+   * arrive, so large folders render before the scan completes.
+   * opts: { sort: "none"|"name"|"mtime"|"size", order, limit }
+   * Resolves to the full list of entries.
+   */
+  async streamFiles(subfolder, onEntries, opts = {}) {
+    const params = new URLSearchParams({
+      path: this.cachePath || "",
+      subfolder: subfolder || "",
+      format: "ndjson",
+      sort: opts.sort || "none",
+    });
+    if (opts.order) params.set("order", opts.order);
+    if (opts.limit) params.set("limit", String(opts.limit));
+    const all = [];
+    const resp = await api.fetchApi(`/eros/cache/fetch_files?${params}`);
+    if (!resp.ok || !resp.body) throw new Error(`Listing failed (${resp.status})`);
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = "";
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split("\n");
+      buffered = lines.pop();
+      const batch = [];
+      for (const line of lines) {
+        if (!line) continue;
+        const row = JSON.parse(line);
+        if (!row.done) batch.push(row);
+      }
+      if (batch.length) {
+        all.push(...batch);
+        if (onEntries) onEntries(batch);
+      }
+    }
+    return all;
+  }
+
+  /**
+   * Server-side filtered listing.
+   * opts: { q, type, name, sort, order, limit, cursor, total }
+   * Resolves to { items: [...], next_cursor, total }.
+   */
+  async queryFiles(opts = {}) {
+    const params = new URLSearchParams({ path: this.cachePath || "" });
+    for (const key of ["q", "type", "name", "sort", "order", "limit", "cursor"]) {
+      if (opts[key] !== undefined && opts[key] !== null && opts[key] !== "")
+        params.set(key, String(opts[key]));
+    }
+    if (opts.total) params.set("total", "1");
+    try {
+      const resp = await api.fetchApi(`/eros/cache/query?${params}`);
+      const data = await resp.json();
+      if (!resp.ok) throw new Error(data.error || `Query failed (${resp.status})`);
+      for (const item of data.items || []) {
+        this.imageTags.set(item.basename, new Set(item.tags || []));
+      }
+      return data;
+    } catch (e) {
+      console.error("API Error:", e);
+      return { items: [], next_cursor: null, total: null, error: String(e) };
+    }
+  }
+
+  /**
+   * One grid page as a contact sheet: { image (URL), width, height, tile,
+   * columns, tiles: [query item + x, y, w, h | missing], next_cursor }.
+   * Takes the queryFiles options plus tile, columns and format.
+   */
+  async fetchAtlas(opts = {}) {
+    const params = new URLSearchParams({ path: this.cachePath || "" });
+    for (const key of [
+      "q",
+      "type",
+      "name",
+      "sort",
+      "order",
+      "limit",
+      "cursor",
+      "tile",
+      "columns",
+      "format",
+    ]) {
+      if (opts[key] !== undefined && opts[key] !== null && opts[key] !== "")
+        params.set(key, String(opts[key]));
+    }
+    const resp = await api.fetchApi(`/eros/cache/atlas?${params}`);
+    const data = await resp.json().catch(() => ({}));
+    if (!resp.ok) throw new Error(data.error || `Atlas failed (${resp.status})`);
+    data.image = api.apiURL(data.image);
+    return data;
+  }
+
+  /**
+   * Ranked full-text search over basenames, tags and prompts.
+   * Resolves to { items: [{ basename, tags, prompt_snippet, score, map_types }], next_offset }.
+   */
+  async search(text, opts = {}) {
+    const params = new URLSearchParams({
+      path: this.cachePath || "",
+      q: text || "",
+    });
+    if (opts.type) params.set("type", opts.type);
+    if (opts.limit) params.set("limit", String(opts.limit));
+    if (opts.offset) params.set("offset", String(opts.offset));
+    try {
+      const resp = await api.fetchApi(`/eros/search?${params}`);
+      const data = await resp.json();
+      if (!resp.ok) throw new Error(data.error || `Search failed (${resp.status})`);
+      return data;
+    } catch (e) {
+      console.error("API Error:", e);
+      return { items: [], next_offset: null, error: String(e) };
+    }
+  }
+
+  /**
+   * Bring the local catalog copy up to date with a single request: a full
+   * snapshot the first time (or after a reset), `since=<version>` deltas
+   * afterwards. Also refreshes imageTags and allTags.
+   */
+  async syncCatalog() {
+    const path = this.cachePath || "";
+    const params = new URLSearchParams({ path });
+    if (this.catalog && this.catalog.path === path) {
+      params.set("since", String(this.catalog.version));
+      params.set("catalog_id", this.catalog.catalogId || "");
+    }
+    const resp = await api.fetchApi(`/eros/cache/catalog?${params}`);
+    const data = await resp.json();
+    if (!resp.ok) throw new Error(data.error || `Catalog failed (${resp.status})`);
+    this.applyCatalog(data);
+    return this.catalog;
+  }
+
+  /** Apply a catalog snapshot (`full: true`) or delta in place. */
+  applyCatalog(data) {
+    const fields = data.file_fields || ["name", "bytes", "mtime", "width", "height"];
+    if (data.full || !this.catalog) {
+      this.catalog = {
+        path: this.cachePath || "",
+        catalogId: data.catalog_id,
+        version: 0,
+        types: new Set(),
+        files: new Map(), // type -> Map(name -> entry)
+      };
+      this.imageTags.clear();
+    }
+    const cat = this.catalog;
+    cat.catalogId = data.catalog_id;
+    cat.version = data.version;
+    for (const t of data.types || []) cat.types.add(t);
+
+    for (const [type, rows] of Object.entries(data.files || {})) {
+      cat.types.add(type);
+      if (!cat.files.has(type)) cat.files.set(type, new Map());
+      const byName = cat.files.get(type);
+      for (const row of rows) {
+        const entry = {};
+        fields.forEach((f, i) => (entry[f] = row[i]));
+        byName.set(entry.name, entry);
+        const base = this.getBasename(entry.name);
+        if (!this.imageTags.has(base)) this.imageTags.set(base, new Set());
+      }
+    }
+    for (const [type, names] of Object.entries(data.removed || {})) {
+      const byName = cat.files.get(type);
+      if (byName) names.forEach((n) => byName.delete(n));
+    }
+    for (const [base, tags] of Object.entries(data.image_tags || {})) {
+      this.imageTags.set(base, new Set(tags));
+    }
+    if (data.tags) {
+      this.allTags.clear();
+      data.tags.forEach((t) => this.allTags.set(t.name, t.count));
+      this.notify("tags-loaded", this.allTags);
+    }
+  }
+
+  /** True if `path` (as sent in eros.catalog.delta) names our cache root. */
+  isSameCachePath(path) {
+    const norm = (p) => {
+      const n = (p || "").replace(/\\/g, "/").replace(/\/+$/, "");
+      return n === "maps" ? "" : n;
+    };
+    return norm(path) === norm(this.cachePath);
+  }
+
+  /** Sorted filenames of one map type from the local catalog copy. */
+  catalogFiles(type) {
+    const byName = this.catalog && this.catalog.files.get(type);
+    return byName ? Array.from(byName.keys()).sort() : [];
+  }
+
+  /** Re-scan the cache folder on the server (picks up files copied in by hand). */
+  async reindex() {
+    try {
+      await api.fetchApi("/eros/cache/reindex", {
+        method: "POST",
+        body: JSON.stringify({ path: this.cachePath || "" }),
+      });
+    } catch (e) {
+      console.error("Reindex Failed:", e);
+    }
+  }
+
   async loadImageTags(basename) {
     if (!basename) return new Set();
     try {
@@ -167,11 +402,66 @@ export class CacheService {
     }
   }
 
-  async exportZip() {
-    const url = `/eros/cache/export_zip?path=${encodeURIComponent(
-      this.cachePath || ""
-    )}`;
-    const resp = await api.fetchApi(url);
+  /**
+   * Delete the maps of many images in one request.
+   * opts: { types: string[] (only these map types), removeTags: bool }
+   */
+  async bulkDelete(basenames, opts = {}) {
+    const body = { path: this.cachePath || "", basenames: basenames || [] };
+    if (opts.types && opts.types.length) body.types = opts.types;
+    if (opts.removeTags !== undefined) body.remove_tags = !!opts.removeTags;
+    try {
+      const resp = await api.fetchApi("/eros/cache/bulk_delete", {
+        method: "POST",
+        body: JSON.stringify(body),
+      });
+      const data = await resp.json();
+      if (data && data.success) {
+        const untagged = body.remove_tags ?? !body.types;
+        for (const item of data.items || []) {
+          if (untagged) this.imageTags.delete(item.basename);
+          this.notify("map-deleted", item);
+        }
+      }
+      return data;
+    } catch (e) {
+      console.error("Bulk Delete Failed:", e);
+      return { success: false, error: String(e) };
+    }
+  }
+
+  /**
+   * Download an export zip.
+   * opts: { types: string[], tags: string, favorites: bool,
+   *         modifiedSince: unix seconds | ISO date,
+   *         dbFormat: "sqlite" (default) | "sql" for older installs,
+   *         manifest: manifest.json of a previous export (differential) }
+   */
+  async exportZip(opts = {}) {
+    const filters = {
+      path: this.cachePath || "",
+      types: (opts.types || []).join(","),
+      tags: opts.tags || "",
+      favorites: opts.favorites ? "1" : "",
+      modified_since:
+        opts.modifiedSince === undefined || opts.modifiedSince === null
+          ? ""
+          : String(opts.modifiedSince),
+      db_format: opts.dbFormat || "",
+    };
+    let resp;
+    if (opts.manifest) {
+      resp = await api.fetchApi("/eros/cache/export_zip", {
+        method: "POST",
+        body: JSON.stringify({ ...filters, manifest: opts.manifest }),
+      });
+    } else {
+      const params = new URLSearchParams();
+      for (const [key, value] of Object.entries(filters)) {
+        if (value || key === "path") params.set(key, value);
+      }
+      resp = await api.fetchApi(`/eros/cache/export_zip?${params}`);
+    }
     if (!resp.ok) {
       let msg = `Export failed (${resp.status})`;
       try {
@@ -183,17 +473,41 @@ export class CacheService {
     return await resp.blob();
   }
 
-  async importZip(file) {
+  /**
+   * Upload an export zip.
+   * opts: { onConflict: "report" | "rename" | "overwrite",
+   *         onProgress: (eros.cache.import_progress payload) => void }
+   */
+  async importZip(file, opts = {}) {
     if (!file) throw new Error("Missing file");
-    const url = `/eros/cache/import_zip?path=${encodeURIComponent(
-      this.cachePath || ""
-    )}`;
+    const importId = `${Date.now().toString(36)}-${Math.random()
+      .toString(36)
+      .slice(2, 8)}`;
+    const params = new URLSearchParams({
+      path: this.cachePath || "",
+      import_id: importId,
+    });
+    if (opts.onConflict) params.set("on_conflict", opts.onConflict);
+    const url = `/eros/cache/import_zip?${params}`;
     const fd = new FormData();
     fd.append("file", file, file.name || "import.zip");
-    const resp = await api.fetchApi(url, {
-      method: "POST",
-      body: fd,
-    });
+
+    const onProgress = (ev) => {
+      const detail = ev?.detail;
+      if (detail && detail.import_id === importId) opts.onProgress(detail);
+    };
+    if (opts.onProgress) {
+      window.addEventListener("eros.cache.import_progress", onProgress);
+    }
+    let resp;
+    try {
+      resp = await api.fetchApi(url, {
+        method: "POST",
+        body: fd,
+      });
+    } finally {
+      window.removeEventListener("eros.cache.import_progress", onProgress);
+    }
     const data = await resp.json().catch(() => ({}));
     if (!resp.ok || !data || data.success === false) {
       throw new Error((data && data.error) || `Import failed (${resp.status})`);
@@ -217,4 +531,48 @@ export class CacheService {
     }
     return data;
   }
+
+  /**
+   * Queue a background job (export | reset | reindex); progress arrives as
+   * "eros.job" events. Returns the job record.
+   */
+  async submitJob(kind, params = {}) {
+    const resp = await api.fetchApi("/eros/jobs", {
+      method: "POST",
+      body: JSON.stringify({
+        kind,
+        params: { path: this.cachePath || "", ...params },
+      }),
+    });
+    const data = await resp.json().catch(() => ({}));
+    if (!resp.ok || !data.job) {
+      throw new Error(data.error || `Job submission failed (${resp.status})`);
+    }
+    return data.job;
+  }
+
+  async listJobs(opts = {}) {
+    const params = new URLSearchParams();
+    if (opts.kind) params.set("kind", opts.kind);
+    if (opts.state) params.set("state", opts.state);
+    if (opts.limit) params.set("limit", String(opts.limit));
+    const resp = await api.fetchApi(`/eros/jobs?${params}`);
+    const data = await resp.json().catch(() => ({}));
+    return data.jobs || [];
+  }
+
+  async cancelJob(jobId) {
+    const resp = await api.fetchApi(
+      `/eros/jobs/${encodeURIComponent(jobId)}/cancel`,
+      { method: "POST" }
+    );
+    const data = await resp.json().catch(() => ({}));
+    if (!resp.ok) throw new Error(data.error || `Cancel failed (${resp.status})`);
+    return data.job;
+  }
+
+  /** URL of a finished job's result (the zip of an export job). */
+  jobResultUrl(jobId) {
+    return api.apiURL(`/eros/jobs/${encodeURIComponent(jobId)}/result`);
+  }
 }
@@ -2,17 +2,359 @@ import sqlite3
 import os
 import time
 import shutil
+import re
+import json
+import base64
+import queue
+import threading
+import uuid
+import weakref
+import hashlib
+from concurrent.futures import Future
+
+
+class TagQueryError(ValueError):
+    """Raised when a tag expression cannot be parsed."""
+
+
+_TAG_QUERY_TOKEN = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+_TAG_QUERY_OPERATORS = {"AND", "OR", "NOT"}
+
+
+def _tokenize_tag_query(text):
+    tokens = []
+    pos = 0
+    text = text or ""
+    while pos < len(text):
+        if text[pos:].strip() == "":
+            break
+        m = _TAG_QUERY_TOKEN.match(text, pos)
+        if not m or m.end() == pos:
+            raise TagQueryError(f"Unexpected character at position {pos}")
+        pos = m.end()
+        if m.group(1):
+            tokens.append(("(", None))
+        elif m.group(2):
+            tokens.append((")", None))
+        elif m.group(3) is not None:
+            tokens.append(("TERM", re.sub(r"\\(.)", r"\1", m.group(3))))
+        elif m.group(4).upper() in _TAG_QUERY_OPERATORS:
+            tokens.append((m.group(4).upper(), None))
+        else:
+            tokens.append(("TERM", m.group(4)))
+    return tokens
+
+
+def parse_tag_query(text):
+    """Parse a boolean tag expression into a nested tuple tree.
+
+    Grammar: ``expr := and (OR and)*``, ``and := unary ([AND] unary)*``,
+    ``unary := NOT unary | '(' expr ')' | tag``. Adjacent terms are ANDed and
+    tags containing spaces or parentheses can be double-quoted.
+    Returns None for an empty expression.
+    """
+    tokens = _tokenize_tag_query(text)
+    if not tokens:
+        return None
+    pos = 0
+
+    def peek():
+        return tokens[pos][0] if pos < len(tokens) else None
+
+    def take(kind):
+        nonlocal pos
+        if peek() != kind:
+            found = peek() or "end of expression"
+            raise TagQueryError(f"Expected {kind} but found {found}")
+        value = tokens[pos][1]
+        pos += 1
+        return value
+
+    def parse_or():
+        node = parse_and()
+        while peek() == "OR":
+            take("OR")
+            node = ("or", node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_unary()
+        while peek() in ("AND", "NOT", "(", "TERM"):
+            if peek() == "AND":
+                take("AND")
+            node = ("and", node, parse_unary())
+        return node
+
+    def parse_unary():
+        kind = peek()
+        if kind == "NOT":
+            take("NOT")
+            return ("not", parse_unary())
+        if kind == "(":
+            take("(")
+            node = parse_or()
+            take(")")
+            return node
+        return ("tag", take("TERM"))
+
+    tree = parse_or()
+    if pos != len(tokens):
+        raise TagQueryError(f"Unexpected {tokens[pos][0]} at token {pos + 1}")
+    return tree
+
+
+_NAME_TERM_SPLIT = re.compile(r"[_\-\s.]+|(?<=\d)(?=\D)|(?<=\D)(?=\d)")
+
+
+def basename_search_terms(basename):
+    """Split a basename into search tokens on `_`, `-` and letter/digit boundaries.
+
+    ``"portrait_v2-final03"`` -> ``"portrait v 2 final 03"``
+    """
+    return " ".join(t for t in _NAME_TERM_SPLIT.split(basename or "") if t)
+
+
+def fts_match_query(text):
+    """Turn free text into a prefix-aware FTS5 MATCH expression (words ANDed).
+
+    Words are split like stored basenames (see basename_search_terms), so a
+    file stem such as ``portrait_v2`` finds itself; the unsplit word is
+    kept as an alternative for tags and prompts (``"v2"*`` there).
+    """
+    parts = []
+    for word in re.findall(r"\w+", text or "", flags=re.UNICODE):
+        terms = basename_search_terms(word).split()
+        if not terms:
+            continue
+        split = " AND ".join(f'"{t}"*' for t in terms)
+        if terms == [word]:
+            parts.append(split)
+        else:
+            parts.append(f'("{word}"* OR ({split}))')
+    return " AND ".join(parts)
+
+
+def encode_query_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def decode_query_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        if isinstance(values, list) and len(values) == 2:
+            return values
+    except Exception:
+        pass
+    raise TagQueryError("Invalid cursor")
+
+
+class _DbWriter(threading.Thread):
+    """Owns the only write connection and applies queued operations in order.
+
+    Operations that arrive within `window` seconds of each other share one
+    transaction (group commit). Each runs inside its own SAVEPOINT so a
+    failing operation is rolled back without affecting its neighbours; its
+    Future receives the exception instead. Futures resolve after COMMIT.
+    """
+
+    def __init__(self, db_path, window=0.004, max_batch=256, on_commit=None):
+        super().__init__(name="eros-db-writer", daemon=True)
+        self.db_path = db_path
+        self.window = window
+        self.max_batch = max_batch
+        self.on_commit = on_commit
+        self._queue = queue.Queue()
+
+    def submit(self, fn):
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def stop(self):
+        """Drain pending operations, then close the connection."""
+        self._queue.put(None)
+        self.join()
+
+    def run(self):
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA foreign_keys=ON")
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + self.window
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._run_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _run_batch(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT op")
+                try:
+                    outcomes.append((future, fn(conn), None))
+                    conn.execute("RELEASE op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    outcomes.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            try:
+                conn.execute("ROLLBACK")
+            except Exception:
+                pass
+            print(f"[MetadataManager] Group commit of {len(batch)} operation(s) failed: {e}")
+            for fn, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+        if self.on_commit is not None and any(error is None for _, _, error in outcomes):
+            try:
+                self.on_commit()
+            except Exception as e:
+                print(f"[MetadataManager] Commit listener failed: {e}")
+
 
 class MetadataManager:
-    """Manages image metadata with schema versioning, favorites, and tags."""
+    """Manages image metadata with schema versioning, favorites, and tags.
+
+    All writes go through a single writer thread (see `_DbWriter`); reads use
+    per-thread read-only connections, so the manager is safe to share between
+    ComfyUI's execution thread and the aiohttp handlers.
+    """
     
-    CURRENT_VERSION = 2
+    CURRENT_VERSION = 9
+    # Time spent in calls run through eros_io.run_io is reported under this phase
+    METRICS_PHASE = "sqlite"
+    CHANGE_LOG_KEEP = 50000
     FAVORITE_TAG = "favorite"
     
     def __init__(self, db_path):
         self.db_path = db_path
+        self._lock = threading.Lock()
+        self._writer = None
+        self._readers = []  # (weakref to the owning thread, connection)
+        self._local = threading.local()
+        self._available = threading.Event()
+        self._commit_listeners = []
         self._ensure_db_dir()
         self._init_or_migrate()
+        self._available.set()
+
+    # ===== Connections =====
+
+    def _submit(self, fn):
+        """Queue `fn(conn)` on the writer thread. Returns a Future."""
+        if not self._available.wait(timeout=60):
+            raise RuntimeError("metadata database is closed")
+        with self._lock:
+            if self._writer is None:
+                self._writer = _DbWriter(self.db_path, on_commit=self.notify_committed)
+                self._writer.start()
+            return self._writer.submit(fn)
+
+    def _write(self, fn):
+        """Run `fn(conn)` on the writer thread and wait until it is committed."""
+        return self._submit(fn).result()
+
+    def add_commit_listener(self, fn):
+        """Call `fn()` after each group commit (on the writer thread; keep it cheap)."""
+        self._commit_listeners.append(fn)
+
+    def notify_committed(self):
+        """Tell listeners that data changed (also used after plain-SQL merges)."""
+        for fn in list(self._commit_listeners):
+            try:
+                fn()
+            except Exception as e:
+                print(f"[MetadataManager] Commit listener failed: {e}")
+
+    def _read_conn(self):
+        """Per-thread read-only connection (WAL lets it read while the writer commits).
+
+        Connections of threads that have ended are closed whenever a new one
+        is opened, so short-lived threads do not accumulate file handles.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if not self._available.wait(timeout=60):
+                raise RuntimeError("metadata database is closed")
+            conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
+            conn.execute("PRAGMA query_only=ON")
+            with self._lock:
+                ended = [(t, c) for t, c in self._readers if not self._thread_alive(t)]
+                self._readers = [(t, c) for t, c in self._readers if self._thread_alive(t)]
+                self._readers.append((weakref.ref(threading.current_thread()), conn))
+            for _, old in ended:
+                try:
+                    old.close()
+                except Exception:
+                    pass
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _thread_alive(ref):
+        thread = ref()
+        return thread is not None and thread.is_alive()
+
+    def close(self):
+        """Flush queued writes and close every connection.
+
+        Until `reopen()` is called, new writes block (briefly) instead of
+        recreating the database file behind the caller's back.
+        """
+        self._available.clear()
+        with self._lock:
+            writer, self._writer = self._writer, None
+            readers, self._readers = self._readers, []
+            self._local = threading.local()
+        if writer is not None:
+            writer.stop()
+        for _, conn in readers:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def refresh(self):
+        """Re-run migrations and backfills after rows were merged in by plain SQL."""
+        self._write(lambda conn: None)  # flush queued writes first
+        self._init_or_migrate()
+
+    def reopen(self):
+        """Re-run schema setup (e.g. after the DB file was deleted or merged into)."""
+        self.close()
+        try:
+            self._ensure_db_dir()
+            self._init_or_migrate()
+        finally:
+            self._available.set()
     
     def _ensure_db_dir(self):
         db_dir = os.path.dirname(self.db_path)
@@ -60,13 +402,19 @@ class MetadataManager:
     
     def _init_or_migrate(self):
         """Initialize DB or run migrations."""
+        try:
+            # Readers never block the writer (and vice versa) in WAL mode.
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+        except Exception as e:
+            print(f"[MetadataManager] Could not enable WAL: {e}")
         current_version = self._get_version()
         
         if current_version == 0:
             # Fresh install
             print(f"[MetadataManager] Creating fresh database at {self.db_path}")
-            self._migrate_to_v1()
-            self._migrate_to_v2()
+            for v in range(1, self.CURRENT_VERSION + 1):
+                getattr(self, f'_migrate_to_v{v}')()
         elif current_version < self.CURRENT_VERSION:
             # Need migration
             print(f"[MetadataManager] Migrating from v{current_version} to v{self.CURRENT_VERSION}")
@@ -76,6 +424,33 @@ class MetadataManager:
                 getattr(self, f'_migrate_to_v{v}')()
         else:
             print(f"[MetadataManager] Database is up to date (v{current_version})")
+        self._backfill_name_terms()
+        self._trim_change_log()
+
+    def _trim_change_log(self):
+        """Keep the newest CHANGE_LOG_KEEP entries; older `since` values get a full snapshot."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    "DELETE FROM catalog_changes WHERE version <= (SELECT MAX(version) FROM catalog_changes) - ?",
+                    (self.CHANGE_LOG_KEEP,),
+                )
+                conn.commit()
+        except Exception as e:
+            print(f"[MetadataManager] Error trimming change log: {e}")
+
+    def _backfill_name_terms(self):
+        """Fill images.name_terms for rows inserted by plain SQL (migrations, imports)."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute("SELECT id, basename FROM images WHERE name_terms IS NULL").fetchall()
+                conn.executemany(
+                    "UPDATE images SET name_terms = ? WHERE id = ?",
+                    [(basename_search_terms(b), i) for i, b in rows],
+                )
+                conn.commit()
+        except Exception as e:
+            print(f"[MetadataManager] Error backfilling search terms: {e}")
 
     
     def _migrate_to_v1(self):
@@ -138,80 +513,804 @@ class MetadataManager:
         except Exception as e:
             print(f"[MetadataManager] Migration to v2 failed: {e}")
             raise
-    
-    # ===== Favorites API =====
 
-    def _is_favorite_tag(self, tag_name: str) -> bool:
+    def _migrate_to_v3(self):
+        """V2 -> V3: Add images catalog and key image_tags by integer image id."""
         try:
-            return (tag_name or "").strip().lower() == self.FAVORITE_TAG
-        except Exception:
-            return False
+            with sqlite3.connect(self.db_path) as conn:
+                # One row per basename (the key shared by every map type)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS images (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        basename TEXT UNIQUE NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                """)
 
-    def _set_favorite_row(self, image_path: str, should_be_favorite: bool) -> None:
-        """Ensure favorites table reflects should_be_favorite."""
-        if not image_path:
-            return
+                # One row per file on disk (root/map_type/filename)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS image_files (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        image_id INTEGER NOT NULL,
+                        root TEXT NOT NULL,
+                        map_type TEXT NOT NULL,
+                        filename TEXT NOT NULL,
+                        path TEXT UNIQUE NOT NULL,
+                        bytes INTEGER NOT NULL DEFAULT 0,
+                        mtime REAL NOT NULL DEFAULT 0,
+                        width INTEGER,
+                        height INTEGER,
+                        format TEXT,
+                        indexed_at REAL NOT NULL,
+                        FOREIGN KEY (image_id) REFERENCES images(id) ON DELETE CASCADE
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_image_files_image ON image_files(image_id)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_image_files_root_type ON image_files(root, map_type, filename)")
+
+                # Rebuild image_tags keyed by image id (V2 keyed it by basename TEXT)
+                cols = [r[1] for r in conn.execute("PRAGMA table_info(image_tags)").fetchall()]
+                if "image_path" in cols:
+                    conn.execute("""
+                        INSERT OR IGNORE INTO images (basename, created_at)
+                        SELECT image_path, MIN(added_at) FROM image_tags GROUP BY image_path
+                    """)
+                    conn.execute("ALTER TABLE image_tags RENAME TO image_tags_v2")
+                    conn.execute("DROP INDEX IF EXISTS idx_image_tags_path")
+                    conn.execute("DROP INDEX IF EXISTS idx_image_tags_tag")
+
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS image_tags (
+                        image_id INTEGER NOT NULL,
+                        tag_id INTEGER NOT NULL,
+                        added_at REAL NOT NULL,
+                        PRIMARY KEY (image_id, tag_id),
+                        FOREIGN KEY (image_id) REFERENCES images(id) ON DELETE CASCADE,
+                        FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
+                    )
+                """)
+
+                if "image_path" in cols:
+                    conn.execute("""
+                        INSERT OR IGNORE INTO image_tags (image_id, tag_id, added_at)
+                        SELECT i.id, old.tag_id, old.added_at
+                        FROM image_tags_v2 old
+                        JOIN images i ON i.basename = old.image_path
+                    """)
+                    conn.execute("DROP TABLE image_tags_v2")
+
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_image_tags_tag ON image_tags(tag_id, image_id)")
+
+                conn.commit()
+                self._set_version(3)
+                print("[MetadataManager] Migrated to v3")
+        except Exception as e:
+            print(f"[MetadataManager] Migration to v3 failed: {e}")
+            raise
+
+    def _migrate_to_v4(self):
+        """V3 -> V4: Add indexes backing sorted/keyset-paginated catalog queries."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_image_files_root_mtime ON image_files(root, map_type, mtime, id)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_image_files_root_bytes ON image_files(root, map_type, bytes, id)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_images_created ON images(created_at)")
+                conn.commit()
+                self._set_version(4)
+                print("[MetadataManager] Migrated to v4")
+        except Exception as e:
+            print(f"[MetadataManager] Migration to v4 failed: {e}")
+            raise
+
+    def _migrate_to_v5(self):
+        """V4 -> V5: Add FTS5 search over basenames, tags and prompts."""
         try:
             with sqlite3.connect(self.db_path) as conn:
-                cur = conn.cursor()
-                if should_be_favorite:
-                    cur.execute(
-                        "INSERT OR IGNORE INTO favorites (path, added_at) VALUES (?, ?)",
-                        (image_path, time.time()),
+                cols = [r[1] for r in conn.execute("PRAGMA table_info(images)").fetchall()]
+                if "name_terms" not in cols:
+                    conn.execute("ALTER TABLE images ADD COLUMN name_terms TEXT")
+                if "prompt" not in cols:
+                    conn.execute("ALTER TABLE images ADD COLUMN prompt TEXT")
+
+                try:
+                    conn.execute("""
+                        CREATE VIRTUAL TABLE IF NOT EXISTS images_fts USING fts5(
+                            name, tags, prompt, prefix='2 3'
+                        )
+                    """)
+                except sqlite3.OperationalError as e:
+                    # SQLite built without FTS5: search is unavailable, the rest works.
+                    print(f"[MetadataManager] FTS5 unavailable, search disabled: {e}")
+                    conn.commit()
+                    self._set_version(5)
+                    return
+
+                # rowid of images_fts == images.id
+                conn.executescript("""
+                    CREATE TRIGGER IF NOT EXISTS images_fts_ai AFTER INSERT ON images BEGIN
+                        INSERT INTO images_fts (rowid, name, tags, prompt)
+                        VALUES (new.id, COALESCE(new.name_terms, new.basename), '', COALESCE(new.prompt, ''));
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS images_fts_au AFTER UPDATE OF basename, name_terms, prompt ON images BEGIN
+                        UPDATE images_fts
+                        SET name = COALESCE(new.name_terms, new.basename), prompt = COALESCE(new.prompt, '')
+                        WHERE rowid = new.id;
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS images_fts_ad AFTER DELETE ON images BEGIN
+                        DELETE FROM images_fts WHERE rowid = old.id;
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS images_fts_tags_ai AFTER INSERT ON image_tags BEGIN
+                        UPDATE images_fts SET tags = (
+                            SELECT COALESCE(group_concat(t.name, char(10)), '') FROM image_tags it
+                            JOIN tags t ON t.id = it.tag_id WHERE it.image_id = new.image_id
+                        ) WHERE rowid = new.image_id;
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS images_fts_tags_ad AFTER DELETE ON image_tags BEGIN
+                        UPDATE images_fts SET tags = (
+                            SELECT COALESCE(group_concat(t.name, char(10)), '') FROM image_tags it
+                            JOIN tags t ON t.id = it.tag_id WHERE it.image_id = old.image_id
+                        ) WHERE rowid = old.image_id;
+                    END;
+                """)
+
+                conn.execute("DELETE FROM images_fts")
+                conn.execute("""
+                    INSERT INTO images_fts (rowid, name, tags, prompt)
+                    SELECT i.id, COALESCE(i.name_terms, i.basename),
+                           COALESCE((SELECT group_concat(t.name, char(10)) FROM image_tags it
+                                     JOIN tags t ON t.id = it.tag_id WHERE it.image_id = i.id), ''),
+                           COALESCE(i.prompt, '')
+                    FROM images i
+                """)
+                conn.commit()
+                self._set_version(5)
+                print("[MetadataManager] Migrated to v5")
+        except Exception as e:
+            print(f"[MetadataManager] Migration to v5 failed: {e}")
+            raise
+
+    def _migrate_to_v6(self):
+        """V5 -> V6: Catalog change log (written by triggers) and catalog id."""
+        now = "((julianday('now') - 2440587.5) * 86400.0)"
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS catalog_changes (
+                        version INTEGER PRIMARY KEY AUTOINCREMENT,
+                        kind TEXT NOT NULL,
+                        root TEXT,
+                        map_type TEXT,
+                        filename TEXT,
+                        basename TEXT,
+                        changed_at REAL NOT NULL
                     )
-                else:
-                    cur.execute("DELETE FROM favorites WHERE path = ?", (image_path,))
+                """)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS catalog_meta (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL
+                    )
+                """)
+                # Identifies this database; clients holding a version from a
+                # different (e.g. reset) database fall back to a full snapshot.
+                conn.execute(
+                    "INSERT OR IGNORE INTO catalog_meta (key, value) VALUES ('catalog_id', ?)",
+                    (uuid.uuid4().hex,),
+                )
+
+                # Every write path ends up in these tables, so logging from
+                # triggers covers process(), delete, import merges and scans.
+                file_log = (
+                    "INSERT INTO catalog_changes (kind, root, map_type, filename, changed_at) "
+                    f"VALUES ('file', {{r}}.root, {{r}}.map_type, {{r}}.filename, {now});"
+                )
+                image_log = (
+                    "INSERT INTO catalog_changes (kind, basename, changed_at) "
+                    f"VALUES ('image', (SELECT basename FROM images WHERE id = {{r}}.image_id), {now});"
+                )
+                favorite_log = (
+                    "INSERT INTO catalog_changes (kind, basename, changed_at) "
+                    f"VALUES ('image', {{r}}.path, {now});"
+                )
+                tags_log = f"INSERT INTO catalog_changes (kind, changed_at) VALUES ('tags', {now});"
+                triggers = [
+                    ("catalog_log_files_ai", "AFTER INSERT ON image_files", file_log.format(r="NEW")),
+                    ("catalog_log_files_au", "AFTER UPDATE ON image_files", file_log.format(r="NEW")),
+                    ("catalog_log_files_ad", "AFTER DELETE ON image_files", file_log.format(r="OLD")),
+                    ("catalog_log_image_tags_ai", "AFTER INSERT ON image_tags", image_log.format(r="NEW")),
+                    ("catalog_log_image_tags_ad", "AFTER DELETE ON image_tags", image_log.format(r="OLD")),
+                    ("catalog_log_favorites_ai", "AFTER INSERT ON favorites", favorite_log.format(r="NEW")),
+                    ("catalog_log_favorites_ad", "AFTER DELETE ON favorites", favorite_log.format(r="OLD")),
+                    ("catalog_log_tags_ai", "AFTER INSERT ON tags", tags_log),
+                    ("catalog_log_tags_au", "AFTER UPDATE ON tags", tags_log),
+                    ("catalog_log_tags_ad", "AFTER DELETE ON tags", tags_log),
+                ]
+                for name, event, body in triggers:
+                    conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+
                 conn.commit()
+                self._set_version(6)
+                print("[MetadataManager] Migrated to v6")
         except Exception as e:
-            print(f"[MetadataManager] Error setting favorite row: {e}")
+            print(f"[MetadataManager] Migration to v6 failed: {e}")
+            raise
 
-    def _set_favorite_tag_assoc(self, image_path: str, should_be_favorite: bool) -> None:
-        """Ensure image_tags contains (or removes) the canonical 'favorite' tag association."""
-        if not image_path:
-            return
+    def _migrate_to_v7(self):
+        """V6 -> V7: Persist background jobs (see jobs.JobManager)."""
         try:
-            tag_id = self.get_or_create_tag(self.FAVORITE_TAG)
-            if tag_id is None:
-                return
             with sqlite3.connect(self.db_path) as conn:
-                if should_be_favorite:
-                    conn.execute(
-                        """
-                        INSERT OR IGNORE INTO image_tags (image_path, tag_id, added_at)
-                        VALUES (?, ?, ?)
-                        """,
-                        (image_path, tag_id, time.time()),
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id TEXT PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        state TEXT NOT NULL,
+                        params TEXT,
+                        progress TEXT,
+                        result TEXT,
+                        error TEXT,
+                        created_at REAL NOT NULL,
+                        started_at REAL,
+                        finished_at REAL
                     )
-                else:
-                    conn.execute(
-                        "DELETE FROM image_tags WHERE image_path = ? AND tag_id = ?",
-                        (image_path, tag_id),
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at)")
+                conn.commit()
+                self._set_version(7)
+                print("[MetadataManager] Migrated to v7")
+        except Exception as e:
+            print(f"[MetadataManager] Migration to v7 failed: {e}")
+            raise
+
+    def _migrate_to_v8(self):
+        """V7 -> V8: Generation parameters of image files (see prompt_index)."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS generation_params (
+                        path TEXT PRIMARY KEY,
+                        bytes INTEGER NOT NULL,
+                        mtime_ns INTEGER NOT NULL,
+                        basename TEXT,
+                        positive TEXT,
+                        negative TEXT,
+                        width INTEGER,
+                        height INTEGER,
+                        seed INTEGER,
+                        sampler TEXT,
+                        model TEXT,
+                        params_hash TEXT,
+                        indexed_at REAL NOT NULL
                     )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_generation_params_hash ON generation_params(params_hash)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_generation_params_seed ON generation_params(seed)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_generation_params_model ON generation_params(model)")
                 conn.commit()
+                self._set_version(8)
+                print("[MetadataManager] Migrated to v8")
         except Exception as e:
-            print(f"[MetadataManager] Error setting favorite tag assoc: {e}")
-    
+            print(f"[MetadataManager] Migration to v8 failed: {e}")
+            raise
+
+    def _migrate_to_v9(self):
+        """V8 -> V9: Log tag removals of deleted images with their basename.
+
+        Deleting an image cascades to its image_tags rows after the image row
+        is gone, so the v6 trigger looked the basename up too late and logged
+        NULL. The image delete now logs OLD.basename itself, and the
+        image_tags trigger only logs while the image still exists.
+        """
+        now = "((julianday('now') - 2440587.5) * 86400.0)"
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("DROP TRIGGER IF EXISTS catalog_log_image_tags_ad")
+                conn.execute(f"""
+                    CREATE TRIGGER catalog_log_image_tags_ad AFTER DELETE ON image_tags BEGIN
+                        INSERT INTO catalog_changes (kind, basename, changed_at)
+                        SELECT 'image', basename, {now} FROM images WHERE id = OLD.image_id;
+                    END
+                """)
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS catalog_log_images_bd BEFORE DELETE ON images
+                    WHEN EXISTS (SELECT 1 FROM image_tags WHERE image_id = OLD.id) BEGIN
+                        INSERT INTO catalog_changes (kind, basename, changed_at)
+                        VALUES ('image', OLD.basename, {now});
+                    END
+                """)
+                conn.commit()
+                self._set_version(9)
+                print("[MetadataManager] Migrated to v9")
+        except Exception as e:
+            print(f"[MetadataManager] Migration to v9 failed: {e}")
+            raise
+
+    # ===== Jobs API =====
+
+    JOB_FIELDS = ("id", "kind", "state", "params", "progress", "result", "error",
+                  "created_at", "started_at", "finished_at")
+    _JOB_JSON_FIELDS = ("params", "progress", "result")
+
+    def save_job(self, job):
+        """Insert or replace one job record (a dict with JOB_FIELDS keys)."""
+        row = [
+            json.dumps(job.get(f)) if f in self._JOB_JSON_FIELDS else job.get(f)
+            for f in self.JOB_FIELDS
+        ]
+        marks = ",".join("?" * len(self.JOB_FIELDS))
+        try:
+            self._write(lambda conn: conn.execute(
+                f"INSERT OR REPLACE INTO jobs ({','.join(self.JOB_FIELDS)}) VALUES ({marks})", row
+            ))
+            return True
+        except Exception as e:
+            print(f"[MetadataManager] Error saving job: {e}")
+            return False
+
+    def load_jobs(self):
+        """All job records, oldest first."""
+        try:
+            rows = self._read_conn().execute(
+                f"SELECT {','.join(self.JOB_FIELDS)} FROM jobs ORDER BY created_at"
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"[MetadataManager] Error loading jobs: {e}")
+            return []
+        jobs = []
+        for row in rows:
+            job = dict(zip(self.JOB_FIELDS, row))
+            for f in self._JOB_JSON_FIELDS:
+                try:
+                    job[f] = json.loads(job[f]) if job[f] else None
+                except ValueError:
+                    job[f] = None
+            jobs.append(job)
+        return jobs
+
+    def delete_jobs(self, job_ids):
+        """Forget job records. Returns the number of removed rows."""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return 0
+        try:
+            return self._write(lambda conn: conn.executemany(
+                "DELETE FROM jobs WHERE id = ?", ((j,) for j in job_ids)
+            ).rowcount)
+        except Exception as e:
+            print(f"[MetadataManager] Error deleting jobs: {e}")
+            return 0
+
+    # ===== Generation Params API =====
+
+    GENERATION_FIELDS = ("positive", "negative", "width", "height", "seed", "sampler", "model")
+    _GENERATION_COLUMNS = ("path", "bytes", "mtime_ns", "basename") + GENERATION_FIELDS + ("params_hash", "indexed_at")
+
+    def get_generation_stamps(self):
+        """{path: (bytes, mtime_ns)} of every indexed file, to skip unchanged ones."""
+        try:
+            rows = self._read_conn().execute(
+                "SELECT path, bytes, mtime_ns FROM generation_params"
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"[MetadataManager] Error reading generation stamps: {e}")
+            return {}
+        return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+    def upsert_generation_params(self, records, wait=True):
+        """Store indexed files: dicts with path, bytes, mtime_ns and GENERATION_FIELDS.
+
+        Files without generation metadata are stored with empty fields, so
+        they are not read again until they change.
+        """
+        now = time.time()
+        rows = []
+        for r in records:
+            values = [r.get(f) for f in self.GENERATION_FIELDS]
+            has_params = any(v not in (None, "") for v in values)
+            params_hash = hashlib.sha1(json.dumps(values).encode("utf-8")).hexdigest() if has_params else None
+            basename = os.path.splitext(os.path.basename(r["path"]))[0]
+            rows.append([r["path"], r["bytes"], r["mtime_ns"], basename] + values + [params_hash, now])
+        if not rows:
+            return 0
+        marks = ",".join("?" * len(self._GENERATION_COLUMNS))
+        sql = f"INSERT OR REPLACE INTO generation_params ({','.join(self._GENERATION_COLUMNS)}) VALUES ({marks})"
+        future = self._submit(lambda conn: conn.executemany(sql, rows).rowcount)
+        return future.result() if wait else future
+
+    def remove_generation_params(self, paths):
+        """Forget indexed files (e.g. deleted ones). Returns the number of removed rows."""
+        paths = list(paths)
+        if not paths:
+            return 0
+        try:
+            return self._write(lambda conn: conn.executemany(
+                "DELETE FROM generation_params WHERE path = ?", ((p,) for p in paths)
+            ).rowcount)
+        except Exception as e:
+            print(f"[MetadataManager] Error removing generation params: {e}")
+            return 0
+
+    def _generation_rows(self, sql, params):
+        rows = self._read_conn().execute(sql, params).fetchall()
+        columns = ("path", "basename") + self.GENERATION_FIELDS + ("params_hash",)
+        return [dict(zip(columns, r)) for r in rows]
+
+    def search_generation_params(self, text=None, seed=None, sampler=None, model=None,
+                                 width=None, height=None, limit=50, offset=0):
+        """Indexed files matching all given fields; `text` is a substring of either prompt."""
+        limit = max(1, min(int(limit or 50), 500))
+        offset = max(0, int(offset or 0))
+        where = ["params_hash IS NOT NULL"]
+        params = []
+        if text:
+            escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append("(positive LIKE ? ESCAPE '\\' OR negative LIKE ? ESCAPE '\\')")
+            params += [f"%{escaped}%"] * 2
+        for column, value in (("seed", seed), ("sampler", sampler), ("model", model),
+                              ("width", width), ("height", height)):
+            if value not in (None, ""):
+                where.append(f"{column} = ?")
+                params.append(value)
+        params += [limit + 1, offset]
+        try:
+            items = self._generation_rows(f"""
+                SELECT path, basename, {",".join(self.GENERATION_FIELDS)}, params_hash
+                FROM generation_params WHERE {" AND ".join(where)}
+                ORDER BY indexed_at DESC, path LIMIT ? OFFSET ?
+            """, params)
+        except sqlite3.Error as e:
+            print(f"[MetadataManager] Error searching generation params: {e}")
+            raise
+        has_more = len(items) > limit
+        return {"items": items[:limit], "next_offset": offset + limit if has_more else None}
+
+    def find_generation_duplicates(self, limit=50, offset=0):
+        """Groups of files generated with identical parameters, largest groups first."""
+        limit = max(1, min(int(limit or 50), 500))
+        offset = max(0, int(offset or 0))
+        try:
+            conn = self._read_conn()
+            groups = conn.execute("""
+                SELECT params_hash, COUNT(*) AS n FROM generation_params
+                WHERE params_hash IS NOT NULL
+                GROUP BY params_hash HAVING n > 1
+                ORDER BY n DESC, params_hash LIMIT ? OFFSET ?
+            """, (limit + 1, offset)).fetchall()
+            has_more = len(groups) > limit
+            groups = groups[:limit]
+            result = []
+            for params_hash, _count in groups:
+                files = self._generation_rows(f"""
+                    SELECT path, basename, {",".join(self.GENERATION_FIELDS)}, params_hash
+                    FROM generation_params WHERE params_hash = ? ORDER BY path
+                """, (params_hash,))
+                params = {f: files[0][f] for f in self.GENERATION_FIELDS}
+                result.append({"params_hash": params_hash, "params": params, "paths": [f["path"] for f in files]})
+        except sqlite3.Error as e:
+            print(f"[MetadataManager] Error finding duplicates: {e}")
+            raise
+        return {"groups": result, "next_offset": offset + limit if has_more else None}
+
+    # ===== Images Catalog API =====
+
+    def _image_id(self, conn, basename, create=False):
+        """Resolve basename -> images.id on an open connection (optionally creating the row)."""
+        if not basename:
+            return None
+        if create:
+            conn.execute(
+                "INSERT OR IGNORE INTO images (basename, name_terms, created_at) VALUES (?, ?, ?)",
+                (basename, basename_search_terms(basename), time.time()),
+            )
+        row = conn.execute("SELECT id FROM images WHERE basename = ?", (basename,)).fetchone()
+        return row[0] if row else None
+
+    def get_image_id(self, basename):
+        """Get image ID by basename."""
+        try:
+            return self._image_id(self._read_conn(), basename)
+        except Exception as e:
+            print(f"[MetadataManager] Error getting image ID: {e}")
+            return None
+
+    def get_or_create_image(self, basename):
+        """Get image ID, creating the catalog row if necessary."""
+        try:
+            return self._write(lambda conn: self._image_id(conn, basename, create=True))
+        except Exception as e:
+            print(f"[MetadataManager] Error creating image: {e}")
+            return None
+
+    def upsert_image_file(self, basename, root, map_type, path, size_bytes=0, mtime=0.0,
+                          width=None, height=None, fmt=None, prompt=None, wait=True):
+        """Record (or refresh) one file of an image in the catalog. Returns the image id.
+
+        `prompt` (the positive prompt embedded in the file, if any) is stored on
+        the image for full-text search. With `wait=False` the write is only
+        queued and a Future is returned, so bulk scans share group commits.
+        """
+        if not basename or not path:
+            return None
+
+        def op(conn):
+            image_id = self._image_id(conn, basename, create=True)
+            conn.execute("""
+                INSERT INTO image_files
+                    (image_id, root, map_type, filename, path, bytes, mtime, width, height, format, indexed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    image_id = excluded.image_id,
+                    root = excluded.root,
+                    map_type = excluded.map_type,
+                    filename = excluded.filename,
+                    bytes = excluded.bytes,
+                    mtime = excluded.mtime,
+                    width = excluded.width,
+                    height = excluded.height,
+                    format = excluded.format,
+                    indexed_at = excluded.indexed_at
+            """, (image_id, root, map_type, os.path.basename(path), path, int(size_bytes or 0),
+                  float(mtime or 0.0), width, height, fmt, time.time()))
+            if prompt:
+                conn.execute("UPDATE images SET prompt = ? WHERE id = ?", (prompt, image_id))
+            return image_id
+
+        try:
+            if not wait:
+                return self._submit(op)
+            return self._write(op)
+        except Exception as e:
+            print(f"[MetadataManager] Error recording image file: {e}")
+            return None
+
+    def get_image_file(self, path):
+        """Get the catalog row for a file path, or None if it isn't indexed."""
+        try:
+            cur = self._read_conn().cursor()
+            cur.row_factory = sqlite3.Row
+            row = cur.execute("""
+                SELECT i.basename, f.root, f.map_type, f.filename, f.path, f.bytes, f.mtime,
+                       f.width, f.height, f.format
+                FROM image_files f JOIN images i ON i.id = f.image_id
+                WHERE f.path = ?
+            """, (path,)).fetchone()
+            return dict(row) if row else None
+        except Exception as e:
+            print(f"[MetadataManager] Error getting image file: {e}")
+            return None
+
+    def get_image_files(self, paths):
+        """Catalog rows for many file paths at once: {path: row} for the indexed ones."""
+        rows = {}
+        paths = list(paths)
+        try:
+            cur = self._read_conn().cursor()
+            cur.row_factory = sqlite3.Row
+            # Stay below SQLite's host parameter limit
+            for start in range(0, len(paths), 500):
+                chunk = paths[start:start + 500]
+                for row in cur.execute(f"""
+                    SELECT i.basename, f.root, f.map_type, f.filename, f.path, f.bytes, f.mtime,
+                           f.width, f.height, f.format
+                    FROM image_files f JOIN images i ON i.id = f.image_id
+                    WHERE f.path IN ({",".join("?" * len(chunk))})
+                """, chunk):
+                    rows[row["path"]] = dict(row)
+        except Exception as e:
+            print(f"[MetadataManager] Error getting image files: {e}")
+        return rows
+
+    def remove_image_file(self, path):
+        """Drop one file from the catalog. Returns True if a row was removed."""
+        try:
+            return self._write(
+                lambda conn: conn.execute("DELETE FROM image_files WHERE path = ?", (path,)).rowcount > 0
+            )
+        except Exception as e:
+            print(f"[MetadataManager] Error removing image file: {e}")
+            return False
+
+    def remove_image_files_under(self, root):
+        """Drop every catalog file row under a cache root. Returns the number of removed rows."""
+        try:
+            return self._write(
+                lambda conn: conn.execute("DELETE FROM image_files WHERE root = ?", (root,)).rowcount
+            )
+        except Exception as e:
+            print(f"[MetadataManager] Error removing image files: {e}")
+            return 0
+
+    def prune_orphan_images(self):
+        """Delete images that have neither files nor tags. Returns the number of removed rows."""
+        try:
+            return self._write(lambda conn: conn.execute("""
+                DELETE FROM images
+                WHERE NOT EXISTS (SELECT 1 FROM image_files f WHERE f.image_id = images.id)
+                  AND NOT EXISTS (SELECT 1 FROM image_tags it WHERE it.image_id = images.id)
+            """).rowcount)
+        except Exception as e:
+            print(f"[MetadataManager] Error pruning images: {e}")
+            return 0
+
+    def get_files_for_basenames(self, root, basenames):
+        """Catalog files of some basenames under a root: {basename: [(map_type, filename, path)]}."""
+        basenames = list(dict.fromkeys(b for b in basenames if b))
+        found = {}
+        try:
+            conn = self._read_conn()
+            for start in range(0, len(basenames), 500):
+                chunk = basenames[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                for basename, map_type, filename, path in conn.execute(f"""
+                    SELECT i.basename, f.map_type, f.filename, f.path
+                    FROM images i JOIN image_files f ON f.image_id = i.id
+                    WHERE f.root = ? AND i.basename IN ({marks})
+                """, [root] + chunk).fetchall():
+                    found.setdefault(basename, []).append((map_type, filename, path))
+        except sqlite3.Error as e:
+            print(f"[MetadataManager] Error looking up image files: {e}")
+        return found
+
+    def forget_images(self, paths, basenames, remove_tags=True):
+        """Drop catalog rows of deleted files and (optionally) tag links of `basenames`.
+
+        Runs as one transaction, so listeners see a single commit. Images of
+        `basenames` left without files and tags are pruned. Returns the
+        number of removed tag links.
+        """
+        def op(conn):
+            conn.executemany("DELETE FROM image_files WHERE path = ?", ((p,) for p in paths))
+            removed = 0
+            for basename in basenames:
+                if remove_tags:
+                    removed += conn.execute("""
+                        DELETE FROM image_tags
+                        WHERE image_id = (SELECT id FROM images WHERE basename = ?)
+                    """, (basename,)).rowcount
+                conn.execute("""
+                    DELETE FROM images
+                    WHERE basename = ?
+                      AND NOT EXISTS (SELECT 1 FROM image_files f WHERE f.image_id = images.id)
+                      AND NOT EXISTS (SELECT 1 FROM image_tags it WHERE it.image_id = images.id)
+                """, (basename,))
+            return removed
+
+        try:
+            return self._write(op)
+        except Exception as e:
+            print(f"[MetadataManager] Error forgetting images: {e}")
+            return 0
+
+    def list_image_files(self, root, map_type=None):
+        """List catalog files under a root (optionally one map type), ordered by filename."""
+        try:
+            cur = self._read_conn().cursor()
+            cur.row_factory = sqlite3.Row
+            sql = """
+                SELECT i.basename, f.map_type, f.filename, f.bytes, f.mtime, f.width, f.height, f.format
+                FROM image_files f JOIN images i ON i.id = f.image_id
+                WHERE f.root = ?
+            """
+            params = [root]
+            if map_type:
+                sql += " AND f.map_type = ?"
+                params.append(map_type)
+            sql += " ORDER BY f.map_type, f.filename"
+            return [dict(r) for r in cur.execute(sql, params).fetchall()]
+        except Exception as e:
+            print(f"[MetadataManager] Error listing image files: {e}")
+            return []
+
+    def get_map_types_for_image(self, basename, root=None):
+        """Get the map types that exist on disk for a basename."""
+        try:
+            sql = """
+                SELECT DISTINCT f.map_type FROM image_files f
+                JOIN images i ON i.id = f.image_id
+                WHERE i.basename = ?
+            """
+            params = [basename]
+            if root:
+                sql += " AND f.root = ?"
+                params.append(root)
+            sql += " ORDER BY f.map_type"
+            return [r[0] for r in self._read_conn().execute(sql, params).fetchall()]
+        except Exception as e:
+            print(f"[MetadataManager] Error getting map types for image: {e}")
+            return []
+
+    def get_catalog_stats(self, root=None):
+        """Get per-map-type file counts, total bytes and distinct image counts."""
+        try:
+            conn = self._read_conn()
+            sql = """
+                SELECT map_type, COUNT(*), COALESCE(SUM(bytes), 0), COUNT(DISTINCT image_id)
+                FROM image_files
+            """
+            params = []
+            if root:
+                sql += " WHERE root = ?"
+                params.append(root)
+            sql += " GROUP BY map_type ORDER BY map_type"
+            types = [
+                {"map_type": r[0], "files": r[1], "bytes": r[2], "images": r[3]}
+                for r in conn.execute(sql, params).fetchall()
+            ]
+            sql = "SELECT COUNT(*), COALESCE(SUM(bytes), 0), COUNT(DISTINCT image_id) FROM image_files"
+            if root:
+                sql += " WHERE root = ?"
+            files, total_bytes, images = conn.execute(sql, params).fetchone()
+            return {"files": files, "bytes": total_bytes, "images": images, "types": types}
+        except Exception as e:
+            print(f"[MetadataManager] Error getting catalog stats: {e}")
+            return {"files": 0, "bytes": 0, "images": 0, "types": []}
+
+    def get_root_fingerprint(self, root):
+        """Cheap change marker for the catalog files of one root: (files, bytes, newest mtime, last indexed)."""
+        try:
+            return tuple(self._read_conn().execute(
+                """
+                SELECT COUNT(*), COALESCE(SUM(bytes), 0), COALESCE(MAX(mtime), 0), COALESCE(MAX(indexed_at), 0)
+                FROM image_files WHERE root = ?
+                """,
+                (root,),
+            ).fetchone())
+        except Exception as e:
+            print(f"[MetadataManager] Error reading root fingerprint: {e}")
+            return ()
+
+    # ===== Favorites API =====
+
+    def _is_favorite_tag(self, tag_name: str) -> bool:
+        try:
+            return (tag_name or "").strip().lower() == self.FAVORITE_TAG
+        except Exception:
+            return False
+
+    def _set_favorite_row(self, conn, image_path: str, should_be_favorite: bool) -> None:
+        """Ensure favorites table reflects should_be_favorite."""
+        if not image_path:
+            return
+        if should_be_favorite:
+            conn.execute(
+                "INSERT OR IGNORE INTO favorites (path, added_at) VALUES (?, ?)",
+                (image_path, time.time()),
+            )
+        else:
+            conn.execute("DELETE FROM favorites WHERE path = ?", (image_path,))
+
+    def _set_favorite_tag_assoc(self, conn, image_path: str, should_be_favorite: bool) -> None:
+        """Ensure image_tags contains (or removes) the canonical 'favorite' tag association."""
+        if not image_path:
+            return
+        tag_id = self._tag_id(conn, self.FAVORITE_TAG, create=True)
+        image_id = self._image_id(conn, image_path, create=should_be_favorite)
+        if image_id is None:
+            return
+        if should_be_favorite:
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO image_tags (image_id, tag_id, added_at)
+                VALUES (?, ?, ?)
+                """,
+                (image_id, tag_id, time.time()),
+            )
+        else:
+            conn.execute(
+                "DELETE FROM image_tags WHERE image_id = ? AND tag_id = ?",
+                (image_id, tag_id),
+            )
+
     def toggle_favorite(self, path):
         """Toggles favorite status. Returns True if now favorite, False if removed."""
+        def op(conn):
+            exists = conn.execute("SELECT 1 FROM favorites WHERE path = ?", (path,)).fetchone()
+            # Favorites row and tag mirror change in the same transaction.
+            self._set_favorite_row(conn, path, not exists)
+            self._set_favorite_tag_assoc(conn, path, not exists)
+            return not exists
+
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT path FROM favorites WHERE path = ?", (path,))
-                exists = cursor.fetchone()
-                
-                if exists:
-                    cursor.execute("DELETE FROM favorites WHERE path = ?", (path,))
-                    conn.commit()
-                    # Keep tag mirror in sync
-                    self._set_favorite_tag_assoc(path, False)
-                    return False
-                else:
-                    cursor.execute("INSERT INTO favorites (path, added_at) VALUES (?, ?)", 
-                                 (path, time.time()))
-                    conn.commit()
-                    # Keep tag mirror in sync
-                    self._set_favorite_tag_assoc(path, True)
-                    return True
+            return self._write(op)
         except Exception as e:
             print(f"[MetadataManager] Error toggling favorite: {e}")
             return False
@@ -219,10 +1318,9 @@ class MetadataManager:
     def is_favorite(self, path):
         """Check if path is favorited."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT 1 FROM favorites WHERE path = ?", (path,))
-                return cursor.fetchone() is not None
+            return self._read_conn().execute(
+                "SELECT 1 FROM favorites WHERE path = ?", (path,)
+            ).fetchone() is not None
         except Exception as e:
             print(f"[MetadataManager] Error checking favorite: {e}")
             return False
@@ -230,107 +1328,116 @@ class MetadataManager:
     def get_favorites(self):
         """Get all favorite paths."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT path FROM favorites ORDER BY added_at DESC")
-                rows = cursor.fetchall()
-                return [r[0] for r in rows]
+            rows = self._read_conn().execute(
+                "SELECT path FROM favorites ORDER BY added_at DESC"
+            ).fetchall()
+            return [r[0] for r in rows]
         except Exception as e:
             print(f"[MetadataManager] Error listing favorites: {e}")
             return []
-    
+
     # ===== Tags API =====
-    
+
+    def _tag_id(self, conn, name, create=False):
+        """Resolve tag name -> tags.id on an open connection (optionally creating the tag)."""
+        if create:
+            conn.execute("INSERT OR IGNORE INTO tags (name) VALUES (?)", (name,))
+        row = conn.execute("SELECT id FROM tags WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
     def create_tag(self, name):
         """Create a new tag. Returns tag_id or None if exists."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("INSERT OR IGNORE INTO tags (name) VALUES (?)", (name,))
-                conn.commit()
-                cursor.execute("SELECT id FROM tags WHERE name = ?", (name,))
-                result = cursor.fetchone()
-                return result[0] if result else None
+            return self._write(lambda conn: self._tag_id(conn, name, create=True))
         except Exception as e:
             print(f"[MetadataManager] Error creating tag: {e}")
             return None
-    
+
     def get_or_create_tag(self, name):
         """Get tag_id, creating if necessary."""
         tag_id = self.get_tag_id(name)
         if tag_id is None:
             tag_id = self.create_tag(name)
         return tag_id
-    
+
     def get_tag_id(self, name):
         """Get tag ID by name."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT id FROM tags WHERE name = ?", (name,))
-                result = cursor.fetchone()
-                return result[0] if result else None
+            return self._tag_id(self._read_conn(), name)
         except Exception as e:
             print(f"[MetadataManager] Error getting tag ID: {e}")
             return None
-    
-    def add_tag_to_image(self, image_path, tag_name):
-        """Add tag to image."""
+
+    def _add_tag(self, conn, image_path, tag_name):
         if self._is_favorite_tag(tag_name):
             # Canonicalize and mirror to favorites table
             tag_name = self.FAVORITE_TAG
-            self._set_favorite_row(image_path, True)
+            self._set_favorite_row(conn, image_path, True)
+        tag_id = self._tag_id(conn, tag_name, create=True)
+        image_id = self._image_id(conn, image_path, create=True)
+        conn.execute("""
+            INSERT OR IGNORE INTO image_tags (image_id, tag_id, added_at)
+            VALUES (?, ?, ?)
+        """, (image_id, tag_id, time.time()))
 
-        tag_id = self.get_or_create_tag(tag_name)
-        if tag_id is None:
-            return False
-        
+    def add_tag_to_image(self, image_path, tag_name):
+        """Add tag to image."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
-                    INSERT OR IGNORE INTO image_tags (image_path, tag_id, added_at) 
-                    VALUES (?, ?, ?)
-                """, (image_path, tag_id, time.time()))
-                conn.commit()
-                return True
+            self._write(lambda conn: self._add_tag(conn, image_path, tag_name))
+            return True
         except Exception as e:
             print(f"[MetadataManager] Error adding tag to image: {e}")
             return False
-    
+
+    def add_tags_to_image(self, image_path, tag_names):
+        """Add several tags to an image in one transaction. Returns True on success."""
+        def op(conn):
+            for tag_name in tag_names:
+                self._add_tag(conn, image_path, tag_name)
+
+        try:
+            self._write(op)
+            return True
+        except Exception as e:
+            print(f"[MetadataManager] Error adding tags to image: {e}")
+            return False
+
     def remove_tag_from_image(self, image_path, tag_name):
         """Remove tag from image."""
-        if self._is_favorite_tag(tag_name):
-            # Always clear favorites table even if the tag row doesn't exist.
-            tag_name = self.FAVORITE_TAG
-            self._set_favorite_row(image_path, False)
+        def op(conn):
+            name = tag_name
+            if self._is_favorite_tag(name):
+                # Always clear favorites table even if the tag row doesn't exist.
+                name = self.FAVORITE_TAG
+                self._set_favorite_row(conn, image_path, False)
+            tag_id = self._tag_id(conn, name)
+            if tag_id is None:
+                # If the association doesn't exist, we still consider favorite cleared above.
+                return self._is_favorite_tag(name)
+            conn.execute("""
+                DELETE FROM image_tags
+                WHERE tag_id = ? AND image_id = (SELECT id FROM images WHERE basename = ?)
+            """, (tag_id, image_path))
+            return True
 
-        tag_id = self.get_tag_id(tag_name)
-        if tag_id is None:
-            # If the association doesn't exist, we still consider favorite cleared above.
-            return self._is_favorite_tag(tag_name)
-        
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("DELETE FROM image_tags WHERE image_path = ? AND tag_id = ?", 
-                           (image_path, tag_id))
-                conn.commit()
-                return True
+            return self._write(op)
         except Exception as e:
             print(f"[MetadataManager] Error removing tag from image: {e}")
             return False
-    
+
     def get_tags_for_image(self, image_path):
         """Get all tags for an image."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT t.name FROM tags t
-                    JOIN image_tags it ON t.id = it.tag_id
-                    WHERE it.image_path = ?
-                    ORDER BY t.name
-                """, (image_path,))
-                tags = [r[0] for r in cursor.fetchall()]
+            conn = self._read_conn()
+            rows = conn.execute("""
+                SELECT t.name FROM tags t
+                JOIN image_tags it ON t.id = it.tag_id
+                JOIN images i ON i.id = it.image_id
+                WHERE i.basename = ?
+                ORDER BY t.name
+            """, (image_path,)).fetchall()
+            tags = [r[0] for r in rows]
 
             # Inject favorites as a special tag (even if only stored in favorites table)
             try:
@@ -345,54 +1452,54 @@ class MetadataManager:
         except Exception as e:
             print(f"[MetadataManager] Error getting tags for image: {e}")
             return []
-    
+
     def get_all_tags(self):
         """Get all tags with usage counts."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-
-                cursor.execute("""
-                    SELECT t.name, COUNT(it.image_path) as count
-                    FROM tags t
-                    LEFT JOIN image_tags it ON t.id = it.tag_id
-                    GROUP BY t.id, t.name
-                    ORDER BY t.name
-                """)
-                rows = [{"name": r[0], "count": r[1]} for r in cursor.fetchall()]
-
-                # Special handling for favorites: report count as union of favorites table
-                # and any tag associations named 'favorite' (case-insensitive).
-                cursor.execute(
-                    """
-                    SELECT COUNT(DISTINCT p) FROM (
-                        SELECT path as p FROM favorites
-                        UNION
-                        SELECT it.image_path as p
-                        FROM image_tags it
-                        JOIN tags t ON t.id = it.tag_id
-                        WHERE LOWER(t.name) = LOWER(?)
-                    )
-                    """,
-                    (self.FAVORITE_TAG,),
-                )
-                fav_count = cursor.fetchone()[0] or 0
-
-                filtered = [r for r in rows if (r.get("name") or "").strip().lower() != self.FAVORITE_TAG]
-                filtered.append({"name": self.FAVORITE_TAG, "count": fav_count})
-                filtered.sort(key=lambda x: (x.get("name") or "").lower())
-                return filtered
+            return self._all_tags(self._read_conn().cursor())
         except Exception as e:
             print(f"[MetadataManager] Error getting all tags: {e}")
             return []
-    
+
+    def _all_tags(self, cursor):
+        """Tag list with usage counts on an open cursor (favorites counted as a union)."""
+        cursor.execute("""
+            SELECT t.name, COUNT(it.image_id) as count
+            FROM tags t
+            LEFT JOIN image_tags it ON t.id = it.tag_id
+            GROUP BY t.id, t.name
+            ORDER BY t.name
+        """)
+        rows = [{"name": r[0], "count": r[1]} for r in cursor.fetchall()]
+
+        # Special handling for favorites: report count as union of favorites table
+        # and any tag associations named 'favorite' (case-insensitive).
+        cursor.execute(
+            """
+            SELECT COUNT(DISTINCT p) FROM (
+                SELECT path as p FROM favorites
+                UNION
+                SELECT i.basename as p
+                FROM image_tags it
+                JOIN tags t ON t.id = it.tag_id
+                JOIN images i ON i.id = it.image_id
+                WHERE LOWER(t.name) = LOWER(?)
+            )
+            """,
+            (self.FAVORITE_TAG,),
+        )
+        fav_count = cursor.fetchone()[0] or 0
+
+        filtered = [r for r in rows if (r.get("name") or "").strip().lower() != self.FAVORITE_TAG]
+        filtered.append({"name": self.FAVORITE_TAG, "count": fav_count})
+        filtered.sort(key=lambda x: (x.get("name") or "").lower())
+        return filtered
+
     def delete_tag(self, tag_name):
         """Delete a tag (CASCADE removes all image associations)."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("DELETE FROM tags WHERE name = ?", (tag_name,))
-                conn.commit()
-                return True
+            self._write(lambda conn: conn.execute("DELETE FROM tags WHERE name = ?", (tag_name,)))
+            return True
         except Exception as e:
             print(f"[MetadataManager] Error deleting tag: {e}")
             return False
@@ -405,13 +1512,445 @@ class MetadataManager:
         Returns the number of removed rows.
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT COUNT(1) FROM image_tags WHERE image_path = ?", (image_path,))
-                before = cursor.fetchone()[0]
-                cursor.execute("DELETE FROM image_tags WHERE image_path = ?", (image_path,))
-                conn.commit()
-                return before
+            return self._write(lambda conn: conn.execute("""
+                DELETE FROM image_tags
+                WHERE image_id = (SELECT id FROM images WHERE basename = ?)
+            """, (image_path,)).rowcount)
         except Exception as e:
             print(f"[MetadataManager] Error removing tags for image: {e}")
             return 0
+
+    # ===== Query API =====
+
+    QUERY_SORT_COLUMNS = {
+        "name": "f.filename",
+        "mtime": "f.mtime",
+        "size": "f.bytes",
+        "added_at": "i.created_at",
+    }
+
+    def _compile_tag_query(self, node, params):
+        """Compile a parse_tag_query() tree into a WHERE fragment over `images i`."""
+        kind = node[0]
+        if kind == "and":
+            return f"({self._compile_tag_query(node[1], params)} AND {self._compile_tag_query(node[2], params)})"
+        if kind == "or":
+            return f"({self._compile_tag_query(node[1], params)} OR {self._compile_tag_query(node[2], params)})"
+        if kind == "not":
+            return f"(NOT {self._compile_tag_query(node[1], params)})"
+
+        name = node[1]
+        # Probes the (image_id, tag_id) primary key once per matching tag id.
+        sql = (
+            "EXISTS (SELECT 1 FROM image_tags it WHERE it.image_id = i.id"
+            " AND it.tag_id IN (SELECT id FROM tags WHERE name = ? COLLATE NOCASE))"
+        )
+        params.append(name)
+        if self._is_favorite_tag(name):
+            # Favorites may live only in the favorites table.
+            sql = f"({sql} OR EXISTS (SELECT 1 FROM favorites fv WHERE fv.path = i.basename))"
+        return sql
+
+    def query_images(self, root, expression=None, map_type=None, name_contains=None,
+                     sort="name", order="asc", limit=100, cursor=None, include_total=False):
+        """Filter catalog files with a tag expression and return one keyset-paginated page.
+
+        `cursor` is the opaque `next_cursor` of the previous page. Raises
+        TagQueryError for malformed expressions, sorts or cursors.
+        """
+        sort_col = self.QUERY_SORT_COLUMNS.get(sort)
+        if sort_col is None:
+            raise TagQueryError(f"Unknown sort '{sort}'")
+        descending = str(order).lower() == "desc"
+        limit = max(1, min(int(limit or 100), 1000))
+        tree = parse_tag_query(expression)
+
+        where = ["f.root = ?"]
+        params = [root]
+        if map_type:
+            where.append("f.map_type = ?")
+            params.append(map_type)
+        if name_contains:
+            escaped = name_contains.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append("f.filename LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        if tree is not None:
+            where.append(self._compile_tag_query(tree, params))
+        filter_sql = " AND ".join(where)
+        filter_params = list(params)
+
+        if cursor:
+            last_key, last_id = decode_query_cursor(cursor)
+            cmp = "<" if descending else ">"
+            where.append(f"({sort_col} {cmp} ? OR ({sort_col} = ? AND f.id {cmp} ?))")
+            params.extend([last_key, last_key, last_id])
+
+        direction = "DESC" if descending else "ASC"
+        sql = f"""
+            SELECT f.id, i.id, i.basename, f.map_type, f.filename, f.bytes, f.mtime,
+                   f.width, f.height, f.format, i.created_at, {sort_col}
+            FROM image_files f JOIN images i ON i.id = f.image_id
+            WHERE {" AND ".join(where)}
+            ORDER BY {sort_col} {direction}, f.id {direction}
+            LIMIT ?
+        """
+        params.append(limit + 1)
+
+        try:
+            conn = self._read_conn()
+            rows = conn.execute(sql, params).fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+
+            tags_by_image = {}
+            image_ids = sorted({r[1] for r in rows})
+            if image_ids:
+                marks = ",".join("?" * len(image_ids))
+                for image_id, tag in conn.execute(f"""
+                    SELECT it.image_id, t.name FROM image_tags it
+                    JOIN tags t ON t.id = it.tag_id
+                    WHERE it.image_id IN ({marks})
+                    ORDER BY t.name
+                """, image_ids).fetchall():
+                    tags_by_image.setdefault(image_id, []).append(tag)
+                for (image_id,) in conn.execute(f"""
+                    SELECT i.id FROM images i JOIN favorites fv ON fv.path = i.basename
+                    WHERE i.id IN ({marks})
+                """, image_ids).fetchall():
+                    tags = tags_by_image.setdefault(image_id, [])
+                    if not any(self._is_favorite_tag(t) for t in tags):
+                        tags.insert(0, self.FAVORITE_TAG)
+
+            total = None
+            if include_total:
+                total = conn.execute(
+                    f"SELECT COUNT(*) FROM image_files f JOIN images i ON i.id = f.image_id WHERE {filter_sql}",
+                    filter_params,
+                ).fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"[MetadataManager] Error querying images: {e}")
+            raise
+
+        items = [
+            {
+                "basename": r[2],
+                "map_type": r[3],
+                "filename": r[4],
+                "bytes": r[5],
+                "mtime": r[6],
+                "width": r[7],
+                "height": r[8],
+                "format": r[9],
+                "added_at": r[10],
+                "tags": tags_by_image.get(r[1], []),
+            }
+            for r in rows
+        ]
+        next_cursor = encode_query_cursor([rows[-1][11], rows[-1][0]]) if has_more else None
+        return {"items": items, "next_cursor": next_cursor, "total": total}
+
+    def select_export_files(self, root, map_types=None, expression=None, favorites_only=False,
+                            modified_since=None):
+        """Catalog files under `root` matching export filters, ordered by type and filename.
+
+        Filters combine with AND: `map_types` (iterable), a tag `expression`
+        (parse_tag_query syntax), favorites only, and file mtime >=
+        `modified_since` (unix seconds). Raises TagQueryError for bad expressions.
+        """
+        tree = parse_tag_query(expression)
+        where = ["f.root = ?"]
+        params = [root]
+        map_types = [t for t in (map_types or []) if t]
+        if map_types:
+            where.append(f"f.map_type IN ({','.join('?' * len(map_types))})")
+            params.extend(map_types)
+        if tree is not None:
+            where.append(self._compile_tag_query(tree, params))
+        if favorites_only:
+            where.append(self._compile_tag_query(("tag", self.FAVORITE_TAG), params))
+        if modified_since is not None:
+            where.append("f.mtime >= ?")
+            params.append(float(modified_since))
+        try:
+            rows = self._read_conn().execute(f"""
+                SELECT i.basename, f.map_type, f.filename, f.bytes, f.mtime
+                FROM image_files f JOIN images i ON i.id = f.image_id
+                WHERE {" AND ".join(where)}
+                ORDER BY f.map_type, f.filename
+            """, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"[MetadataManager] Error selecting export files: {e}")
+            raise
+        return [
+            {"basename": r[0], "map_type": r[1], "filename": r[2], "bytes": r[3], "mtime": r[4]}
+            for r in rows
+        ]
+
+    # ===== Search API =====
+
+    def fill_image_prompts(self):
+        """Copy indexed positive prompts (generation_params) onto catalog images.
+
+        An image takes the prompt of one of its own files (the original
+        first) or, when none has one, of an indexed file with the same
+        basename (the input image it was cached from). Only existing catalog
+        images are updated; no rows are created. Returns the number updated.
+        """
+        own_prompt = """
+            SELECT g.positive FROM image_files f
+            JOIN generation_params g ON g.path = f.path
+            WHERE f.image_id = images.id AND g.positive IS NOT NULL
+            ORDER BY f.map_type = 'original' DESC, f.map_type
+            LIMIT 1
+        """
+
+        def op(conn):
+            updated = conn.execute(
+                f"UPDATE images SET prompt = ({own_prompt}) "
+                f"WHERE ({own_prompt}) IS NOT NULL AND prompt IS NOT ({own_prompt})"
+            ).rowcount
+            by_basename = {}
+            for path, positive in conn.execute(
+                "SELECT path, positive FROM generation_params WHERE positive IS NOT NULL ORDER BY path"
+            ):
+                by_basename.setdefault(os.path.splitext(os.path.basename(path))[0], positive)
+            for basename, positive in by_basename.items():
+                updated += conn.execute(
+                    "UPDATE images SET prompt = ? WHERE basename = ? AND prompt IS NULL",
+                    (positive, basename),
+                ).rowcount
+            return updated
+
+        try:
+            return self._write(op)
+        except Exception as e:
+            print(f"[MetadataManager] Error filling image prompts: {e}")
+            return 0
+
+    def has_search_index(self):
+        try:
+            return self._read_conn().execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='images_fts'"
+            ).fetchone() is not None
+        except Exception:
+            return False
+
+    def search_images(self, text, root=None, map_type=None, limit=50, offset=0):
+        """Ranked full-text search over basenames, tags and prompts.
+
+        Every word is matched as a prefix and all words must match. Basename
+        hits rank above tag hits, which rank above prompt hits.
+        """
+        match = fts_match_query(text)
+        if not match:
+            return {"items": [], "next_offset": None}
+        limit = max(1, min(int(limit or 50), 500))
+        offset = max(0, int(offset or 0))
+
+        where = ["images_fts MATCH ?"]
+        params = [match]
+        if root or map_type:
+            sub = "EXISTS (SELECT 1 FROM image_files f WHERE f.image_id = i.id"
+            if root:
+                sub += " AND f.root = ?"
+                params.append(root)
+            if map_type:
+                sub += " AND f.map_type = ?"
+                params.append(map_type)
+            where.append(sub + ")")
+        params.extend([limit + 1, offset])
+
+        try:
+            conn = self._read_conn()
+            rows = conn.execute(f"""
+                SELECT i.id, i.basename, images_fts.tags,
+                       snippet(images_fts, 2, '[', ']', '…', 12),
+                       bm25(images_fts, 10.0, 5.0, 1.0) AS score
+                FROM images_fts JOIN images i ON i.id = images_fts.rowid
+                WHERE {" AND ".join(where)}
+                ORDER BY score
+                LIMIT ? OFFSET ?
+            """, params).fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+
+            types_by_image = {}
+            image_ids = [r[0] for r in rows]
+            if image_ids:
+                marks = ",".join("?" * len(image_ids))
+                type_sql = f"SELECT DISTINCT image_id, map_type FROM image_files WHERE image_id IN ({marks})"
+                type_params = list(image_ids)
+                if root:
+                    type_sql += " AND root = ?"
+                    type_params.append(root)
+                for image_id, mt in conn.execute(type_sql + " ORDER BY map_type", type_params).fetchall():
+                    types_by_image.setdefault(image_id, []).append(mt)
+        except sqlite3.Error as e:
+            print(f"[MetadataManager] Error searching images: {e}")
+            raise
+
+        items = [
+            {
+                "basename": r[1],
+                "tags": r[2].split("\n") if r[2] else [],
+                "prompt_snippet": r[3] or "",
+                "score": -r[4],
+                "map_types": types_by_image.get(r[0], []),
+            }
+            for r in rows
+        ]
+        return {"items": items, "next_offset": offset + limit if has_more else None}
+
+    # ===== Catalog Snapshot API =====
+
+    CATALOG_FILE_FIELDS = ["name", "bytes", "mtime", "width", "height"]
+
+    def _catalog_head(self, conn):
+        """(catalog_id, version) where version is the newest change-log entry."""
+        row = conn.execute("SELECT value FROM catalog_meta WHERE key = 'catalog_id'").fetchone()
+        catalog_id = row[0] if row else ""
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'catalog_changes'").fetchone()
+        return catalog_id, (row[0] if row else 0)
+
+    def _tags_by_basename(self, conn, basenames=None):
+        """basename -> sorted tag names (favorites folded in as 'favorite')."""
+        tags = {}
+        if basenames is not None:
+            basenames = list(basenames)
+            if not basenames:
+                return tags
+        chunks = [None] if basenames is None else [basenames[i:i + 500] for i in range(0, len(basenames), 500)]
+        for chunk in chunks:
+            where = "" if chunk is None else f"WHERE i.basename IN ({','.join('?' * len(chunk))})"
+            params = [] if chunk is None else chunk
+            for basename, tag in conn.execute(f"""
+                SELECT i.basename, t.name FROM image_tags it
+                JOIN tags t ON t.id = it.tag_id
+                JOIN images i ON i.id = it.image_id
+                {where}
+                ORDER BY i.basename, t.name
+            """, params).fetchall():
+                tags.setdefault(basename, []).append(tag)
+            fav_where = "" if chunk is None else f"WHERE path IN ({','.join('?' * len(chunk))})"
+            for (basename,) in conn.execute(f"SELECT path FROM favorites {fav_where}", params).fetchall():
+                names = tags.setdefault(basename, [])
+                if not any(self._is_favorite_tag(t) for t in names):
+                    names.insert(0, self.FAVORITE_TAG)
+        return tags
+
+    def get_catalog_head(self):
+        """(catalog_id, version) of the newest change-log entry."""
+        try:
+            return self._catalog_head(self._read_conn())
+        except Exception as e:
+            print(f"[MetadataManager] Error reading catalog version: {e}")
+            return "", 0
+
+    def get_changed_roots(self, since):
+        """Summarize the change log after `since`: (roots with file changes, tags_changed)."""
+        roots, tags_changed = set(), False
+        for kind, root in self._read_conn().execute(
+            "SELECT DISTINCT kind, root FROM catalog_changes WHERE version > ?", (int(since),)
+        ).fetchall():
+            if kind == "file":
+                roots.add(root)
+            else:
+                tags_changed = True
+        return roots, tags_changed
+
+    def get_catalog_snapshot(self, root):
+        """Everything the browser needs for a cache root, read in one transaction.
+
+        Files are grouped per map type as rows of CATALOG_FILE_FIELDS.
+        """
+        conn = self._read_conn()
+        conn.execute("BEGIN")
+        try:
+            catalog_id, version = self._catalog_head(conn)
+            files = {}
+            for map_type, name, size, mtime, width, height in conn.execute("""
+                SELECT map_type, filename, bytes, mtime, width, height FROM image_files
+                WHERE root = ? ORDER BY map_type, filename
+            """, (root,)).fetchall():
+                files.setdefault(map_type, []).append([name, size, mtime, width, height])
+            favorites = [r[0] for r in conn.execute("SELECT path FROM favorites ORDER BY path").fetchall()]
+            return {
+                "catalog_id": catalog_id,
+                "version": version,
+                "full": True,
+                "types": sorted(files),
+                "file_fields": self.CATALOG_FILE_FIELDS,
+                "files": files,
+                "image_tags": self._tags_by_basename(conn),
+                "favorites": favorites,
+                "tags": self._all_tags(conn.cursor()),
+            }
+        finally:
+            conn.rollback()
+
+    def get_catalog_delta(self, root, since, catalog_id=None):
+        """Changes after version `since`, or a full snapshot when that is not possible.
+
+        A snapshot is returned when `catalog_id` belongs to another database,
+        when `since` is ahead of this one, or when the log was trimmed past it.
+        Delta shape: `files` (upserted rows per type), `removed` (filenames per
+        type), `image_tags` and `favorites` for touched basenames, and `tags`
+        (the full tag list) when any tag assignment changed, else None.
+        """
+        since = int(since)
+        conn = self._read_conn()
+        conn.execute("BEGIN")
+        try:
+            current_id, version = self._catalog_head(conn)
+            oldest = conn.execute("SELECT MIN(version) FROM catalog_changes").fetchone()[0]
+            stale = (
+                (catalog_id and catalog_id != current_id)
+                or since > version
+                or (oldest is not None and since < oldest - 1)
+                or (oldest is None and since < version)
+            )
+            if not stale:
+                changed_files = set()
+                basenames = set()
+                tags_changed = False
+                for kind, r, map_type, filename, basename in conn.execute("""
+                    SELECT kind, root, map_type, filename, basename FROM catalog_changes
+                    WHERE version > ? ORDER BY version
+                """, (since,)).fetchall():
+                    if kind == "file":
+                        if r == root:
+                            changed_files.add((map_type, filename))
+                    elif kind == "image":
+                        tags_changed = True
+                        if basename:
+                            basenames.add(basename)
+                    else:
+                        tags_changed = True
+
+                files, removed = {}, {}
+                for map_type, filename in sorted(changed_files):
+                    row = conn.execute("""
+                        SELECT bytes, mtime, width, height FROM image_files
+                        WHERE root = ? AND map_type = ? AND filename = ?
+                    """, (root, map_type, filename)).fetchone()
+                    if row:
+                        files.setdefault(map_type, []).append([filename, *row])
+                    else:
+                        removed.setdefault(map_type, []).append(filename)
+
+                tags_by_image = self._tags_by_basename(conn, basenames)
+                favorites = {b: self.FAVORITE_TAG in tags_by_image.get(b, []) for b in sorted(basenames)}
+                return {
+                    "catalog_id": current_id,
+                    "version": version,
+                    "full": False,
+                    "file_fields": self.CATALOG_FILE_FIELDS,
+                    "files": files,
+                    "removed": removed,
+                    "image_tags": {b: tags_by_image.get(b, []) for b in sorted(basenames)},
+                    "favorites": favorites,
+                    "tags": self._all_tags(conn.cursor()) if tags_changed else None,
+                }
+        finally:
+            conn.rollback()
+        return self.get_catalog_snapshot(root)
@@ -0,0 +1,252 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import collections
+import hashlib
+import json
+import threading
+
+# Resolves generation parameters from a ComfyUI API-format prompt (the
+# `prompt` JSON embedded in saved images). The graph is indexed in one pass
+# and every (node, output slot) is resolved at most once, so the cost is
+# linear in the size of the prompt however many samplers share upstream
+# nodes. Plain standard library, so indexers and CLIs can use it.
+
+# Inputs holding prompt text on encoders, primitives and text nodes
+TEXT_KEYS = ("text", "text_g", "text_l", "t5xxl", "clip_l", "clip_g", "prompt", "value", "string")
+DELIMITER_KEYS = ("delimiter", "separator")
+SEED_KEYS = ("seed", "noise_seed", "value", "int")
+SAMPLER_KEYS = ("sampler_name",)
+MODEL_KEYS = ("ckpt_name", "unet_name", "model_name")
+SIZE_KEYS = ("value", "int")
+# Inputs a latent passes through on its way to the sampler
+LATENT_KEYS = ("samples", "latent", "latent_image")
+
+RESOLVE_CACHE_MAX = 256
+
+
+def _is_link(value):
+    return (
+        isinstance(value, list)
+        and len(value) == 2
+        and isinstance(value[0], (str, int))
+        and isinstance(value[1], int)
+    )
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_text(value):
+    return isinstance(value, str) and value != ""
+
+
+def _is_sampler(class_type, inputs):
+    # KSamplerSelect & co. only pick a sampler: no conditioning input
+    return ("KSampler" in class_type or "SamplerCustom" in class_type) and (
+        "positive" in inputs or "guider" in inputs
+    )
+
+
+class PromptGraph:
+    """Link index over one API-format prompt dict.
+
+    `chains()` returns, for every sampler, the positive/negative text behind
+    its conditioning (through Reroute-like single-input nodes, primitives,
+    string concatenation, conditioning combine/ControlNet nodes and custom
+    sampler guiders), its seed, sampler name, model file and latent size.
+    """
+
+    def __init__(self, prompt):
+        self.nodes = {}  # id -> (class_type, inputs)
+        self.samplers = []
+        self._fallback_texts = []  # CLIPTextEncode texts with a "positive" title or of some length
+        self._latent_size = None  # first EmptyLatentImage
+        self._any_size = None  # first node with width/height
+        self._memo = {}
+        for node_id, node in prompt.items():
+            if not isinstance(node, dict):
+                continue
+            class_type = node.get("class_type") or ""
+            inputs = node.get("inputs") or {}
+            if not isinstance(inputs, dict):
+                inputs = {}
+            node_id = str(node_id)
+            self.nodes[node_id] = (class_type, inputs)
+            if _is_sampler(class_type, inputs):
+                self.samplers.append(node_id)
+            elif class_type == "CLIPTextEncode" and _is_text(inputs.get("text")):
+                title = ((node.get("_meta") or {}).get("title") or "").lower()
+                if ("positive" in title and "negative" not in title) or len(inputs["text"]) > 50:
+                    self._fallback_texts.append(inputs["text"])
+            width, height = inputs.get("width"), inputs.get("height")
+            if _is_int(width) and _is_int(height):
+                if class_type == "EmptyLatentImage" and self._latent_size is None:
+                    self._latent_size = (width, height)
+                if self._any_size is None:
+                    self._any_size = (width, height)
+
+    # ----- resolution -----
+
+    def _linked(self, value):
+        """((node_id, slot), class_type, inputs) of a link, or None."""
+        if not _is_link(value):
+            return None
+        key = (str(value[0]), value[1])
+        node = self.nodes.get(key[0])
+        return (key, node[0], node[1]) if node else None
+
+    def _memoized(self, kind, value, resolve):
+        target = self._linked(value)
+        if target is None:
+            return None
+        memo_key = (kind, target[0])
+        if memo_key in self._memo:
+            return self._memo[memo_key]
+        self._memo[memo_key] = None  # guards against cycles
+        result = resolve(target[0][1], target[1], target[2])
+        self._memo[memo_key] = result
+        return result
+
+    def text(self, value):
+        """Prompt text of a literal or of the node output a link points at."""
+        if isinstance(value, str):
+            return value or None
+        return self._memoized("text", value, self._node_text)
+
+    def _node_text(self, slot, class_type, inputs):
+        if "positive" in inputs and "negative" in inputs:
+            # ControlNetApplyAdvanced, guiders: outputs follow their inputs
+            return self.text(inputs["negative"] if slot == 1 else inputs["positive"])
+        lowered = class_type.lower()
+        if any(word in lowered for word in ("concat", "join", "combine")):
+            delimiter = next((inputs[k] for k in DELIMITER_KEYS if isinstance(inputs.get(k), str)), "\n")
+            parts = [self.text(v) for k, v in inputs.items() if k not in DELIMITER_KEYS]
+            return delimiter.join(p for p in parts if p) or None
+        texts = []
+        for key in TEXT_KEYS:
+            if key in inputs:
+                text = self.text(inputs[key])
+                if text and text not in texts:
+                    texts.append(text)
+        if texts:
+            return "\n".join(texts)
+        links = [v for v in inputs.values() if _is_link(v)]
+        conditioning = [v for k, v in inputs.items() if k.startswith("conditioning") and _is_link(v)]
+        if conditioning:
+            links = conditioning
+        if len(links) == 1:
+            # Reroute-like nodes and conditioning modifiers pass their input on
+            return self.text(links[0])
+        return None
+
+    def scalar(self, value, keys, accept, follow=()):
+        """A literal accepted by `accept`, or the first one found upstream
+        under `keys` (then `follow`, then through single-input nodes)."""
+        if accept(value):
+            return value
+
+        def resolve(_slot, _class_type, inputs):
+            for key in tuple(keys) + tuple(follow):
+                if key in inputs:
+                    found = self.scalar(inputs[key], keys, accept, follow)
+                    if found is not None:
+                        return found
+            links = [v for v in inputs.values() if _is_link(v)]
+            return self.scalar(links[0], keys, accept, follow) if len(links) == 1 else None
+
+        return self._memoized(("scalar", keys, follow), value, resolve)
+
+    def latent_size(self, value):
+        """(width, height) of the latent a link points at, or None."""
+
+        def resolve(_slot, _class_type, inputs):
+            width = self.scalar(inputs.get("width"), SIZE_KEYS, _is_int)
+            height = self.scalar(inputs.get("height"), SIZE_KEYS, _is_int)
+            if width and height:
+                return (width, height)
+            for key in LATENT_KEYS:
+                if key in inputs:
+                    return self.latent_size(inputs[key])
+            return None
+
+        return self._memoized("latent", value, resolve)
+
+    # ----- results -----
+
+    def chains(self):
+        """One dict per sampler, in prompt order: id, class_type, positive,
+        negative, seed, sampler, model, width, height (None when unknown)."""
+        chains = []
+        for node_id in self.samplers:
+            try:
+                chains.append(self._chain(node_id))
+            except RecursionError:
+                # Absurdly deep pass-through chains: leave this sampler out
+                print(f"[PromptGraph] Graph too deep to resolve sampler {node_id}")
+        return chains
+
+    def _chain(self, node_id):
+        class_type, inputs = self.nodes[node_id]
+        source = inputs
+        guider = self._linked(inputs.get("guider"))
+        if guider is not None:
+            # SamplerCustomAdvanced: conditioning and model sit on the guider
+            source = guider[2]
+        size = self.latent_size(inputs.get("latent_image")) or (None, None)
+        return {
+            "id": node_id,
+            "class_type": class_type,
+            "positive": self.text(source.get("positive", source.get("conditioning"))),
+            "negative": self.text(source.get("negative")),
+            "seed": self.scalar(inputs.get("seed", inputs.get("noise_seed", inputs.get("noise"))), SEED_KEYS, _is_int),
+            "sampler": self.scalar(inputs.get("sampler_name", inputs.get("sampler")), SAMPLER_KEYS, _is_text),
+            "model": self.scalar(source.get("model"), MODEL_KEYS, _is_text, follow=("model",)),
+            "width": size[0],
+            "height": size[1],
+        }
+
+    def summary(self):
+        """{"chains", "positive", "width", "height"}: the first sampler's
+        prompt and size, falling back to prompt-looking encoder texts and
+        EmptyLatentImage / any width+height inputs like before."""
+        chains = self.chains()
+        positive = next((c["positive"] for c in chains if c["positive"]), None)
+        if positive is None and self._fallback_texts:
+            positive = max(self._fallback_texts, key=len)
+        size = next(((c["width"], c["height"]) for c in chains if c["width"] and c["height"]), None)
+        size = size or self._latent_size or self._any_size or (None, None)
+        return {"chains": chains, "positive": positive, "width": size[0], "height": size[1]}
+
+
+_resolved = collections.OrderedDict()  # sha1 of the prompt JSON -> summary
+_resolved_lock = threading.Lock()
+
+
+def resolve_prompt(prompt_text):
+    """PromptGraph(...).summary() of a `prompt` JSON string, memoized by its hash.
+
+    Raises ValueError if the text is not a JSON object.
+    """
+    if isinstance(prompt_text, str):
+        prompt_text = prompt_text.encode("utf-8", "surrogatepass")
+    key = hashlib.sha1(prompt_text).hexdigest()
+    with _resolved_lock:
+        summary = _resolved.get(key)
+        if summary is not None:
+            _resolved.move_to_end(key)
+    if summary is None:
+        prompt = json.loads(prompt_text)
+        if not isinstance(prompt, dict):
+            raise ValueError("prompt is not a JSON object")
+        summary = PromptGraph(prompt).summary()
+        with _resolved_lock:
+            _resolved[key] = summary
+            while len(_resolved) > RESOLVE_CACHE_MAX:
+                _resolved.popitem(last=False)
+    # Callers get their own copies; the cached summary stays intact
+    return {**summary, "chains": [dict(c) for c in summary["chains"]]}
@@ -0,0 +1,245 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import argparse
+import json
+import os
+import pickle
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from .image_header import read_image_header
+    from .prompt_graph import resolve_prompt
+    from . import worker_pools
+except ImportError:  # run as a script, see main()
+    from image_header import read_image_header
+    from prompt_graph import resolve_prompt
+    import worker_pools
+
+# Bulk index of generation parameters (prompts, seed, sampler, model, size)
+# embedded in the images of the input folder and the cache originals. Files
+# are read header-only by a pool of workers (threads, or processes where
+# worker_pools allows them) and stored in metadata.db keyed by
+# path, size and mtime, so a re-run only reads new or changed files. Runs as
+# the "prompt_index" job or from the command line (see main()).
+
+INDEX_FIELDS = ("positive", "negative", "width", "height", "seed", "sampler", "model")
+INDEX_EXTENSIONS = (".png", ".webp", ".jpg", ".jpeg")
+INDEX_WORKERS = max(1, min(8, (os.cpu_count() or 2) - 1))
+# Files handed to the pool per round; cancellation is checked between rounds
+INDEX_CHUNK = 256
+
+
+def parse_generation_params(prompt_text):
+    """Generation parameters from a ComfyUI API-format `prompt` JSON string.
+
+    Returns a dict with INDEX_FIELDS, taken from the first sampler that has
+    a positive prompt (see prompt_graph); values not found are None.
+    """
+    params = dict.fromkeys(INDEX_FIELDS)
+    try:
+        summary = resolve_prompt(prompt_text)
+    except (TypeError, ValueError):
+        return params
+    chains = summary["chains"]
+    chain = next((c for c in chains if c["positive"]), chains[0] if chains else {})
+    params.update({f: chain.get(f) for f in INDEX_FIELDS})
+    params["positive"] = summary["positive"]
+    if not (params["width"] and params["height"]):
+        params["width"], params["height"] = summary["width"], summary["height"]
+    return params
+
+
+_A1111_SETTING = re.compile(r"\s*([\w ]+):\s*(\"(?:\\.|[^\\\"])*\"|[^,]*)(?:,|$)")
+
+
+def parse_a1111_parameters(text):
+    """Generation parameters from an A1111-style `parameters` string.
+
+    "<positive>\\nNegative prompt: <negative>\\nSteps: 20, Sampler: Euler, Seed: 1, Size: 512x768, Model: name"
+    """
+    params = dict.fromkeys(INDEX_FIELDS)
+    lines = text.strip().split("\n")
+    settings = {}
+    if lines and lines[-1].lstrip().startswith("Steps:"):
+        settings = {k.strip(): v.strip() for k, v in _A1111_SETTING.findall(lines.pop())}
+    positive, negative = [], None
+    for line in lines:
+        if line.startswith("Negative prompt:"):
+            negative = [line[len("Negative prompt:"):].strip()]
+        elif negative is not None:
+            negative.append(line)
+        else:
+            positive.append(line)
+    params["positive"] = "\n".join(positive).strip() or None
+    params["negative"] = "\n".join(negative).strip() if negative else None
+    params["sampler"] = settings.get("Sampler") or None
+    params["model"] = settings.get("Model") or None
+    if settings.get("Seed", "").isdigit():
+        params["seed"] = int(settings["Seed"])
+    size = re.fullmatch(r"(\d+)x(\d+)", settings.get("Size", ""))
+    if size:
+        params["width"], params["height"] = int(size.group(1)), int(size.group(2))
+    return params
+
+
+def read_file_params(path):
+    """Index record of one file: path, bytes, mtime_ns and INDEX_FIELDS.
+
+    Runs in a worker process. Files without generation metadata get empty
+    fields. Raises OSError if the file cannot be read.
+    """
+    st = os.stat(path)
+    record = {"path": path, "bytes": st.st_size, "mtime_ns": st.st_mtime_ns}
+    record.update(dict.fromkeys(INDEX_FIELDS))
+    header = read_image_header(path)
+    if header is None:
+        return record
+    text = header["text"]
+    if isinstance(text.get("prompt"), str):
+        record.update(parse_generation_params(text["prompt"]))
+    elif isinstance(text.get("parameters"), str):
+        record.update(parse_a1111_parameters(text["parameters"]))
+    return record
+
+
+def collect_image_paths(roots, exclude=()):
+    """Absolute paths of indexable images under `roots` (hidden folders skipped)."""
+    excluded = {os.path.abspath(p) for p in exclude}
+    paths = []
+    stack = [os.path.abspath(r) for r in roots]
+    while stack:
+        folder = stack.pop()
+        if folder in excluded:
+            continue
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            if not entry.name.startswith("."):
+                                stack.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in INDEX_EXTENSIONS:
+                            paths.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return sorted(set(paths))
+
+
+def _read_chunk(pool, paths):
+    # Unreadable files come back as None, so one bad file does not fail the chunk
+    records, failed = [], 0
+    if pool is not None:
+        results = pool.map(_read_file_quietly, paths, chunksize=16)
+    else:
+        results = map(_read_file_quietly, paths)
+    for record in results:
+        if record is None:
+            failed += 1
+        else:
+            records.append(record)
+    return records, failed
+
+
+def _read_file_quietly(path):
+    try:
+        return read_file_params(path)
+    except (OSError, ValueError):
+        return None
+
+
+def index_files(manager, paths, scope=(), workers=INDEX_WORKERS, on_progress=None, check_cancelled=None):
+    """Index `paths` into `manager` (a MetadataManager); only new or changed files are read.
+
+    Rows of files under the `scope` folders that are no longer in `paths`
+    are removed. `on_progress(done, total)` is called after each chunk and
+    `check_cancelled()` may raise to stop between chunks. Returns counts.
+    """
+    stamps = manager.get_generation_stamps()
+    todo = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if stamps.get(path) != (st.st_size, st.st_mtime_ns):
+            todo.append(path)
+
+    present = set(paths)
+    prefixes = tuple(os.path.join(os.path.abspath(s), "") for s in scope)
+    gone = [p for p in stamps if p not in present and prefixes and p.startswith(prefixes)]
+    removed = manager.remove_generation_params(gone)
+
+    summary = {"files": len(paths), "read": 0, "with_params": 0, "failed": 0, "removed": removed}
+    pool = None
+    if workers > 1 and len(todo) > INDEX_CHUNK // 4:
+        if worker_pools.processes_enabled():
+            pool = ProcessPoolExecutor(max_workers=workers)
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eros-prompt-index")
+    try:
+        for start in range(0, len(todo), INDEX_CHUNK):
+            if check_cancelled:
+                check_cancelled()
+            chunk = todo[start:start + INDEX_CHUNK]
+            try:
+                records, failed = _read_chunk(pool, chunk)
+            except (BrokenProcessPool, pickle.PicklingError) as e:
+                # Same fallback as thumbnails, remembered for the next runs
+                worker_pools.mark_unavailable("PromptIndex", e)
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eros-prompt-index")
+                records, failed = _read_chunk(pool, chunk)
+            manager.upsert_generation_params(records)
+            summary["read"] += len(records)
+            summary["failed"] += failed
+            summary["with_params"] += sum(1 for r in records if any(r[f] is not None for f in INDEX_FIELDS))
+            if on_progress:
+                on_progress(min(start + INDEX_CHUNK, len(todo)), len(todo))
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    # Make the prompts of cataloged maps searchable (/eros/search)
+    summary["prompts_filled"] = manager.fill_image_prompts()
+    return summary
+
+
+def main(argv=None):
+    """Command line: python prompt_index.py [--db metadata.db] FOLDER [FOLDER ...]"""
+    parser = argparse.ArgumentParser(description="Index generation parameters of images into metadata.db.")
+    parser.add_argument("folders", nargs="+", help="folders to index (recursively)")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.realpath(__file__)), "metadata.db"),
+                        help="metadata database (default: the one next to this script)")
+    parser.add_argument("--exclude", action="append", default=[], help="folder to skip (repeatable)")
+    parser.add_argument("--workers", type=int, default=INDEX_WORKERS, help="worker processes")
+    args = parser.parse_args(argv)
+
+    from metadata_manager import MetadataManager
+
+    # A script re-imports cleanly in spawned workers, unlike the custom node
+    worker_pools.configure(True)
+    manager = MetadataManager(args.db)
+    try:
+        paths = collect_image_paths(args.folders, exclude=args.exclude)
+        print(f"[PromptIndex] {len(paths)} image(s) found")
+
+        def progress(done, total):
+            print(f"[PromptIndex] {done}/{total} read", end="\r" if done < total else "\n", flush=True)
+
+        summary = index_files(manager, paths, scope=args.folders, workers=args.workers, on_progress=progress)
+        print(f"[PromptIndex] Done: {json.dumps(summary)}")
+    finally:
+        manager.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
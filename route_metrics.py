@@ -0,0 +1,253 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import threading
+import time
+
+from aiohttp import web
+
+# Latency buckets in seconds (Prometheus `le` bounds; +Inf is implicit)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PHASES = ("sqlite", "fs", "encode")
+SLOW_LOG_SIZE = 100
+
+_request_stats = contextvars.ContextVar("eros_request_stats", default=None)
+_phase_frame = contextvars.ContextVar("eros_phase_frame", default=None)
+
+
+class _RequestStats:
+    """Phase time of one request; filled from the loop and from I/O workers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def phase(name, inherit=False):
+    """Attribute the enclosed time to `name` for the current /eros request.
+
+    Nested phases are subtracted from the enclosing one, so SQLite time
+    inside a filesystem walk is only counted as SQLite; with `inherit` the
+    time stays with an enclosing phase if there is one. A no-op outside a
+    request, and across threads only when the context was copied (run_io).
+    """
+    stats = _request_stats.get()
+    parent = _phase_frame.get()
+    if stats is None or (inherit and parent is not None):
+        yield
+        return
+    frame = [0.0]  # time spent in nested phases
+    token = _phase_frame.set(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _phase_frame.reset(token)
+        stats.add(name, max(0.0, elapsed - frame[0]))
+        if parent is not None:
+            parent[0] += elapsed
+
+
+class _RouteSeries:
+    __slots__ = ("statuses", "buckets", "latency_sum", "count", "bytes_sent", "phases")
+
+    def __init__(self):
+        self.statuses = collections.Counter()
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.count = 0
+        self.bytes_sent = 0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RouteMetrics:
+    """Per-route request metrics for this package's aiohttp routes.
+
+    `middleware` records request counts by status, a latency histogram of
+    the handler, response bytes (counted once the body was written) and the
+    time spent per phase (see `phase`). `render()` produces the Prometheus
+    text exposition format. Requests slower than `slow_request_ms` (0
+    disables it) are logged with their query parameters and kept in `slow`.
+    """
+
+    def __init__(self, prefix="/eros/", slow_request_ms=0):
+        self.prefix = prefix
+        self.slow_request_ms = slow_request_ms
+        self.slow = collections.deque(maxlen=SLOW_LOG_SIZE)
+        self._lock = threading.Lock()
+        self._series = {}  # (route, method) -> _RouteSeries
+        self._in_flight = 0
+        self.middleware = self._make_middleware()
+
+    def _make_middleware(self):
+        @web.middleware
+        async def eros_metrics_middleware(request, handler):
+            if not request.path.startswith(self.prefix):
+                return await handler(request)
+            resource = request.match_info.route.resource
+            route = resource.canonical if resource is not None else "unmatched"
+            stats = _RequestStats()
+            token = _request_stats.set(stats)
+            status = 500
+            response = None
+            with self._lock:
+                self._in_flight += 1
+            start = time.perf_counter()
+            try:
+                response = await handler(request)
+                status = response.status
+                return response
+            except web.HTTPException as e:
+                status = e.status
+                raise
+            except asyncio.CancelledError:
+                status = 499  # client went away
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                _request_stats.reset(token)
+                with self._lock:
+                    self._in_flight -= 1
+                self._observe(route, request.method, status, elapsed, stats.phases)
+                if response is not None:
+                    self._count_bytes(route, request.method, response)
+                if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+                    self._log_slow(request, route, status, elapsed, stats.phases)
+
+        return eros_metrics_middleware
+
+    def _get_series(self, route, method):
+        key = (route, method)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _RouteSeries()
+        return series
+
+    def _observe(self, route, method, status, elapsed, phases):
+        with self._lock:
+            series = self._get_series(route, method)
+            series.statuses[status] += 1
+            series.count += 1
+            series.latency_sum += elapsed
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    series.buckets[i] += 1
+                    break
+            else:
+                series.buckets[-1] += 1
+            for name, seconds in phases.items():
+                series.phases[name] = series.phases.get(name, 0.0) + seconds
+
+    def _add_bytes(self, route, method, count):
+        with self._lock:
+            self._get_series(route, method).bytes_sent += count
+
+    def _count_bytes(self, route, method, response):
+        if response.prepared:
+            # Streamed by the handler (exports): already written
+            self._add_bytes(route, method, response.body_length)
+            return
+        write_eof = response.write_eof
+
+        async def counting_write_eof(data=b""):
+            try:
+                return await write_eof(data)
+            finally:
+                self._add_bytes(route, method, response.body_length)
+
+        try:
+            response.write_eof = counting_write_eof
+        except AttributeError:
+            # Response classes with __slots__: count the declared length
+            self._add_bytes(route, method, response.content_length or 0)
+
+    def _log_slow(self, request, route, status, elapsed, phases):
+        entry = {
+            "at": time.time(),
+            "method": request.method,
+            "route": route,
+            "path": request.path,
+            "query": dict(request.rel_url.query),
+            "status": status,
+            "ms": round(elapsed * 1000, 1),
+            "phases_ms": {k: round(v * 1000, 1) for k, v in phases.items()},
+        }
+        self.slow.append(entry)
+        spent = " ".join(f"{k}={v}ms" for k, v in entry["phases_ms"].items())
+        print(
+            f"[Metrics] Slow request {request.method} {request.path} {entry['ms']}ms "
+            f"status={status} {spent} query={entry['query']}"
+        )
+
+    def render(self):
+        """Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            series = sorted(self._series.items())
+            in_flight = self._in_flight
+            lines = [
+                "# HELP eros_http_requests_total Requests handled, by route, method and status.",
+                "# TYPE eros_http_requests_total counter",
+            ]
+            for (route, method), s in series:
+                for status, count in sorted(s.statuses.items()):
+                    lines.append(
+                        f'eros_http_requests_total{{route="{_label(route)}",method="{method}",status="{status}"}} {count}'
+                    )
+
+            lines += [
+                "# HELP eros_http_request_duration_seconds Handler latency.",
+                "# TYPE eros_http_request_duration_seconds histogram",
+            ]
+            for (route, method), s in series:
+                labels = f'route="{_label(route)}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, s.buckets):
+                    cumulative += count
+                    lines.append(f'eros_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'eros_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {s.count}')
+                lines.append(f"eros_http_request_duration_seconds_sum{{{labels}}} {s.latency_sum:.6f}")
+                lines.append(f"eros_http_request_duration_seconds_count{{{labels}}} {s.count}")
+
+            lines += [
+                "# HELP eros_http_response_bytes_total Response body bytes sent.",
+                "# TYPE eros_http_response_bytes_total counter",
+            ]
+            for (route, method), s in series:
+                lines.append(
+                    f'eros_http_response_bytes_total{{route="{_label(route)}",method="{method}"}} {s.bytes_sent}'
+                )
+
+            lines += [
+                "# HELP eros_http_phase_seconds_total Time spent in SQLite, filesystem and encoding work.",
+                "# TYPE eros_http_phase_seconds_total counter",
+            ]
+            for (route, method), s in series:
+                for name, seconds in sorted(s.phases.items()):
+                    lines.append(
+                        f'eros_http_phase_seconds_total{{route="{_label(route)}",method="{method}",phase="{name}"}} '
+                        f"{seconds:.6f}"
+                    )
+
+            lines += [
+                "# HELP eros_http_requests_in_flight Requests being handled.",
+                "# TYPE eros_http_requests_in_flight gauge",
+                f"eros_http_requests_in_flight {in_flight}",
+            ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,12 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import os
+import sys
+
+# The package __init__ needs a running ComfyUI; the stdlib-only modules under
+# test are imported directly from the repository root instead.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
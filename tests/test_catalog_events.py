@@ -0,0 +1,70 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import threading
+import time
+
+from catalog_events import CatalogEventBus
+from metadata_manager import MetadataManager
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_flushes_reuse_one_reader_connection(tmp_path):
+    manager = MetadataManager(str(tmp_path / "metadata.db"))
+    root = str(tmp_path / "maps")
+    sent = []
+    bus = CatalogEventBus(manager, lambda event, payload: sent.append(payload), window=0.01)
+    manager.add_commit_listener(bus.touch)
+    try:
+        for i in range(20):
+            manager.upsert_image_file(f"img{i}", root, "depth", f"{root}/depth/img{i}.png", 1, 1.0)
+            assert _wait_for(lambda: len(sent) > i)
+        # The caller's and the bus worker's connections only
+        assert len(manager._readers) <= 2
+        assert sent[-1]["root"] == root
+    finally:
+        manager.close()
+
+
+def test_connections_of_ended_threads_are_closed(tmp_path):
+    manager = MetadataManager(str(tmp_path / "metadata.db"))
+    try:
+        for _ in range(10):
+            t = threading.Thread(target=manager.get_catalog_head)
+            t.start()
+            t.join()
+        manager.get_catalog_head()
+        assert len(manager._readers) <= 2
+    finally:
+        manager.close()
+
+
+def test_deleted_image_logs_its_tag_removal(tmp_path):
+    manager = MetadataManager(str(tmp_path / "metadata.db"))
+    root = str(tmp_path / "maps")
+    try:
+        manager.upsert_image_file("cat", root, "depth", f"{root}/depth/cat.png", 1, 1.0)
+        assert manager.add_tags_to_image("cat", ["animal", "pet"])
+        _, since = manager.get_catalog_head()
+        # The image_tags rows go by ON DELETE CASCADE, after the image row
+        manager._write(lambda conn: conn.execute("DELETE FROM images WHERE basename = 'cat'"))
+        delta = manager.get_catalog_delta(root, since)
+        assert delta["full"] is False
+        assert delta["image_tags"] == {"cat": []}
+        basenames = manager._read_conn().execute(
+            "SELECT basename FROM catalog_changes WHERE kind = 'image' AND version > ?", (since,)
+        ).fetchall()
+        assert basenames == [("cat",)]
+    finally:
+        manager.close()
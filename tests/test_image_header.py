@@ -0,0 +1,219 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import json
+import struct
+import zlib
+
+from image_header import (
+    TAG_EXIF_IFD,
+    TAG_MAKE,
+    TAG_MODEL,
+    TAG_ORIENTATION,
+    TAG_USER_COMMENT,
+    oriented_size,
+    read_image_header,
+)
+
+PROMPT = json.dumps({"3": {"class_type": "KSampler", "inputs": {"seed": 1}}})
+WORKFLOW = json.dumps({"nodes": [], "links": []})
+
+
+# ----- fixture builders -----
+
+def _png_chunk(ctype, data):
+    return struct.pack(">I", len(data)) + ctype + data + struct.pack(">I", zlib.crc32(ctype + data))
+
+
+def _png(width, height, chunks=(), trailing=()):
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    pixels = zlib.compress(b"\0" + b"\0" * 3 * width)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", ihdr)
+        + b"".join(_png_chunk(t, d) for t, d in chunks)
+        + _png_chunk(b"IDAT", pixels)
+        + b"".join(_png_chunk(t, d) for t, d in trailing)
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def _tiff(order, ifd0, exif_ifd=()):
+    """TIFF block with IFD0 and an optional Exif IFD: entries are (tag, type, count, payload)."""
+    o = "<" if order == b"II" else ">"
+
+    def ifd_size(entries):
+        return 2 + 12 * len(entries) + 4
+
+    ifd0 = list(ifd0)
+    if exif_ifd:
+        ifd0.append((TAG_EXIF_IFD, 4, 1, None))  # offset filled in below
+    data_start = 8 + ifd_size(ifd0)
+    data_area = b""
+    exif_offset = None
+    if exif_ifd:
+        exif_offset = data_start
+        exif_data_start = exif_offset + ifd_size(exif_ifd)
+        exif_block, exif_area = _ifd(o, exif_ifd, exif_data_start)
+        data_area = exif_block + exif_area
+    ifd0 = [(t, ty, n, struct.pack(o + "I", exif_offset) if p is None else p) for t, ty, n, p in ifd0]
+    ifd0_block, ifd0_area = _ifd(o, ifd0, data_start + len(data_area))
+    return order + struct.pack(o + "HI", 42, 8) + ifd0_block + data_area + ifd0_area
+
+
+def _ifd(o, entries, data_offset):
+    block = struct.pack(o + "H", len(entries))
+    area = b""
+    for tag, typ, count, payload in entries:
+        if len(payload) <= 4:
+            value = payload.ljust(4, b"\0")
+        else:
+            value = struct.pack(o + "I", data_offset + len(area))
+            area += payload + (b"\0" if len(payload) & 1 else b"")
+        block += struct.pack(o + "HHI", tag, typ, count) + value
+    return block + struct.pack(o + "I", 0), area
+
+
+def _ascii(tag, text):
+    raw = text.encode("utf-8") + b"\0"
+    return (tag, 2, len(raw), raw)
+
+
+def _short(o, tag, value):
+    return (tag, 3, 1, struct.pack(o + "H", value))
+
+
+def _webp(chunks):
+    body = b"WEBP" + b"".join(
+        ctype + struct.pack("<I", len(data)) + data + (b"\0" if len(data) & 1 else b"") for ctype, data in chunks
+    )
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def _vp8(width, height):
+    return b"\x10\x02\x00" + b"\x9d\x01\x2a" + struct.pack("<HH", width, height) + b"\0" * 8
+
+
+def _vp8l(width, height):
+    return b"\x2f" + ((width - 1) | ((height - 1) << 14)).to_bytes(4, "little") + b"\0" * 4
+
+
+def _jpeg(width, height, segments=()):
+    def segment(marker, data):
+        return b"\xff" + bytes([marker]) + struct.pack(">H", len(data) + 2) + data
+
+    sof = struct.pack(">BHHB", 8, height, width, 3) + b"\x01\x11\x00\x02\x11\x00\x03\x11\x00"
+    return (
+        b"\xff\xd8"
+        + b"".join(segment(m, d) for m, d in segments)
+        + segment(0xC0, sof)
+        + segment(0xDA, b"\x03\x01\x00\x02\x11\x03\x11\x00\x3f\x00")
+        + b"\x00" * 16
+        + b"\xff\xd9"
+    )
+
+
+def _write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+# ----- PNG -----
+
+def test_png_text_chunks(tmp_path):
+    itxt = b"workflow\0\x01\0\0\0" + zlib.compress(WORKFLOW.encode("utf-8"))
+    data = _png(
+        640, 480,
+        chunks=[
+            (b"tEXt", b"prompt\0" + PROMPT.encode("latin-1")),
+            (b"iTXt", itxt),
+            (b"zTXt", b"parameters\0\0" + zlib.compress(b"a cat\nSteps: 20")),
+        ],
+        trailing=[(b"tEXt", b"late\0ignored")],
+    )
+    header = read_image_header(_write(tmp_path, "a.png", data))
+    assert header["format"] == "PNG"
+    assert (header["width"], header["height"]) == (640, 480)
+    assert header["text"]["prompt"] == PROMPT
+    assert header["text"]["workflow"] == WORKFLOW
+    assert header["text"]["parameters"] == "a cat\nSteps: 20"
+    # Like PIL, text after the pixel data is not read
+    assert "late" not in header["text"]
+
+
+def test_png_exif_orientation(tmp_path):
+    exif = _tiff(b"MM", [_short(">", TAG_ORIENTATION, 6)])
+    header = read_image_header(_write(tmp_path, "r.png", _png(300, 200, chunks=[(b"eXIf", exif)])))
+    assert header["orientation"] == 6
+    assert oriented_size(header) == (200, 300)
+
+
+# ----- WebP -----
+
+def test_webp_vp8(tmp_path):
+    header = read_image_header(_write(tmp_path, "lossy.webp", _webp([(b"VP8 ", _vp8(1024, 768))])))
+    assert header["format"] == "WEBP"
+    assert (header["width"], header["height"]) == (1024, 768)
+    assert header["text"] == {}
+
+
+def test_webp_vp8l(tmp_path):
+    header = read_image_header(_write(tmp_path, "lossless.webp", _webp([(b"VP8L", _vp8l(513, 257))])))
+    assert (header["width"], header["height"]) == (513, 257)
+
+
+def test_webp_vp8x_with_comfyui_exif(tmp_path):
+    # ComfyUI's SaveAnimatedWEBP/SaveWEBM style: prompt in Model, workflow in Make
+    exif = _tiff(b"II", [
+        _ascii(TAG_MODEL, "prompt:" + PROMPT),
+        _ascii(TAG_MAKE, "workflow:" + WORKFLOW),
+        _short("<", TAG_ORIENTATION, 8),
+    ])
+    vp8x = b"\x08\0\0\0" + (1999).to_bytes(3, "little") + (999).to_bytes(3, "little")
+    xmp = b"<x:xmpmeta>prompt</x:xmpmeta>"
+    data = _webp([(b"VP8X", vp8x), (b"VP8 ", _vp8(2000, 1000)), (b"EXIF", b"Exif\0\0" + exif), (b"XMP ", xmp)])
+    header = read_image_header(_write(tmp_path, "extended.webp", data))
+    assert (header["width"], header["height"]) == (2000, 1000)
+    assert header["text"]["prompt"] == PROMPT
+    assert header["text"]["workflow"] == WORKFLOW
+    assert header["text"]["XML:com.adobe.xmp"] == xmp.decode("utf-8")
+    assert oriented_size(header) == (1000, 2000)
+
+
+# ----- JPEG -----
+
+def test_jpeg_exif_user_comment_and_orientation(tmp_path):
+    # A1111 via piexif: big-endian UTF-16 user comment in the Exif IFD
+    comment = b"UNICODE\0" + "a cat\nSteps: 20, Seed: 5".encode("utf-16-be")
+    exif = _tiff(
+        b"II",
+        [_short("<", TAG_ORIENTATION, 6)],
+        exif_ifd=[(TAG_USER_COMMENT, 7, len(comment), comment)],
+    )
+    data = _jpeg(800, 600, segments=[(0xE1, b"Exif\0\0" + exif), (0xFE, b"hello")])
+    header = read_image_header(_write(tmp_path, "a.jpg", data))
+    assert header["format"] == "JPEG"
+    assert (header["width"], header["height"]) == (800, 600)
+    assert header["orientation"] == 6
+    assert oriented_size(header) == (600, 800)
+    assert header["text"]["parameters"] == "a cat\nSteps: 20, Seed: 5"
+    assert header["text"]["comment"] == "hello"
+
+
+def test_jpeg_without_metadata(tmp_path):
+    header = read_image_header(_write(tmp_path, "plain.jpeg", _jpeg(64, 32)))
+    assert (header["width"], header["height"], header["orientation"]) == (64, 32, 1)
+    assert header["text"] == {}
+
+
+# ----- other files -----
+
+def test_unknown_and_truncated_files(tmp_path):
+    assert read_image_header(_write(tmp_path, "notes.txt", b"hello world")) is None
+    truncated = _png(10, 10)[:20]
+    assert read_image_header(_write(tmp_path, "cut.png", truncated)) is None
+    assert read_image_header(_write(tmp_path, "cut.jpg", _jpeg(10, 10)[:12])) is None
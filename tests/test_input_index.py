@@ -0,0 +1,34 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+from input_index import iter_file_batches
+
+IMAGES = {".png", ".jpg"}
+
+
+def _folder(tmp_path, count):
+    for i in range(count):
+        (tmp_path / f"map{i:03d}.png").write_bytes(b"x" * i)
+    (tmp_path / "notes.txt").write_text("skip me")
+    (tmp_path / "sub.png").mkdir()
+    return str(tmp_path)
+
+
+def test_sort_none_without_limit(tmp_path):
+    # fetch_files?format=ndjson&sort=none as sent by streamFiles(): no limit
+    batches = list(iter_file_batches(_folder(tmp_path, 600), IMAGES, None))
+    assert [len(b) for b in batches] == [256, 256, 88]
+    names = sorted(e["name"] for b in batches for e in b)
+    assert names == [f"map{i:03d}.png" for i in range(600)]
+    sizes = {e["name"]: e["bytes"] for b in batches for e in b}
+    assert sizes["map010.png"] == 10
+
+
+def test_limit(tmp_path):
+    folder = _folder(tmp_path, 600)
+    assert sum(len(b) for b in iter_file_batches(folder, IMAGES, 300)) == 300
+    assert sum(len(b) for b in iter_file_batches(folder, IMAGES, 256)) == 256
+    assert list(iter_file_batches(folder, IMAGES, 0)) == []
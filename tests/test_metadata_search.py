@@ -0,0 +1,46 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import pytest
+
+from metadata_manager import MetadataManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = MetadataManager(str(tmp_path / "metadata.db"))
+    root = str(tmp_path / "maps")
+    manager.upsert_image_file("portrait_v2-final03", root, "depth", f"{root}/depth/portrait_v2-final03.png", 1, 1.0)
+    manager.upsert_image_file(
+        "landscape", root, "depth", f"{root}/depth/landscape.png", 1, 1.0, prompt="castle v2 on a hill"
+    )
+    yield manager
+    manager.close()
+
+
+def _hits(manager, text):
+    return [item["basename"] for item in manager.search_images(text)["items"]]
+
+
+@pytest.mark.parametrize("text", [
+    "portrait_v2-final03",  # the literal file stem
+    "portrait_v2",
+    "portrait v2",
+    "final03",
+    "final 03",
+    "portrait",
+])
+def test_search_by_file_stem(manager, text):
+    assert _hits(manager, text) == ["portrait_v2-final03"]
+
+
+def test_unsplit_words_still_match_prompts(manager):
+    assert _hits(manager, "v2 castle") == ["landscape"]
+
+
+def test_no_match(manager):
+    assert _hits(manager, "portrait_v3") == []
+    assert _hits(manager, "") == []
@@ -0,0 +1,151 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import json
+
+import pytest
+
+from prompt_graph import PromptGraph, resolve_prompt
+
+
+def _node(class_type, **inputs):
+    return {"class_type": class_type, "inputs": inputs}
+
+
+def _basic_graph():
+    # Default ComfyUI text-to-image workflow, API format
+    return {
+        "4": _node("CheckpointLoaderSimple", ckpt_name="sd_xl_base_1.0.safetensors"),
+        "5": _node("EmptyLatentImage", width=832, height=1216, batch_size=1),
+        "6": _node("CLIPTextEncode", text="a lighthouse at dusk", clip=["4", 1]),
+        "7": _node("CLIPTextEncode", text="blurry", clip=["4", 1]),
+        "3": _node(
+            "KSampler",
+            seed=1234, steps=20, cfg=7.0, sampler_name="dpmpp_2m", scheduler="karras", denoise=1.0,
+            model=["4", 0], positive=["6", 0], negative=["7", 0], latent_image=["5", 0],
+        ),
+        "8": _node("VAEDecode", samples=["3", 0], vae=["4", 2]),
+        "9": _node("SaveImage", images=["8", 0], filename_prefix="ComfyUI"),
+    }
+
+
+def test_basic_sampler_chain():
+    (chain,) = PromptGraph(_basic_graph()).chains()
+    assert chain["id"] == "3"
+    assert chain["positive"] == "a lighthouse at dusk"
+    assert chain["negative"] == "blurry"
+    assert chain["seed"] == 1234
+    assert chain["sampler"] == "dpmpp_2m"
+    assert chain["model"] == "sd_xl_base_1.0.safetensors"
+    assert (chain["width"], chain["height"]) == (832, 1216)
+
+
+def test_reroute_primitive_and_concat_chain():
+    prompt = _basic_graph()
+    prompt.update({
+        "20": _node("PrimitiveString", value="portrait of an old sailor"),
+        "21": _node("Reroute", input=["20", 0]),
+        "22": _node("StringConcatenate", string_a=["21", 0], string_b="oil painting", delimiter=", "),
+        "23": _node("Reroute", input=["22", 0]),
+        "24": _node("PrimitiveInt", value=99),
+    })
+    prompt["6"]["inputs"]["text"] = ["23", 0]
+    prompt["3"]["inputs"]["seed"] = ["24", 0]
+
+    (chain,) = PromptGraph(prompt).chains()
+    assert chain["positive"] == "portrait of an old sailor, oil painting"
+    assert chain["seed"] == 99
+
+
+def test_conditioning_combine_and_controlnet():
+    prompt = _basic_graph()
+    prompt.update({
+        "30": _node("CLIPTextEncode", text="red coat", clip=["4", 1]),
+        "31": _node("ConditioningCombine", conditioning_1=["6", 0], conditioning_2=["30", 0]),
+        "32": _node("ControlNetLoader", control_net_name="depth.safetensors"),
+        "33": _node(
+            "ControlNetApplyAdvanced",
+            positive=["31", 0], negative=["7", 0], control_net=["32", 0], image=["5", 0], strength=0.8,
+        ),
+    })
+    prompt["3"]["inputs"]["positive"] = ["33", 0]
+    prompt["3"]["inputs"]["negative"] = ["33", 1]
+
+    (chain,) = PromptGraph(prompt).chains()
+    assert chain["positive"] == "a lighthouse at dusk\nred coat"
+    assert chain["negative"] == "blurry"
+
+
+def test_guider_sampler():
+    prompt = {
+        "1": _node("UNETLoader", unet_name="flux1-dev.safetensors", weight_dtype="default"),
+        "2": _node("CLIPTextEncode", text="a fox in the snow", clip=["9", 0]),
+        "3": _node("BasicGuider", model=["1", 0], conditioning=["2", 0]),
+        "4": _node("RandomNoise", noise_seed=42),
+        "5": _node("KSamplerSelect", sampler_name="euler"),
+        "6": _node("BasicScheduler", model=["1", 0], scheduler="simple", steps=20, denoise=1.0),
+        "7": _node("EmptySD3LatentImage", width=1024, height=768, batch_size=1),
+        "8": _node(
+            "SamplerCustomAdvanced",
+            noise=["4", 0], guider=["3", 0], sampler=["5", 0], sigmas=["6", 0], latent_image=["7", 0],
+        ),
+        "9": _node("DualCLIPLoader", clip_name1="t5xxl.safetensors", clip_name2="clip_l.safetensors"),
+    }
+    graph = PromptGraph(prompt)
+    # KSamplerSelect only picks a sampler
+    assert graph.samplers == ["8"]
+    (chain,) = graph.chains()
+    assert chain["positive"] == "a fox in the snow"
+    assert chain["negative"] is None
+    assert chain["seed"] == 42
+    assert chain["sampler"] == "euler"
+    assert chain["model"] == "flux1-dev.safetensors"
+    assert (chain["width"], chain["height"]) == (1024, 768)
+
+
+def test_cycles_do_not_loop():
+    prompt = _basic_graph()
+    prompt.update({
+        "40": _node("Reroute", input=["41", 0]),
+        "41": _node("Reroute", input=["40", 0]),
+    })
+    prompt["6"]["inputs"]["text"] = ["40", 0]
+    prompt["3"]["inputs"]["seed"] = ["41", 0]
+
+    (chain,) = PromptGraph(prompt).chains()
+    assert chain["positive"] is None
+    assert chain["seed"] is None
+    assert chain["negative"] == "blurry"
+
+
+def test_too_deep_graph_skips_the_sampler():
+    prompt = _basic_graph()
+    depth = 20000
+    for i in range(depth):
+        prompt[f"r{i}"] = _node("Reroute", input=[f"r{i + 1}", 0])
+    prompt[f"r{depth}"] = _node("PrimitiveString", value="deep")
+    prompt["6"]["inputs"]["text"] = ["r0", 0]
+
+    summary = PromptGraph(prompt).summary()
+    assert summary["chains"] == []
+    # Falls back to the latent size like before
+    assert (summary["width"], summary["height"]) == (832, 1216)
+
+
+def test_resolve_prompt_returns_copies():
+    text = json.dumps(_basic_graph())
+    first = resolve_prompt(text)
+    first["chains"][0]["positive"] = "changed"
+    second = resolve_prompt(text)
+    assert second["positive"] == "a lighthouse at dusk"
+    assert second["chains"][0]["positive"] == "a lighthouse at dusk"
+
+
+def test_resolve_prompt_rejects_non_objects():
+    with pytest.raises(ValueError):
+        resolve_prompt("[1, 2, 3]")
+    with pytest.raises(ValueError):
+        resolve_prompt("not json")
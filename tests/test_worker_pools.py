@@ -0,0 +1,39 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import multiprocessing
+
+import pytest
+
+import worker_pools
+
+
+@pytest.fixture(autouse=True)
+def _reset_worker_pools(monkeypatch):
+    monkeypatch.setattr(worker_pools, "_mode", "auto")
+    monkeypatch.setattr(worker_pools, "_unavailable", None)
+
+
+@pytest.mark.parametrize("method, expected", [("fork", True), ("spawn", False), ("forkserver", False)])
+def test_auto_uses_processes_only_under_fork(monkeypatch, method, expected):
+    monkeypatch.setattr(multiprocessing, "get_start_method", lambda allow_none=False: method)
+    assert worker_pools.processes_enabled() is expected
+
+
+def test_explicit_setting_overrides_the_start_method(monkeypatch):
+    monkeypatch.setattr(multiprocessing, "get_start_method", lambda allow_none=False: "spawn")
+    worker_pools.configure(True)
+    assert worker_pools.processes_enabled()
+    worker_pools.configure(False)
+    assert not worker_pools.processes_enabled()
+    worker_pools.configure("sometimes")
+    assert worker_pools.processes_enabled() is False
+
+
+def test_failure_is_remembered(monkeypatch):
+    worker_pools.configure(True)
+    worker_pools.mark_unavailable("Test", RuntimeError("cannot import comfy"))
+    assert not worker_pools.processes_enabled()
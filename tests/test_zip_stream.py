@@ -0,0 +1,120 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import io
+import os
+import struct
+import zipfile
+
+import pytest
+
+from zip_stream import ZipStreamError, iter_zip_stream
+
+# Stored data that looks like a data descriptor, including the signature
+TRICKY = b"start PK\x07\x08" + struct.pack("<III", 0, 12, 12) + b" end" * 50
+
+
+class _Unseekable(io.RawIOBase):
+    """Write-only sink: zipfile then writes data descriptors, like a streamed export."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+
+def _build_zip(entries, seekable=True, force_zip64=False):
+    """entries: (name, data, compress_type)."""
+    sink = io.BytesIO() if seekable else _Unseekable()
+    with zipfile.ZipFile(sink, "w") as zf:
+        for name, data, compress_type in entries:
+            info = zipfile.ZipInfo(name, date_time=(2025, 1, 1, 0, 0, 0))
+            info.compress_type = compress_type
+            with zf.open(info, "w", force_zip64=force_zip64) as f:
+                f.write(data)
+    return bytes(sink.getvalue() if seekable else sink.data)
+
+
+def _reader(data, step=None):
+    stream = io.BytesIO(data)
+    if step is None:
+        return stream.read
+    # Hand out a few bytes at a time so headers and descriptors straddle reads
+    return lambda n: stream.read(min(n, step))
+
+
+def _read_all(read):
+    members = []
+    for member in iter_zip_stream(read):
+        members.append((member.filename, member.has_descriptor, b"".join(member.chunks())))
+    return members
+
+
+ENTRIES = [
+    ("depth/a.png", os.urandom(3000), zipfile.ZIP_STORED),
+    ("canny/b.png", b"lines " * 2000, zipfile.ZIP_DEFLATED),
+    ("db/metadata.db.sqlite", TRICKY, zipfile.ZIP_STORED),
+    ("empty.txt", b"", zipfile.ZIP_STORED),
+]
+
+
+@pytest.mark.parametrize("step", [None, 7])
+def test_seekable_archive(step):
+    members = _read_all(_reader(_build_zip(ENTRIES), step))
+    assert [(n, d) for n, _, d in members] == [(n, d) for n, d, _ in ENTRIES]
+    assert not any(has_descriptor for _, has_descriptor, _ in members)
+
+
+@pytest.mark.parametrize("step", [None, 5, 4096])
+def test_stored_entries_with_data_descriptors(step):
+    data = _build_zip(ENTRIES, seekable=False)
+    members = _read_all(_reader(data, step))
+    assert [(n, d) for n, _, d in members] == [(n, d) for n, d, _ in ENTRIES]
+    assert all(has_descriptor for _, has_descriptor, _ in members)
+
+
+def test_zip64_descriptors():
+    data = _build_zip(ENTRIES, seekable=False, force_zip64=True)
+    members = _read_all(_reader(data, 11))
+    assert [(n, d) for n, _, d in members] == [(n, d) for n, d, _ in ENTRIES]
+
+
+def test_unread_members_are_skipped():
+    names = [m.filename for m in iter_zip_stream(_reader(_build_zip(ENTRIES, seekable=False)))]
+    assert names == [n for n, _, _ in ENTRIES]
+
+
+def test_crc_mismatch():
+    payload = b"0123456789" * 10
+    data = bytearray(_build_zip([("a.bin", payload, zipfile.ZIP_STORED)]))
+    data[data.index(payload) + 5] ^= 0xFF
+    with pytest.raises(ZipStreamError):
+        _read_all(_reader(bytes(data)))
+
+
+def test_encrypted_entry():
+    data = bytearray(_build_zip([("a.bin", b"secret", zipfile.ZIP_STORED)]))
+    flags = struct.unpack_from("<H", data, 6)[0]
+    struct.pack_into("<H", data, 6, flags | 0x01)
+    with pytest.raises(ZipStreamError):
+        _read_all(_reader(bytes(data)))
+
+
+def test_unsupported_compression():
+    data = _build_zip([("a.bin", b"x" * 100, zipfile.ZIP_BZIP2)])
+    with pytest.raises(ZipStreamError):
+        _read_all(_reader(data))
+
+
+def test_truncated_archive():
+    data = _build_zip([("a.bin", os.urandom(500), zipfile.ZIP_STORED)], seekable=False)
+    with pytest.raises(ZipStreamError):
+        _read_all(_reader(data[:300]))
@@ -0,0 +1,350 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import pickle
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import worker_pools
+from .eros_io import run_io
+from .route_metrics import phase
+
+# Thumbnails live next to metadata.db, outside the cache root, so they never
+# show up as a map type in listings, catalog scans or exports.
+THUMB_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), ".thumbs")
+
+# Requested sizes snap up to one of these edges so a grid zoom slider cannot
+# fill the cache with one file per pixel width.
+THUMB_SIZES = (64, 128, 160, 256, 320, 512, 768, 1024)
+THUMB_FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg"), "jpg": ("JPEG", "image/jpeg")}
+THUMB_QUALITY = 80
+
+# Contact sheets (one image per grid page) live under THUMB_DIR/atlas, keyed
+# by the query, the catalog version and the page's files. WebP caps each
+# side at 16383 px.
+ATLAS_DIR = os.path.join(THUMB_DIR, "atlas")
+ATLAS_MAX_TILES = 400
+ATLAS_MAX_EDGE = 16383
+ATLAS_CACHE_MAX = 64
+
+# Encoding is CPU-bound; at most this many thumbnails are generated at once,
+# further requests wait on the event loop. They run on the I/O threads, or in
+# worker processes where worker_pools allows them (fork start method).
+THUMB_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+
+_pool = None
+_semaphore = None
+_inflight = {}
+
+
+def snap_size(size):
+    """Round a requested edge length up to the nearest THUMB_SIZES bucket."""
+    size = int(size)
+    if size <= 0:
+        raise ValueError("size must be positive")
+    for bucket in THUMB_SIZES:
+        if size <= bucket:
+            return bucket
+    return THUMB_SIZES[-1]
+
+
+def _source_key(src_path):
+    return hashlib.sha1(os.path.abspath(src_path).encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def thumbnail_path(src_path, mtime_ns, size, fmt):
+    """Cache location for one rendition: keyed by source path, mtime and size."""
+    key = _source_key(src_path)
+    ext = "jpg" if THUMB_FORMATS[fmt][0] == "JPEG" else "webp"
+    return os.path.join(THUMB_DIR, key[:2], f"{key}_{mtime_ns}_{size}.{ext}")
+
+
+def render_thumbnail(src_path, dst_path, size, pil_format, quality=THUMB_QUALITY):
+    """Decode `src_path`, fit it into a size x size box and write `dst_path`.
+
+    May run in a worker process, so it only depends on PIL. The file is written
+    under a temporary name and renamed, so readers never see a partial image.
+    """
+    from PIL import Image
+
+    with Image.open(src_path) as im:
+        # JPEG can decode at reduced scale directly
+        im.draft("RGB", (size, size))
+        im.thumbnail((size, size), Image.LANCZOS)
+        if pil_format == "JPEG":
+            im = im.convert("RGB")
+        elif im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if "A" in im.getbands() or "transparency" in im.info else "RGB")
+        options = {"quality": quality}
+        if pil_format == "WEBP":
+            options["method"] = 4
+        else:
+            options["optimize"] = True
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        tmp_path = f"{dst_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        im.save(tmp_path, pil_format, **options)
+    os.replace(tmp_path, dst_path)
+    return dst_path
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=THUMB_WORKERS)
+    return _pool
+
+
+async def _render(fn, *args):
+    with phase("encode"):
+        return await _render_in_pool(fn, *args)
+
+
+async def _render_in_pool(fn, *args):
+    global _pool
+    if worker_pools.processes_enabled():
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(_get_pool(), fn, *args)
+        except (BrokenProcessPool, pickle.PicklingError) as e:
+            worker_pools.mark_unavailable("Thumbnails", e)
+            _pool = None
+    return await run_io(fn, *args)
+
+
+async def get_thumbnail(src_path, size, fmt="webp"):
+    """Return the path of a cached thumbnail for `src_path`, rendering it on first use.
+
+    Raises FileNotFoundError if the source is missing and ValueError for a
+    bad size or format. Concurrent requests for the same rendition share one
+    render.
+    """
+    global _semaphore
+    fmt = (fmt or "webp").lower()
+    if fmt not in THUMB_FORMATS:
+        raise ValueError(f"Unsupported thumbnail format '{fmt}'")
+    size = snap_size(size)
+    st = await run_io(os.stat, src_path)
+    dst_path = thumbnail_path(src_path, st.st_mtime_ns, size, fmt)
+    if await run_io(os.path.isfile, dst_path):
+        return dst_path
+
+    task = _inflight.get(dst_path)
+    if task is None:
+        if _semaphore is None:
+            _semaphore = asyncio.Semaphore(THUMB_WORKERS)
+
+        async def produce():
+            try:
+                async with _semaphore:
+                    # Drop renditions of older versions of this file first.
+                    await run_io(invalidate, src_path, keep_mtime_ns=st.st_mtime_ns)
+                    return await _render(render_thumbnail, src_path, dst_path, size, THUMB_FORMATS[fmt][0])
+            finally:
+                _inflight.pop(dst_path, None)
+
+        task = asyncio.ensure_future(produce())
+        _inflight[dst_path] = task
+    return await asyncio.shield(task)
+
+
+def invalidate(src_path, keep_mtime_ns=None):
+    """Delete cached renditions of `src_path`. Returns the count.
+
+    With `keep_mtime_ns`, renditions of that version of the file are kept.
+    """
+    key = _source_key(src_path)
+    keep = f"{key}_{keep_mtime_ns}_" if keep_mtime_ns is not None else None
+    shard = os.path.join(THUMB_DIR, key[:2])
+    removed = 0
+    try:
+        entries = list(os.scandir(shard))
+    except OSError:
+        return 0
+    for entry in entries:
+        if entry.name.startswith(key + "_") and not (keep and entry.name.startswith(keep)):
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def clear():
+    """Drop the whole thumbnail cache."""
+    shutil.rmtree(THUMB_DIR, ignore_errors=True)
+
+
+# ----- Atlases -----
+
+def atlas_grid(count, tile, columns=None):
+    """(columns, rows) for `count` tiles; roughly square unless `columns` is given.
+
+    Raises ValueError when the sheet would exceed ATLAS_MAX_EDGE.
+    """
+    if count > ATLAS_MAX_TILES:
+        raise ValueError(f"At most {ATLAS_MAX_TILES} tiles per atlas")
+    if columns is None:
+        columns = math.ceil(math.sqrt(count)) if count else 1
+    columns = max(1, min(int(columns), max(count, 1)))
+    rows = max(1, math.ceil(count / columns))
+    if columns * tile > ATLAS_MAX_EDGE or rows * tile > ATLAS_MAX_EDGE:
+        raise ValueError(f"Atlas would exceed {ATLAS_MAX_EDGE}px; use fewer tiles, columns or a smaller tile")
+    return columns, rows
+
+
+def atlas_key(*parts):
+    """Stable cache key for an atlas from JSON-serializable parts."""
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(blob.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def atlas_paths(key, fmt):
+    ext = "jpg" if THUMB_FORMATS[fmt][0] == "JPEG" else "webp"
+    return os.path.join(ATLAS_DIR, f"{key}.{ext}"), os.path.join(ATLAS_DIR, f"{key}.json")
+
+
+def render_atlas(sources, dst_path, tile, columns, pil_format, quality=THUMB_QUALITY):
+    """Pack `sources` into a columns-wide grid of tile x tile cells and write `dst_path`.
+
+    Each image is fitted into its cell and centred. Returns one rect per
+    source, `[x, y, w, h]` of the pasted pixels, or None if it could not be
+    decoded. May run in a worker process, so it only depends on PIL.
+    """
+    from PIL import Image
+
+    rows = max(1, math.ceil(len(sources) / columns))
+    opaque = pil_format == "JPEG"
+    sheet = Image.new("RGB" if opaque else "RGBA", (columns * tile, rows * tile), (0, 0, 0) if opaque else (0, 0, 0, 0))
+    rects = []
+    for index, src_path in enumerate(sources):
+        try:
+            with Image.open(src_path) as im:
+                im.draft("RGB", (tile, tile))
+                im.thumbnail((tile, tile), Image.LANCZOS)
+                im = im.convert(sheet.mode)
+                x = (index % columns) * tile + (tile - im.width) // 2
+                y = (index // columns) * tile + (tile - im.height) // 2
+                sheet.paste(im, (x, y))
+                rects.append([x, y, im.width, im.height])
+        except Exception:
+            rects.append(None)
+    options = {"quality": quality}
+    if pil_format == "WEBP":
+        options["method"] = 4
+    else:
+        options["optimize"] = True
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    tmp_path = f"{dst_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    sheet.save(tmp_path, pil_format, **options)
+    os.replace(tmp_path, dst_path)
+    return rects
+
+
+def _atlas_sources(src_paths, tile):
+    """Prefer already cached thumbnails of the tile size over full-size maps."""
+    sources = []
+    for src_path in src_paths:
+        try:
+            st = os.stat(src_path)
+        except OSError:
+            sources.append(src_path)
+            continue
+        for fmt in ("webp", "jpeg"):
+            thumb = thumbnail_path(src_path, st.st_mtime_ns, tile, fmt)
+            if os.path.isfile(thumb):
+                sources.append(thumb)
+                break
+        else:
+            sources.append(src_path)
+    return sources
+
+
+def _prune_atlases(keep=ATLAS_CACHE_MAX):
+    try:
+        entries = [e for e in os.scandir(ATLAS_DIR) if e.name.endswith(".json")]
+    except OSError:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in entries[keep:]:
+        stem = entry.path[:-len(".json")]
+        for path in (entry.path, stem + ".webp", stem + ".jpg"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _read_layout(layout_path, image_path):
+    if not (os.path.isfile(layout_path) and os.path.isfile(image_path)):
+        return None
+    try:
+        with open(layout_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_layout(layout_path, layout):
+    tmp_path = f"{layout_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(layout, f)
+    os.replace(tmp_path, layout_path)
+
+
+async def get_atlas(key, src_paths, tile, columns=None, fmt="webp"):
+    """Return `(image_path, layout)` of the atlas `key`, rendering it on first use.
+
+    `layout` is `{"key", "tile", "columns", "rows", "width", "height",
+    "rects"}` with one `[x, y, w, h]` (or None) per source. The key must
+    change whenever the sources do; concurrent requests share one render.
+    """
+    global _semaphore
+    fmt = (fmt or "webp").lower()
+    if fmt not in THUMB_FORMATS:
+        raise ValueError(f"Unsupported atlas format '{fmt}'")
+    tile = snap_size(tile)
+    columns, rows = atlas_grid(len(src_paths), tile, columns)
+    image_path, layout_path = atlas_paths(key, fmt)
+    layout = await run_io(_read_layout, layout_path, image_path)
+    if layout is not None:
+        return image_path, layout
+
+    task = _inflight.get(image_path)
+    if task is None:
+        if _semaphore is None:
+            _semaphore = asyncio.Semaphore(THUMB_WORKERS)
+
+        async def produce():
+            try:
+                async with _semaphore:
+                    sources = await run_io(_atlas_sources, list(src_paths), tile)
+                    rects = await _render(render_atlas, sources, image_path, tile, columns, THUMB_FORMATS[fmt][0])
+                    result = {
+                        "key": key,
+                        "tile": tile,
+                        "columns": columns,
+                        "rows": rows,
+                        "width": columns * tile,
+                        "height": rows * tile,
+                        "rects": rects,
+                    }
+                    await run_io(_write_layout, layout_path, result)
+                    await run_io(_prune_atlases)
+                    return image_path, result
+            finally:
+                _inflight.pop(image_path, None)
+
+        task = asyncio.ensure_future(produce())
+        _inflight[image_path] = task
+    return await asyncio.shield(task)
@@ -0,0 +1,53 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import multiprocessing
+import threading
+
+# Whether CPU-bound work (thumbnail encoding, prompt index reads) may use
+# worker processes. A spawned or forkserver worker re-imports this package,
+# and with it ComfyUI, which fails outside the ComfyUI process; so threads
+# are the default (PIL releases the GIL while decoding and resizing) and
+# processes are only used under the fork start method, or when forced with
+# "workers": {"processes": true} in eros_config.json. The first failure to
+# start them is remembered, so later jobs do not retry.
+PROCESS_MODES = ("auto", True, False)
+
+_mode = "auto"
+_unavailable = None
+_lock = threading.Lock()
+
+
+def configure(mode):
+    """Set the process mode: "auto" (fork only), True (always) or False (never)."""
+    global _mode
+    if mode not in PROCESS_MODES:
+        print(f"[WorkerPools] Unknown processes setting {mode!r}, using 'auto'")
+        mode = "auto"
+    _mode = mode
+
+
+def _start_method():
+    # allow_none keeps the default context unset, so ComfyUI may still pick one
+    method = multiprocessing.get_start_method(allow_none=True)
+    return method or multiprocessing.get_all_start_methods()[0]
+
+
+def processes_enabled():
+    """True when worker processes may be used for CPU-bound work."""
+    if _unavailable is not None or _mode is False:
+        return False
+    return _mode is True or _start_method() == "fork"
+
+
+def mark_unavailable(owner, error):
+    """Record that worker processes failed to start; threads are used from now on."""
+    global _unavailable
+    with _lock:
+        if _unavailable is not None:
+            return
+        _unavailable = f"{error}"
+    print(f"[{owner}] Process pool unavailable, using threads: {error}")
@@ -0,0 +1,232 @@
+"""
+Author: ErosDiffusion (EF)
+Email: erosdiffusionai+controlnetmaps@gmail.com
+Year: 2025
+"""
+
+import struct
+import zlib
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_LOCAL_SIG = b"PK\x03\x04"
+_CENTRAL_SIG = b"PK\x01\x02"
+_END_SIG = b"PK\x05\x06"
+_DD_SIG = b"PK\x07\x08"
+
+_FLAG_ENCRYPTED = 0x01
+_FLAG_DATA_DESCRIPTOR = 0x08
+
+STORED = 0
+DEFLATED = 8
+
+_CHUNK = 256 * 1024
+
+
+class ZipStreamError(Exception):
+    """The archive cannot be read front to back; fall back to the central directory."""
+
+
+class _Buffered:
+    def __init__(self, read):
+        self._read = read
+        self._buf = b""
+
+    def fill(self, n):
+        """Make at least n bytes available (fewer at EOF)."""
+        while len(self._buf) < n:
+            chunk = self._read(max(_CHUNK, n - len(self._buf)))
+            if not chunk:
+                break
+            self._buf += chunk
+        return len(self._buf) >= n
+
+    def peek(self, n):
+        self.fill(n)
+        return self._buf[:n]
+
+    def take(self, n):
+        if not self.fill(n):
+            raise ZipStreamError("Unexpected end of archive")
+        data, self._buf = self._buf[:n], self._buf[n:]
+        return data
+
+    def take_some(self, limit=_CHUNK):
+        if not self._buf:
+            self.fill(1)
+        data, self._buf = self._buf[:limit], self._buf[limit:]
+        return data
+
+    def unread(self, data):
+        self._buf = data + self._buf
+
+
+class ZipStreamMember:
+    """One local entry. Iterate `chunks()` to completion before asking for the next member."""
+
+    def __init__(self, source, name, method, flags, crc, compress_size, file_size, zip64):
+        self._source = source
+        self.filename = name
+        self.method = method
+        self.flags = flags
+        self.crc = crc
+        self.compress_size = compress_size
+        self.file_size = file_size
+        self._zip64 = zip64
+        self._consumed = False
+
+    @property
+    def has_descriptor(self):
+        return bool(self.flags & _FLAG_DATA_DESCRIPTOR)
+
+    def chunks(self):
+        """Yield the uncompressed data; the CRC is verified at the end."""
+        if self._consumed:
+            return
+        self._consumed = True
+        if self.method == DEFLATED:
+            gen = self._inflate()
+        elif not self.has_descriptor:
+            gen = self._read_exact(self.compress_size)
+        else:
+            gen = self._scan_stored()
+        crc = 0
+        for chunk in gen:
+            crc = zlib.crc32(chunk, crc)
+            yield chunk
+        if self.has_descriptor:
+            self._read_descriptor()
+        if crc != self.crc:
+            raise ZipStreamError(f"CRC mismatch for {self.filename}")
+
+    def skip(self):
+        for _ in self.chunks():
+            pass
+
+    def _read_exact(self, remaining):
+        while remaining > 0:
+            chunk = self._source.take_some(min(remaining, _CHUNK))
+            if not chunk:
+                raise ZipStreamError("Unexpected end of archive")
+            remaining -= len(chunk)
+            yield chunk
+
+    def _inflate(self):
+        inflater = zlib.decompressobj(-15)
+        remaining = None if self.has_descriptor else self.compress_size
+        while not inflater.eof:
+            limit = _CHUNK if remaining is None else min(remaining, _CHUNK)
+            if limit == 0:
+                raise ZipStreamError(f"Truncated deflate stream for {self.filename}")
+            chunk = self._source.take_some(limit)
+            if not chunk:
+                raise ZipStreamError("Unexpected end of archive")
+            if remaining is not None:
+                remaining -= len(chunk)
+            out = inflater.decompress(chunk)
+            if out:
+                yield out
+        if inflater.unused_data:
+            self._source.unread(inflater.unused_data)
+        tail = inflater.flush()
+        if tail:
+            yield tail
+
+    def _descriptor_size(self):
+        return 24 if self._zip64 else 16
+
+    def _scan_stored(self):
+        """Stored data of unknown length: ends at a descriptor whose size and CRC match."""
+        dd_size = self._descriptor_size()
+        size_fmt = "<Q" if self._zip64 else "<I"
+        size_len = 8 if self._zip64 else 4
+        window = b""
+        emitted = 0
+        crc = 0
+        while True:
+            chunk = self._source.take_some()
+            if not chunk:
+                raise ZipStreamError(f"No data descriptor found for {self.filename}")
+            window += chunk
+            start = 0
+            while True:
+                pos = window.find(_DD_SIG, start)
+                if pos == -1 or pos + dd_size > len(window):
+                    break
+                (dd_crc,) = struct.unpack_from("<I", window, pos + 4)
+                (dd_csize,) = struct.unpack_from(size_fmt, window, pos + 8)
+                if dd_csize == emitted + pos and dd_crc == zlib.crc32(window[:pos], crc):
+                    if pos:
+                        yield window[:pos]
+                    (dd_usize,) = struct.unpack_from(size_fmt, window, pos + 8 + size_len)
+                    self.crc, self.compress_size, self.file_size = dd_crc, dd_csize, dd_usize
+                    # Put the descriptor back for _read_descriptor
+                    self._source.unread(window[pos:])
+                    return
+                start = pos + 1
+            # Everything except a possible partial descriptor is data
+            keep = max(0, len(window) - (dd_size - 1))
+            pending = window.find(_DD_SIG, start)
+            if pending != -1:
+                keep = min(keep, pending)
+            if keep:
+                out, window = window[:keep], window[keep:]
+                crc = zlib.crc32(out, crc)
+                emitted += len(out)
+                yield out
+
+    def _read_descriptor(self):
+        head = self._source.peek(4)
+        if head == _DD_SIG:
+            self._source.take(4)
+        body = self._source.take(20 if self._zip64 else 12)
+        fmt = "<IQQ" if self._zip64 else "<III"
+        self.crc, self.compress_size, self.file_size = struct.unpack(fmt, body)
+
+
+def _zip64_sizes(extra, compress_size, file_size):
+    """Pull 64-bit sizes out of the zip64 extra field, if present."""
+    pos = 0
+    while pos + 4 <= len(extra):
+        tag, size = struct.unpack_from("<HH", extra, pos)
+        if tag == 0x0001:
+            data = extra[pos + 4:pos + 4 + size]
+            values = [struct.unpack_from("<Q", data, i)[0] for i in range(0, len(data) - 7, 8)]
+            if file_size == 0xFFFFFFFF and values:
+                file_size = values.pop(0)
+            if compress_size == 0xFFFFFFFF and values:
+                compress_size = values.pop(0)
+            return True, compress_size, file_size
+        pos += 4 + size
+    return False, compress_size, file_size
+
+
+def iter_zip_stream(read):
+    """Yield ZipStreamMember objects from a zip read front to back.
+
+    `read(n)` returns up to n bytes and b"" at EOF, so an upload can be
+    processed while it arrives. Stops at the central directory. Raises
+    ZipStreamError for entries that cannot be delimited without it
+    (encrypted or unsupported compression); callers then fall back to
+    zipfile on the complete archive.
+    """
+    source = _Buffered(read)
+    while True:
+        sig = source.peek(4)
+        if sig in (_CENTRAL_SIG, _END_SIG) or len(sig) < 4:
+            return
+        if sig != _LOCAL_SIG:
+            raise ZipStreamError("Unexpected data between zip entries")
+        (_, _version, flags, method, _t, _d, crc, csize, usize, name_len, extra_len) = _LOCAL_HEADER.unpack(
+            source.take(_LOCAL_HEADER.size)
+        )
+        raw_name = source.take(name_len)
+        extra = source.take(extra_len)
+        if flags & _FLAG_ENCRYPTED:
+            raise ZipStreamError("Encrypted entries are not supported")
+        if method not in (STORED, DEFLATED):
+            raise ZipStreamError(f"Unsupported compression method {method}")
+        name = raw_name.decode("utf-8" if flags & 0x800 else "cp437")
+        zip64, csize, usize = _zip64_sizes(extra, csize, usize)
+        member = ZipStreamMember(source, name, method, flags, crc, csize, usize, zip64)
+        yield member
+        member.skip()